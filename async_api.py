@@ -0,0 +1,224 @@
+""" async_api.py - Run many buildings concurrently from a single process
+
+AsyncBoxLift wraps a BoxLift (or LocalBoxLift) session so that
+send_commands and get_building_state return a Future instead of
+blocking.  The network round trips run on a per building I/O thread,
+while run_concurrently drives all the controllers from the calling
+thread, advancing each building as soon as its own response arrives.
+The wall time of a batch of runs is then the one of the slowest plan,
+rather than the sum of all plans.
+"""
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+N_RETRY = 3  # Number of times an API error is retried before giving up
+JOIN_TIMEOUT = 5.  # Seconds to wait for an I/O thread to finish its calls on close
+
+
+class Future(object):
+    """ The pending result of an asynchronous call """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """ Block until the result is available, raising the call's exception if any """
+        if not self._event.wait(timeout):
+            raise RuntimeError("Future timed out after {}s".format(timeout))
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def add_done_callback(self, fn):
+        """ Call fn(future) once the result is available """
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+
+class AsyncBoxLift(object):
+    """ A non blocking interface to a BoxLift session """
+
+    def __init__(self, api):
+        """ Takes a connected BoxLift, or any object with the same interface """
+        self.api = api
+        self._calls = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            call = self._calls.get()
+            if call is None:
+                return
+            future, method, args = call
+            try:
+                future.set_result(method(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _submit(self, method, *args):
+        future = Future()
+        self._calls.put((future, method, args))
+        return future
+
+    def send_commands(self, commands=None):
+        """ Send commands to advance the clock, returns a Future of the new state """
+        return self._submit(self.api.send_commands, commands)
+
+    def get_building_state(self):
+        """ Returns a Future of the current state """
+        return self._submit(self.api.get_building_state)
+
+    def close(self, timeout=JOIN_TIMEOUT):
+        """ Stop the I/O thread once the pending calls are done, waiting for it
+            at most timeout seconds """
+        self._calls.put(None)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+
+class Run(object):
+    """ The bookkeeping for a single building driven by run_concurrently """
+
+    def __init__(self, name, controller, api):
+        self.name = name
+        self.controller = controller
+        self.api = api
+        self.commands = []
+        self.n_retry = N_RETRY
+        self.n_ticks = 0
+        self.resp = None
+        self.start = None
+        self.wall_time = None
+
+    @property
+    def ticks_per_second(self):
+        if not self.wall_time:
+            return None
+        return self.n_ticks / self.wall_time
+
+
+def run_concurrently(runs, verbose=False):
+    """ Drive every run until its building is finished.
+
+    :param runs:
+        The runs to drive, each with its own controller and AsyncBoxLift
+    :type runs:
+        `iterable` of `Run`
+    :return:
+        The runs, with the final state response in resp
+    """
+    runs = list(runs)
+    completed = queue.Queue()
+
+    def send(run, commands):
+        run.commands = commands
+        future = run.api.send_commands(commands)
+        future.add_done_callback(lambda f: completed.put((run, f)))
+
+    for run in runs:
+        run.start = time.time()
+        send(run, [])
+
+    n_pending = len(runs)
+    while n_pending:
+        run, future = completed.get()
+        try:
+            resp = future.result()
+        except Exception as e:
+            resp = {'status': 'error', 'message': str(e)}
+
+        status = resp.get('status', '')
+        if status == 'error':
+            if verbose:
+                print("[{}] API Error: {}".format(run.name, resp.get('message', None)))
+            if run.n_retry > 0:
+                run.n_retry -= 1
+                send(run, run.commands)
+                continue
+        else:
+            run.n_retry = N_RETRY
+            run.n_ticks += 1
+
+        if status in ('finished', 'error'):
+            run.resp = resp
+            run.wall_time = time.time() - run.start
+            run.api.close()
+            n_pending -= 1
+            if verbose:
+                print("[{}] {} - score: {}".format(run.name, status, resp.get('score', None)))
+            continue
+
+        send(run, run.controller.step(resp))
+
+    return runs
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from controller import Controller
+    from main import get_plan, get_strategy, make_api
+    from plan import with_strategy
+    from simulator import LocalBoxLift
+
+    parser = argparse.ArgumentParser(description='Run several buildings concurrently')
+    parser.add_argument('plans', nargs='+', help='The plans to run')
+    parser.add_argument('-t', '--strategy', default=None,
+                        help='Provide a strategy to the elevators, this will override any\
+ strategy existing in the building plans')
+    parser.add_argument('-s', '--sandbox', action='store_true', default=False,
+                        help='Enable sandbox mode')
+    parser.add_argument('-l', '--local', action='store_true', default=False,
+                        help='Run the buildings in a local simulator instead of the server')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the controllers and the local simulator passenger arrivals')
+    options = parser.parse_args()
+
+    runs = []
+    for name in options.plans:
+        plan = get_plan(name)
+        if options.strategy is not None:
+            plan = with_strategy(plan, get_strategy(options.strategy))
+        if options.local:
+            api = LocalBoxLift(plan, seed=options.seed)
+        else:
+            api = make_api(plan, options.sandbox, False)
+        runs.append(Run(name, Controller(plan, seed=options.seed), AsyncBoxLift(api)))
+
+    start = time.time()
+    run_concurrently(runs, verbose=True)
+    print("--- All Finished in {:.1f}s ---".format(time.time() - start))
+    for run in runs:
+        print("{:<12} score: {:<8} ticks/s: {:.1f}".format(run.name, str(run.resp.get('score', None)),
+                                                          run.ticks_per_second))
@@ -0,0 +1,210 @@
+""" bench.py - Benchmarks for the controller and elevator hot paths
+
+Every scenario first records the states of a seeded local simulation,
+then replays them through a fresh Controller, timing each phase of
+every tick: Controller.update, shuffle_requests and get_commands, every
+Elevator.next_command call, and Controller.assign_request on the
+requests of the recorded states.  The share of the next_command calls
+which recomputed the command, rather than reusing the one of a clean
+elevator, is reported along.  The scenarios cover the real plan
+shapes and a synthetic scale up, and the results can be saved as a
+baseline that later runs are compared against.
+
+    python bench.py --save baseline.json
+    python bench.py --compare baseline.json
+"""
+import json
+import sys
+import timeit
+
+from controller import Controller
+from plan import BasePlan, Random1, Realistic1, Training1
+from simulator import LocalBoxLift
+
+clock = timeit.default_timer
+
+PERCENTILES = (50, 95, 99)
+
+
+class Synthetic(BasePlan):
+    """ A synthetic scale up, far beyond the competition buildings """
+    name = "synthetic_100_500"
+    n_els = 100
+    n_floors = 500
+    n_iter = 200
+
+
+# name -> (plan, arrival rate, number of ticks)
+SCENARIOS = [('training1', Training1, 1., Training1.n_iter),
+             ('random1', Random1, 1., Random1.n_iter),
+             ('realistic1', Realistic1, 1., Realistic1.n_iter),
+             ('synthetic', Synthetic, 20., Synthetic.n_iter)]
+
+PHASES = ['update', 'shuffle_requests', 'get_commands', 'next_command', 'assign_request']
+
+
+def record_states(plan, arrival_rate, n_ticks, seed):
+    """ The states of a local simulation driven by a controller """
+    api = LocalBoxLift(plan, seed=seed, arrival_rate=arrival_rate)
+    api.n_iter = n_ticks
+    controller = Controller(plan, seed=seed)
+    states = []
+    resp = api.send_commands([])
+    while resp['status'] != 'finished':
+        states.append(resp)
+        resp = api.send_commands(controller.step(resp))
+    return states
+
+
+def time_ticks(plan, states, seed, timings):
+    """ Replay the states, timing each phase of every tick.  Returns the
+        number of next_command calls which recomputed the command """
+    controller = Controller(plan, seed=seed)
+    dirty = controller.bank.dirty
+    n_recomputed = 0
+    for resp in states:
+        start = clock()
+        controller.update(resp)
+        timings['update'].append(clock() - start)
+
+        start = clock()
+        controller.shuffle_requests()
+        timings['shuffle_requests'].append(clock() - start)
+
+        # Same as get_commands, but timing each elevator
+        start = clock()
+        commands = []
+        for el in controller.elevators:
+            n_recomputed += dirty[el.slot]
+            el_start = clock()
+            command = el.next_command()
+            timings['next_command'].append(clock() - el_start)
+            if command is not None:
+                commands.append(command)
+        timings['get_commands'].append(clock() - start)
+    return n_recomputed
+
+
+def time_assign(plan, states, seed, timings, n_samples=50):
+    """ Time assign_request on the requests of a sample of the states """
+    step = max(len(states) // n_samples, 1)
+    for resp in states[::step]:
+        controller = Controller(plan, seed=seed)
+        controller.update({'elevators': resp['elevators']})
+        for req in resp['requests']:
+            req = (req['floor'], req['direction'])
+            start = clock()
+            controller.assign_request(req)
+            timings['assign_request'].append(clock() - start)
+
+
+def percentile(sorted_values, pct):
+    idx = int(round(pct / 100. * (len(sorted_values) - 1)))
+    return sorted_values[idx]
+
+
+def summarize(values):
+    """ ops/sec and latency percentiles, in microseconds, of a list of timings """
+    if not values:
+        return None
+    values = sorted(values)
+    total = sum(values)
+    summary = {'n': len(values),
+               'ops_per_sec': len(values) / total if total > 0 else None}
+    for pct in PERCENTILES:
+        summary['p{}'.format(pct)] = percentile(values, pct) * 1e6
+    return summary
+
+
+def run_scenario(plan, arrival_rate, n_ticks, seed=1):
+    states = record_states(plan, arrival_rate, n_ticks, seed)
+    timings = dict((phase, []) for phase in PHASES)
+    n_recomputed = time_ticks(plan, states, seed, timings)
+    time_assign(plan, states, seed, timings)
+    results = dict((phase, summarize(values)) for phase, values in timings.items())
+    if results['next_command'] is not None:
+        results['next_command']['recomputed'] = float(n_recomputed) / results['next_command']['n']
+    return results
+
+
+def run_benchmarks(names=None, quick=False, seed=1):
+    """ Run the scenarios, returns {scenario: {phase: summary}} """
+    results = {}
+    for name, plan, arrival_rate, n_ticks in SCENARIOS:
+        if names and name not in names:
+            continue
+        if quick:
+            n_ticks = max(n_ticks // 10, 10)
+        results[name] = run_scenario(plan, arrival_rate, n_ticks, seed=seed)
+    return results
+
+
+def format_results(results, baseline=None):
+    lines = ["{:<12} {:<17} {:>8} {:>12} {:>10} {:>10} {:>10} {:>8}".format(
+        'scenario', 'phase', 'n', 'ops/s', 'p50 (us)', 'p95 (us)', 'p99 (us)', 'vs base')]
+    for name in sorted(results):
+        for phase in PHASES:
+            summary = results[name][phase]
+            if summary is None:
+                continue
+            change = ''
+            base = (baseline or {}).get(name, {}).get(phase, None)
+            if base:
+                change = '{:+.0%}'.format(summary['p50'] / base['p50'] - 1)
+            lines.append("{:<12} {:<17} {:>8} {:>12.0f} {:>10.1f} {:>10.1f} {:>10.1f} {:>8}".format(
+                name, phase, summary['n'], summary['ops_per_sec'] or 0, summary['p50'],
+                summary['p95'], summary['p99'], change))
+    for name in sorted(results):
+        summary = results[name]['next_command']
+        if summary is not None and 'recomputed' in summary:
+            lines.append("{:<12} next_command recomputed {:.1%}, skipped {:.1%}".format(
+                name, summary['recomputed'], 1 - summary['recomputed']))
+    return '\n'.join(lines)
+
+
+def find_regressions(results, baseline, tolerance):
+    """ The (scenario, phase) whose median latency grew by more than tolerance """
+    regressions = []
+    for name, phases in results.items():
+        for phase, summary in phases.items():
+            base = baseline.get(name, {}).get(phase, None)
+            if summary and base and summary['p50'] > base['p50'] * (1 + tolerance):
+                regressions.append((name, phase))
+    return sorted(regressions)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the controller and elevator hot paths')
+    parser.add_argument('scenarios', nargs='*',
+                        help='The scenarios to run, from: {}'.format(
+                            ', '.join(name for name, _, _, _ in SCENARIOS)))
+    parser.add_argument('-q', '--quick', action='store_true', default=False,
+                        help='Run a tenth of the ticks')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the recorded simulations')
+    parser.add_argument('--save', default=None, metavar='BASELINE',
+                        help='Save the results as a JSON baseline')
+    parser.add_argument('--compare', default=None, metavar='BASELINE',
+                        help='Compare against a JSON baseline, failing on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed growth of the median latency over the baseline')
+    options = parser.parse_args()
+
+    baseline = None
+    if options.compare is not None:
+        with open(options.compare) as fp:
+            baseline = json.load(fp)
+
+    results = run_benchmarks(options.scenarios, quick=options.quick, seed=options.seed)
+    print(format_results(results, baseline))
+
+    if options.save is not None:
+        with open(options.save, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, options.tolerance)
+        for name, phase in regressions:
+            print("Regression: {} {}".format(name, phase))
+        if regressions:
+            sys.exit(1)
@@ -1,10 +1,14 @@
-import json
 # This is to keep this to a minimum and work on Python 2.x and 3.x
 try:
     import urllib.request as urllib2
 except ImportError:
     import urllib2
 
+import instrument
+from codec import get_codec
+from state import BuildingState
+from transport import Transport, TransportError
+
 
 PYCON2015_EVENT_NAME = 'pycon2015'
 
@@ -37,11 +41,22 @@ class Command(object):
         return "set car {} (direction={}, speed={})".format(self.id, self.direction, self.speed)
 
 
+def changed_commands(commands, sent):
+    """The commands changing the (speed, direction) last sent to their elevator, sent mapping an
+    elevator id to it.  The clock only advances with commands, so the first one is kept when none
+    changed"""
+    changed = [command for command in commands
+               if sent.get(command.id, None) != (command.speed, command.direction)]
+    if not changed and commands:
+        changed = commands[:1]
+    return changed
+
+
 class BoxLift(object):
     HOST = 'http://codelift.org'
 
     def __init__(self, bot_name, plan, email, registration_id='', event_name='', 
-                 sandbox_mode=False, verbose=False):
+                 sandbox_mode=False, verbose=False, transport=None, codec=None, changed_only=False):
         """An object that provides an interface to the Lift System.
 
         :param bot_name:
@@ -76,9 +91,26 @@ class BoxLift(object):
             print all request data and responses to the console
         :type verbose:
             `bool`
+        :param transport:
+            The transport used to post requests, defaults to a keep-alive `Transport`
+        :type transport:
+            `Transport`
+        :param codec:
+            The JSON codec of the requests and responses, defaults to the fastest available
+        :type codec:
+            a codec from `codec`
+        :param changed_only:
+            only send the commands changing the speed or direction last sent to an elevator, the
+            server keeping the others moving as they were
+        :type changed_only:
+            `bool`
         """
         self.email = email
         self.verbose = verbose
+        self.transport = transport or Transport()
+        self.codec = codec or get_codec()
+        self.changed_only = changed_only
+        self.sent = {}  # elevator id -> the (speed, direction) last sent
         initialization_data = {
             'username': bot_name,
             'email': email,
@@ -115,32 +147,35 @@ class BoxLift(object):
         :return:
             The new state of the world
         :rtype:
-            `dict`
+            `BuildingState`
         """
         commands = commands or []
+        if self.changed_only:
+            commands = self.changed_commands(commands)
         command_list = {}
         for command in commands:
             command_list[command.id] = {'speed': command.speed, 'direction': command.direction}
         data = {'token': self.token, 'commands': command_list}
         try:
-            state = self._post(self.building_url, data)
-        except urllib2.HTTPError as e:
-            state = {'status': 'error',
-                     'message': str(e)}
-            return state
-
+            with instrument.timer('send_commands'):
+                state = self._post(self.building_url, data, parse=BuildingState.from_dict)
+        except (urllib2.HTTPError, TransportError) as e:
+            return BuildingState(status='error', message=str(e), requests=())
+
+        if self.changed_only and state.get('status', None) != 'error':
+            for command in commands:
+                self.sent[command.id] = (command.speed, command.direction)
         if self.verbose:
             print("status: {}".format(state['status']))
         if 'token' in state:
             self.token = state['token']
-        if 'requests' not in state:
-            state['requests'] = []
-        for elevator_data in state.get('elevators', []):
-            if 'buttons_pressed' not in elevator_data:
-                elevator_data['buttons_pressed'] = []
 
         return state
 
+    def changed_commands(self, commands):
+        """The commands changing the speed or direction last sent to their elevator"""
+        return changed_commands(commands, self.sent)
+
     @classmethod
     def url_root(cls):
         return cls.HOST + "/v1/buildings"
@@ -152,15 +187,19 @@ class BoxLift(object):
     def get_building_state(self):
         return self._post(self.building_url, self._body_data())
 
-    def _post(self, url, data):
-        """wrapper to encode/decode our data and the return value"""
+    def _post(self, url, data, parse=None):
+        """wrapper to encode/decode our data and the return value, decoded responses are passed through parse"""
         if self.verbose:
             print url + ": " + str(data)
-        req = urllib2.Request(url, json.dumps(data).encode('utf-8'))
-        response = urllib2.urlopen(req)
-        res = response.read()
+        with instrument.timer('encode'):
+            body = self.codec.dumps(data)
+        with instrument.timer('network'):
+            res = self.transport.post(url, body)
         try:
-            resp = json.loads(res)
+            with instrument.timer('decode'):
+                resp = self.codec.loads(res)
+                if parse is not None:
+                    resp = parse(resp)
             if self.verbose:
                 print resp
             return resp
@@ -0,0 +1,87 @@
+""" codec.py - Pluggable JSON codecs for the BoxLift API
+
+The fastest JSON library available is used to encode the commands and
+decode the state responses, falling back to the standard library json
+module.  A codec is picked by name, or the first available one of
+PREFERRED is used.
+"""
+import json
+
+
+class JSONCodec(object):
+    """ The standard library json module """
+    name = 'json'
+
+    @staticmethod
+    def dumps(data):
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def loads(body):
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        return json.loads(body)
+
+
+class UJSONCodec(object):
+    """ ujson, a C JSON library """
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self.module = ujson
+
+    def dumps(self, data):
+        return self.module.dumps(data).encode('utf-8')
+
+    def loads(self, body):
+        return self.module.loads(body)
+
+
+class SimpleJSONCodec(object):
+    """ simplejson, with its C speedups """
+    name = 'simplejson'
+
+    def __init__(self):
+        import simplejson
+        self.module = simplejson
+
+    def dumps(self, data):
+        return self.module.dumps(data, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, body):
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        return self.module.loads(body)
+
+
+CODECS = {'json': JSONCodec,
+          'ujson': UJSONCodec,
+          'simplejson': SimpleJSONCodec}
+
+PREFERRED = ['ujson', 'simplejson', 'json']
+
+
+def available_codecs():
+    """ The names of the codecs whose library can be imported """
+    names = []
+    for name in PREFERRED:
+        try:
+            CODECS[name]()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_codec(name=None):
+    """ The codec called name, or the fastest available one """
+    if name is not None:
+        if name not in CODECS:
+            raise ValueError("Unknown codec: {}".format(name))
+        return CODECS[name]()
+    for name in PREFERRED:
+        try:
+            return CODECS[name]()
+        except ImportError:
+            continue
@@ -1,42 +1,106 @@
 """ controller.py - A general elevator controller """
+import collections
 import random
 
-from elevator import Elevator
+import instrument
+from dispatch import CostMatrixDispatcher, has_vectorized_metric
+from elevator import Elevator, ElevatorBank, ElevatorIndex
+from matching import MatchingDispatcher
 from plan import BasePlan
+from request_store import RequestIndex
+from state import BuildingState
+
+# The difference between two consecutive state responses
+StateDelta = collections.namedtuple('StateDelta', ['new_requests', 'vanished_requests',
+                                                   'changed_elevators'])
 
 
 class Controller(object):
     """ Base controller object.  Handles the logic for assigning requests and issuing commands """
 
-    def __init__(self, plan, debug=False):
-        """ Takes a plan object ref and other kwargs to pass to the BoxLift API. """
+    def __init__(self, plan, debug=False, seed=None):
+        """ Takes a plan object ref and other kwargs to pass to the BoxLift API.
+            The seed makes the controller's random choices reproducible. """
 
         if not issubclass(plan, BasePlan) and not isinstance(plan, BasePlan):
             raise TypeError("plan argument must be a subclass of BasePlan")
         self.plan = plan
+        self.rng = random.Random(seed)
         self.elevators = []
+        self.bank = None
+        self.request_index = RequestIndex()
+        self.requests = ()
+        self.live_requests = set()
+        self.delta = StateDelta([], set(), [])
+        self.dispatcher = self.make_dispatcher(plan.strategy)
+        self.planner = plan.strategy.make_planner(plan)
+        self.demand = plan.strategy.make_demand_model(plan)
         self.debug = debug
         self.init_elevators(debug=self.debug)
 
     def init_elevators(self, **kwargs):
         self.elevators = []
+        self.request_index = RequestIndex()
+        self.live_requests = set()
+        self.bank = ElevatorBank(self.plan.n_els)
         for idx in range(self.plan.n_els):
-            self.elevators.append(Elevator(idx, self.plan.n_floors, **kwargs))
+            self.elevators.append(Elevator(idx, self.plan.n_floors, request_index=self.request_index,
+                                           bank=self.bank, **kwargs))
         self.plan.strategy.init_elevators(self.elevators)
         if self.debug:
             self.print_elevators_info()
 
+    def add_elevator(self, floor=0, speed=0, direction=1):
+        """ Add an elevator in the given state, with the next id, and home the
+            elevators again with the strategy.  Returns the elevator """
+        el = Elevator(self.bank.append(), self.plan.n_floors, debug=self.debug,
+                      request_index=self.request_index, bank=self.bank)
+        el.floor, el.speed, el.direction = floor, speed, direction
+        self.elevators.append(el)
+        self.plan.strategy.init_elevators(self.elevators)
+        return el
+
+    def remove_elevator(self, id_):
+        """ Remove an elevator, the following ones taking the id below theirs.
+            Its requests are released, to be assigned again on the next update """
+        el = self.elevators.pop(id_)
+        el.requests = ()
+        el.requests.release()
+        self.bank.remove(id_)
+        for other in self.elevators[id_:]:
+            other.renumber(other.id_ - 1)
+        return el
+
+    @staticmethod
+    def make_dispatcher(strategy):
+        """ The request dispatcher for the strategy's assignment mode.  The matching
+            needs a vectorized metric to cost the load, the strategies with only a
+            scalar one are dispatched greedily """
+        if strategy.assignment == 'matching' and has_vectorized_metric(strategy):
+            return MatchingDispatcher(strategy, capacity=strategy.capacity)
+        if strategy.assignment in ('matching', 'greedy'):
+            return CostMatrixDispatcher(strategy)
+        raise ValueError("Unknown assignment mode: {}".format(strategy.assignment))
+
     def print_elevators_info(self):
         for el in self.elevators:
             el.print_info()
 
     def is_request_assigned(self, req):
-        """ Check all elevators whether the request is assigned """
-        return any([el.is_request_assigned(*req) for el in self.elevators])
-        # for el in self.elevators:
-        #     if el.is_request_assigned(*req):
-        #         return True
-        # return False
+        """ Check whether any elevator has the request assigned """
+        return req in self.request_index
+
+    def get_request_owner(self, req):
+        """ The id of the elevator the request is assigned to, or None """
+        return self.request_index.owner(req)
+
+    def unassigned_requests(self):
+        """ The requests of the last update that no elevator is assigned to """
+        return self.request_index.unassigned(self.requests)
+
+    def requests_per_elevator(self):
+        """ A dict of elevator id to the requests assigned to it """
+        return dict((el.id_, self.request_index.requests_of(el.id_)) for el in self.elevators)
 
     def assign_request(self, req):
         """ Assign a request to one of the current elevators.  There are some rules
@@ -66,6 +130,23 @@ class Controller(object):
         # elevator = self.find_elevator_by_req_metric(req)
         # self.elevators[elevator].assign_request(*req)
 
+    def assign_requests(self, reqs):
+        """ Assign a batch of requests at once, skipping the ones already assigned.
+            Dispatchers which reassign also get the requests elevators are moving away from """
+        new_reqs = []
+        seen = set()
+        if self.dispatcher.reassigns:
+            for req, el_id in self.find_opposing_requests():
+                if req not in seen:
+                    self.elevators[el_id].requests.discard(*req)
+                    seen.add(req)
+                    new_reqs.append(req)
+        for req in reqs:
+            if req not in seen and not self.is_request_assigned(req):
+                seen.add(req)
+                new_reqs.append(req)
+        return self.dispatcher.assign(self.elevators, new_reqs)
+
     def find_elevator_by_req_otw(self, req):
         """  Check and see whether the request is already on the way of
              an elevator.  If multiple yesses, choose closest one.  If none,
@@ -104,42 +185,115 @@ class Controller(object):
             print el
 
     def update(self, resp):
-        """ Update the elevators, assign the requests """
+        """ Update the elevators, assign the requests.
+
+        resp is a BuildingState, or a state dict which is parsed into one.
+        Only what changed since the last response is processed: elevators
+        whose floor or buttons moved are updated, and only new requests, or
+        those released by their elevator while still waiting, are assigned.
+        The difference is kept in self.delta.
+        """
+
+        resp = BuildingState.from_dict(resp)
 
         # Update the elevator state
-        els = resp.get("elevators", None)
-        if els is not None:
-            for el in els:
-                self.elevators[el.get('id')].update_state(el)
-
-        # Assign all requests
-        reqs = resp.get("requests", None)
-        if reqs is not None:
-            for req in reqs:
-                # wrap request
-                req = (req['floor'], req['direction'])
-                self.assign_request(req)
+        changed_elevators = []
+        if resp.elevators is not None:
+            elevators = self.elevators
+            for el in resp.elevators:
+                elevator = elevators[el.id]
+                if el.floor != elevator.floor or el.buttons_pressed != elevator.button_pressed:
+                    elevator.apply_state(el)
+                    changed_elevators.append(elevator.id_)
+
+        # Assign the new and released requests, already (floor, direction) tuples
+        self.requests = reqs = resp.requests
+        live_requests = set(reqs)
+        released = self.request_index.released
+        new_requests = [req for req in reqs if req not in self.live_requests]
+        vanished_requests = self.live_requests - live_requests
+        released.intersection_update(live_requests)
+        if released:
+            candidates = [req for req in reqs if req in released or req not in self.live_requests]
+        else:
+            candidates = new_requests
+        self.live_requests = live_requests
+        self.assign_requests(candidates)
+
+        self.delta = StateDelta(new_requests, vanished_requests, changed_elevators)
+
+        if self.demand is not None:
+            self.demand.observe(new_requests)
+            if self.demand.n_ticks % self.plan.strategy.rehome_every == 0:
+                self.rehome_idle_elevators()
+
+    def rehome_idle_elevators(self):
+        """ Send the elevators with nothing to do to the floors the demand
+            model forecasts the next requests at, lowest car to lowest home """
+        idle = [el for el in self.elevators if not el.has_any_requests()]
+        homes = self.demand.homes(len(idle))
+        if homes is None:
+            return
+        idle.sort(key=lambda el: (el.floor, el.id_))
+        for el, home in zip(idle, homes):
+            el.home_floor = home
+
+    def step(self, resp):
+        """ Update from a state response and return the next commands """
+        with instrument.timer('update'):
+            self.update(resp)
+        with instrument.timer('shuffle_requests'):
+            self.shuffle_requests()
+        with instrument.timer('get_commands'):
+            return self.get_commands()
 
     def get_commands(self):
-        """ Get the commands from all elevators """
-        commands = []
-        for el in self.elevators:
-            command = el.get_command()
-            if command is not None:
-                commands.append(command)
-        return commands
+        """ Get the commands from all elevators, revised by the strategy's planner if any.
+            The elevators whose state did not change reuse their last command """
+        commands = [el.next_command() for el in self.elevators]
+        if self.planner is not None:
+            commands = self.planner.plan(self, commands)
+        return [command for command in commands if command is not None]
+
+    def refine(self, commands, time_budget):
+        """ Spend the spare seconds of a tick improving on its commands, with as
+            many passes of the strategy's planner as they allow.  The commands
+            are returned unchanged without a planner """
+        if self.planner is None or time_budget <= 0:
+            return commands
+        by_id = dict((command.id, command) for command in commands)
+        commands = [by_id.get(el.id_, None) for el in self.elevators]
+        commands = self.planner.plan(self, commands, time_budget=time_budget, max_passes=None)
+        return [command for command in commands if command is not None]
+
+    def prepare(self, commands, time_budget=None):
+        """ The work of the next tick which does not wait for its state, to run
+            while the commands sent are on their way: the demand model decays,
+            and the planner, if any, spends the time budget planning from where
+            the commands take the building """
+        if self.demand is not None:
+            self.demand.advance()
+        if self.planner is not None and time_budget:
+            self.planner.speculate(self, commands, time_budget)
 
     def shuffle_requests(self):
         """ Find requests that are in the opposite direction of 
             travel, and try to reassign them to a closer or stopped
             elevator. """
 
+        if not self.plan.strategy.do_shuffle:
+            return
+
         opposing_requests = self.find_opposing_requests()
+        if not opposing_requests:
+            return
 
+        # The elevators do not move while shuffling, index them once
+        index = ElevatorIndex(self.bank)
         for req, cur_el in opposing_requests:
             cur_elevator = self.elevators[cur_el]
             # Find closest elevator that is not moving away
-            el = self.find_closest_el_not_moving_away(req)
+            el = self.find_closest_el_not_moving_away(req, index)
             if el is not None:
                 if self.debug:
                     print "Shuffling req {} from el {} to {}".format(req, cur_el, el)
@@ -152,21 +306,20 @@ class Controller(object):
         """ Get the opposing requests """
         reqs = []
         for el in self.elevators:
-            for req in el.requests:
-                dir_to_req = el.direction_to(req[0])
-                if dir_to_req in [0, el.direction] or el.direction == 0:
-                    continue
-                else:
+            if el.requests:
+                for req in el.requests.behind(el.floor, el.direction):
                     reqs.append((req, el.id_))
         return reqs
 
-    def find_closest_el_not_moving_away(self, req):
-        """ Find the closest elevator not moving away from a request"""
-        all_els = []
-        for el in random.sample(self.elevators, len(self.elevators)):
-            if el.direction == 0 or el.direction_to(req[0]) == el.direction:
-                all_els.append((el.id_, el.distance_to(req[0])))
-        all_els.sort(key=lambda x: x[1])
-        if not all_els:
+    def find_closest_el_not_moving_away(self, req, index=None):
+        """ Find the closest elevator not moving away from a request, the one with
+            the smallest distance_to the request, ties broken at random.  The
+            ElevatorIndex of the current elevators is built if not given """
+        if index is None:
+            index = ElevatorIndex(self.bank)
+        els = index.highest_not_moving_away(req[0])
+        if not els:
             return None
-        return all_els[0][0]
+        if len(els) == 1:
+            return els[0]
+        return self.rng.choice(els)
@@ -0,0 +1,112 @@
+""" demand.py - A streaming forecast of where the next requests will appear
+
+The DemandModel keeps, for every floor and direction, an exponentially
+time-decayed count of the requests that appeared there, so recent
+traffic weighs more than old traffic and the model follows the hot
+floors as they move.  The memory is two floats per floor, whatever the
+length of the run.
+
+Decaying every count every tick would cost a pass over the floors, so
+the counts are instead kept in a growing unit: an observation at tick t
+adds growth ** t, and a count is read back divided by growth ** t.  The
+counts are rescaled once the unit grows too large.
+
+    demand = DemandModel(n_floors, half_life=200)
+    demand.observe(new_requests)    # once a tick
+    demand.advance()                # optional, the decay ahead of the next observe
+    homes = demand.homes(3)         # where three idle cars should wait
+"""
+import array
+
+HALF_LIFE = 200       # Ticks for the weight of an observed request to halve
+MIN_REQUESTS = 5.     # The decayed number of requests below which there is no forecast
+RESCALE_AT = 1e100    # The unit above which the counts are rescaled
+
+
+class DemandModel(object):
+    """ Time-decayed request rates per floor and direction """
+
+    def __init__(self, n_floors, half_life=HALF_LIFE, min_requests=MIN_REQUESTS):
+        """
+        :param half_life:
+            The ticks for the weight of an observed request to halve
+        :param min_requests:
+            The decayed number of requests needed before homes are forecast
+        """
+        self.n_floors = n_floors
+        self.half_life = half_life
+        self.min_requests = min_requests
+        self.growth = 2. ** (1. / half_life)
+        self.unit = 1.
+        self.n_ticks = 0
+        self.advanced = False
+        self.total = 0.
+        self.counts = {1: array.array('d', [0.] * n_floors),
+                       -1: array.array('d', [0.] * n_floors)}
+
+    def advance(self):
+        """ Advance a tick ahead of its requests, decaying the counts so far.
+            observe does it unless it was called since the last observe """
+        self.n_ticks += 1
+        self.unit *= self.growth
+        if self.unit > RESCALE_AT:
+            self.rescale()
+        self.advanced = True
+
+    def observe(self, requests):
+        """ Advance a tick and count the (floor, direction) requests appearing in it """
+        if not self.advanced:
+            self.advance()
+        self.advanced = False
+        unit = self.unit
+        for floor, direction in requests:
+            if 0 <= floor < self.n_floors:
+                self.counts[direction][floor] += unit
+                self.total += unit
+
+    def rescale(self):
+        """ Bring the counts back to a unit of 1 """
+        unit = self.unit
+        for counts in self.counts.values():
+            for floor in range(self.n_floors):
+                counts[floor] /= unit
+        self.total /= unit
+        self.unit = 1.
+
+    def weight(self, floor, direction=None):
+        """ The decayed number of requests at a floor, in a direction or both """
+        if direction is None:
+            return (self.counts[1][floor] + self.counts[-1][floor]) / self.unit
+        return self.counts[direction][floor] / self.unit
+
+    def rate(self, floor, direction=None):
+        """ The expected requests per tick at a floor, in a direction or both """
+        return self.weight(floor, direction) * (1 - 1 / self.growth)
+
+    @property
+    def n_requests(self):
+        """ The decayed number of requests observed """
+        return self.total / self.unit
+
+    def hot_floors(self, n):
+        """ The n floors with the highest request rates, hottest first """
+        floors = sorted(range(self.n_floors), key=lambda floor: -self.weight(floor))
+        return floors[:n]
+
+    def homes(self, n):
+        """ The floors n idle cars should wait at, in order, spread over the
+            quantiles of the forecast demand.  None until enough requests were seen """
+        if n <= 0 or self.n_requests < self.min_requests:
+            return None
+        up, down = self.counts[1], self.counts[-1]
+        total = self.total
+        homes = []
+        cumulative = 0.
+        floor = 0
+        for idx in range(n):
+            target = total * (idx + 0.5) / n
+            while floor < self.n_floors - 1 and cumulative + up[floor] + down[floor] < target:
+                cumulative += up[floor] + down[floor]
+                floor += 1
+            homes.append(floor)
+        return homes
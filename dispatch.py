@@ -0,0 +1,96 @@
+""" dispatch.py - Batch assignment of requests to elevators
+
+The CostMatrixDispatcher assigns all of a tick's new requests at once.
+When NumPy is available, the strategy's vectorized_distance_metric
+builds the whole elevators x requests cost matrix in one pass, and only
+the row of the elevator picked for a request is refreshed before the
+next one, since its load changed.  The result is the same as assigning
+the requests one at a time with distance_metric, which is what is done
+when NumPy is not installed.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _defining_class(cls, attr):
+    for klass in cls.__mro__:
+        if attr in klass.__dict__:
+            return klass
+
+
+def has_vectorized_metric(strategy):
+    """ Does the strategy provide a vectorized metric matching its distance_metric """
+    if getattr(strategy, 'vectorized_distance_metric', None) is None:
+        return False
+    scalar = _defining_class(strategy, 'distance_metric')
+    vectorized = _defining_class(strategy, 'vectorized_distance_metric')
+    return issubclass(vectorized, scalar)
+
+
+class CostMatrixDispatcher(object):
+    """ Assign a batch of requests to the elevators minimizing the strategy metric """
+
+    reassigns = False  # Only new requests are dispatched
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.vectorized = np is not None and has_vectorized_metric(strategy)
+
+    def assign(self, elevators, reqs):
+        """ Choose an elevator for every request, in order.
+
+        :param elevators:
+            The elevators to choose from
+        :param reqs:
+            The distinct, not yet assigned (floor, direction) requests
+        :return:
+            A list of (request, elevator id), in the order of reqs
+        """
+        if not reqs or not elevators:
+            return []
+        if not self.vectorized:
+            return self._assign_scalar(elevators, reqs)
+        return self._assign_vectorized(elevators, reqs)
+
+    def _assign_scalar(self, elevators, reqs):
+        assignments = []
+        for req in reqs:
+            metrics = [(el, self.strategy.distance_metric(el, req)) for el in elevators]
+            el = min(metrics, key=lambda x: x[1])[0]
+            el.assign_request(*req)
+            assignments.append((req, el.id_))
+        return assignments
+
+    def _assign_vectorized(self, elevators, reqs):
+        metric = self.strategy.vectorized_distance_metric
+        bank = elevators[0].bank
+        if len(bank) == len(elevators) and all(el.bank is bank and el.slot == idx
+                                                for idx, el in enumerate(elevators)):
+            # The whole fleet, read the bank's arrays directly
+            floors = bank.view('floor').reshape(-1, 1)
+            directions = bank.view('direction').reshape(-1, 1)
+            loads = bank.loads().reshape(-1, 1)
+        else:
+            floors = np.array([el.floor for el in elevators]).reshape(-1, 1)
+            directions = np.array([el.direction for el in elevators]).reshape(-1, 1)
+            loads = np.array([len(el.requests) + len(el.button_pressed)
+                              for el in elevators]).reshape(-1, 1)
+        req_floors = np.array([req[0] for req in reqs]).reshape(1, -1)
+        req_directions = np.array([req[1] for req in reqs]).reshape(1, -1)
+
+        costs = metric(floors, directions, loads, req_floors, req_directions)
+        assignments = []
+        for col, req in enumerate(reqs):
+            row = int(np.argmin(costs[:, col]))
+            el = elevators[row]
+            el.assign_request(*req)
+            assignments.append((req, el.id_))
+
+            # The elevator's load changed, refresh its costs for the remaining requests
+            loads[row, 0] += 1
+            costs[row, col + 1:] = metric(floors[row:row + 1], directions[row:row + 1],
+                                          loads[row:row + 1], req_floors[:, col + 1:],
+                                          req_directions[:, col + 1:])[0]
+        return assignments
@@ -1,33 +1,174 @@
 """ elevator.py  - The elevator object """
+import array
+from bisect import bisect_left, bisect_right
+
 from boxlift_api import Command
+from request_store import RequestStore
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 NO_REQUEST_STAY_PUT = True
 
 
+class ElevatorBank(object):
+    """ Struct of arrays storage for the state of a whole fleet of elevators.
+
+    Each field is a contiguous array with one entry per elevator, the
+    Elevator objects being lightweight views on a slot of the bank.  The
+    dirty field flags the elevators whose state changed since their last
+    command was decided.
+    """
+
+    FIELDS = {'floor': 0,
+              'speed': 0,
+              'direction': 1,
+              'home_floor': -1,
+              'n_requests': 0,
+              'n_buttons': 0,
+              'dirty': 1}
+
+    def __init__(self, n_els):
+        self.n_els = n_els
+        for field, default in self.FIELDS.items():
+            setattr(self, field, array.array('l', [default] * n_els))
+
+    def __len__(self):
+        return self.n_els
+
+    def append(self):
+        """ Add a slot at the end, with the default values, returns it """
+        for field, default in self.FIELDS.items():
+            getattr(self, field).append(default)
+        self.n_els += 1
+        return self.n_els - 1
+
+    def remove(self, slot):
+        """ Remove a slot, the following ones moving down by one """
+        for field in self.FIELDS:
+            getattr(self, field).pop(slot)
+        self.n_els -= 1
+
+    def view(self, field):
+        """ A NumPy view on a field, or the plain array without NumPy """
+        if np is None:
+            return getattr(self, field)
+        return np.frombuffer(getattr(self, field), dtype=np.int_)
+
+    def loads(self):
+        """ The number of requests and buttons of every elevator """
+        if np is None:
+            return [n_reqs + n_btns for n_reqs, n_btns in zip(self.n_requests, self.n_buttons)]
+        return self.view('n_requests') + self.view('n_buttons')
+
+
+class ElevatorIndex(object):
+    """ The elevators of a bank sorted by floor, partitioned by direction.
+
+    Built from a snapshot of the bank, it answers which elevators are
+    idle or heading toward a floor in O(log n), and is rebuilt once the
+    elevators moved.
+    """
+
+    def __init__(self, bank):
+        by_direction = {1: [], -1: [], 0: []}
+        for slot in range(len(bank)):
+            by_direction.setdefault(bank.direction[slot], []).append((bank.floor[slot], slot))
+        self.floors = {}
+        self.slots = {}
+        for direction, entries in by_direction.items():
+            entries.sort()
+            self.floors[direction] = [floor for floor, _ in entries]
+            self.slots[direction] = [slot for _, slot in entries]
+
+    def _at(self, direction, floor):
+        """ The slots of the elevators in direction at floor """
+        floors = self.floors[direction]
+        return self.slots[direction][bisect_left(floors, floor):bisect_right(floors, floor)]
+
+    def highest_not_moving_away(self, floor):
+        """ The slots of the elevators on the highest floor among those idle,
+            or heading toward floor, by slot.  An empty list if there are none """
+        down, idle, up = self.floors[-1], self.floors[0], self.floors[1]
+        candidates = []
+        if down and down[-1] > floor:
+            candidates.append(down[-1])
+        if idle:
+            candidates.append(idle[-1])
+        idx = bisect_left(up, floor)
+        if idx > 0:
+            candidates.append(up[idx - 1])
+        if not candidates:
+            return []
+        best = max(candidates)
+        slots = self._at(0, best)
+        if best > floor:
+            slots += self._at(-1, best)
+        elif best < floor:
+            slots += self._at(1, best)
+        return sorted(slots)
+
+
+def _bank_field(field):
+    """ A property reading and writing the elevator's slot of a bank field,
+        flagging the elevator dirty when the value changes """
+
+    def getter(self):
+        return getattr(self.bank, field)[self.slot]
+
+    def setter(self, value):
+        values = getattr(self.bank, field)
+        if values[self.slot] != value:
+            values[self.slot] = value
+            self.bank.dirty[self.slot] = 1
+
+    return property(getter, setter)
+
+
 class Elevator(object):
     """ An object to store current states of various elevators and assigned requests. """
 
-    def __init__(self, id_, n_floors, debug=False):
-        """ Main constructor. """
+    __slots__ = ('id_', 'bank', 'slot', 'request_index', '_requests', '_button_pressed',
+                 'n_floors', 'dp', '_command')
+
+    cmd_states = {1: 'Stopped: Send to Button Press',
+                  2: 'Stopped: Send to Request',
+                  3: 'Stopped: Send Home',
+                  4: 'Stop at button: Move to closest request',
+                  5: 'Stop at button: Turn around',
+                  6: 'Stopping at Request',
+                  7: 'Heading to Furthest Request',
+                  8: 'Heading Home',
+                  9: 'Keep on Keeping On'}
+
+    floor = _bank_field('floor')
+    speed = _bank_field('speed')
+    direction = _bank_field('direction')
+    home_floor = _bank_field('home_floor')
+
+    def __init__(self, id_, n_floors, debug=False, request_index=None, bank=None):
+        """ Main constructor.  The optional request_index is kept informed of
+            the requests assigned to this elevator, and the state is stored in
+            slot id_ of the ElevatorBank bank, or in a bank of its own """
 
         self.id_ = id_
-        self.requests = []
-        self.button_pressed = []
+        if bank is None:
+            bank, self.slot = ElevatorBank(1), 0
+        else:
+            self.slot = id_
+        self.bank = bank
+        self.request_index = request_index
+        self._requests = None
+        self.requests = RequestStore()
+        self.button_pressed = ()
         self.speed = 0
         self.direction = 1
         self.floor = 0
         self.n_floors = n_floors
         self.dp = debug
         self.home_floor = -1
-        self.cmd_states = {1: 'Stopped: Send to Button Press',
-                           2: 'Stopped: Send to Request',
-                           3: 'Stopped: Send Home',
-                           4: 'Stop at button: Move to closest request',
-                           5: 'Stop at button: Turn around',
-                           6: 'Stopping at Request',
-                           7: 'Heading to Furthest Request',
-                           8: 'Heading Home',
-                           9: 'Keep on Keeping On'}
+        self._command = None
 
     def __str__(self):
         return "Elevator[{}] - {}: spd: {} dir.: {} btn: {} rqs: {}".format(self.id_, self.floor,
@@ -41,45 +182,51 @@ class Elevator(object):
     def print_info(self):
         print "[{}] - n_floors: {} - home_floor: {}".format(self.id_, self.n_floors, self.home_floor)
 
+    @property
+    def requests(self):
+        return self._requests
+
+    @requests.setter
+    def requests(self, requests):
+        """ Replace the assigned requests with an iterable of (floor, direction) """
+        if self._requests is not None:
+            self._requests.release()
+        self._requests = RequestStore(requests, index=self.request_index, owner=self.id_,
+                                      counts=self.bank.n_requests, slot=self.slot,
+                                      dirty=self.bank.dirty)
+
+    @property
+    def button_pressed(self):
+        return self._button_pressed
+
+    @button_pressed.setter
+    def button_pressed(self, button_pressed):
+        self._button_pressed = button_pressed
+        self.bank.n_buttons[self.slot] = len(button_pressed)
+        self.bank.dirty[self.slot] = 1
+
     def is_request_assigned(self, floor, direction=None):
-        if len(self.requests) == 0:
-            return False
-        if direction is None:
-            return floor in zip(*self.requests)[0]
-        else:
-            return (floor, direction) in self.requests
+        return self.requests.contains(floor, direction)
 
     def assign_request(self, floor, direction):
         """ Assign a request to the elevator """
-        if not self.is_request_assigned(floor, direction):
-            self.requests.append((floor, direction))
+        self.requests.add(floor, direction)
 
     def remove_request(self, floor, direction=None):
         """ Remove a request """
-        if self.is_request_assigned(floor, direction=None):
-            req = self.get_request_by_floor(floor)
-            self.requests.remove(req)
+        req = self.get_request_by_floor(floor)
+        if req is not None:
+            self.requests.discard(*req)
 
     def get_request_by_floor(self, floor):
-        for req in self.requests:
-            if req[0] == floor:
-                return req
+        return self.requests.first_at(floor)
 
     def requests_along_direction(self, direction):
         """ Get a sorted list of requests along a given direction """
         if direction != 1 and direction != -1:
             raise ValueError("Improper direction, please enter +/-1")
 
-        def filter_direction(req):
-            return req[1] == direction
-
-        req = filter(filter_direction, self.requests)
-        floors = list(zip(*req)[0])
-        do_reverse = False
-        if direction == -1:
-            do_reverse = True
-        floors.sort(reverse=do_reverse)
-        return floors
+        return self.requests.floors_along(direction)
 
     def has_requests(self):
         """ Simple check whether requests are assigned """
@@ -87,12 +234,10 @@ class Elevator(object):
 
     def closest_request(self):
         """ Return the direction to the closest request """
-        if not self.requests:
+        req = self.requests.nearest(self.floor)
+        if req is None:
             return None
-        dist = [(req[0], self.distance_to(req[0])) for req in self.requests]
-        dist.sort(key=lambda x: abs(x[1]))
-
-        return self.direction_to(dist[0][0])
+        return self.direction_to(req[0])
 
     def has_buttons(self):
         """ Simple check whether buttons are pressed """
@@ -123,14 +268,10 @@ class Elevator(object):
         return sorted(self.requests, key=lambda x: self.distance_to(x[0]))
 
     def get_furthest_request(self):
-        sorted_reqs = self.sort_requests_by_distance()
-        if sorted_reqs is not None:
-            return sorted_reqs[-1]
+        return self.requests.highest()
 
     def get_closest_request(self):
-        sorted_reqs = self.sort_requests_by_distance()
-        if sorted_reqs is not None:
-            return sorted_reqs[0]
+        return self.requests.lowest()
 
     def has_button_along_direction(self, direction):
         for btn in self.button_pressed:
@@ -157,6 +298,21 @@ class Elevator(object):
         floor = state.get('floor', 0)
         self.floor = floor
 
+    def renumber(self, id_):
+        """ Move an elevator of a shared bank to another id, and the slot of the
+            same index, keeping its requests.  The slot must already hold the
+            elevator's state """
+        requests = list(self.requests)
+        self._requests.release()
+        self._requests = None
+        self.id_ = self.slot = id_
+        self.requests = requests
+
+    def apply_state(self, state):
+        """ Take the floor and buttons of an ElevatorState, already matched to this elevator by id """
+        self.button_pressed = state.buttons_pressed
+        self.floor = state.floor
+
     def command(self, **kwargs):
         """ Format a command for this elevator """
         self.speed = kwargs.get('speed')
@@ -171,6 +327,19 @@ class Elevator(object):
         """ Stop and orient towards a direction """
         return self.command(speed=0, direction=direction)
 
+    def next_command(self):
+        """ The command of get_command, reused while the elevator is clean.
+
+        get_command only depends on the elevator's state, so once a call
+        left that state untouched, the next call would decide the same
+        command, until something flags the elevator dirty again.
+        """
+        dirty = self.bank.dirty
+        if dirty[self.slot]:
+            dirty[self.slot] = 0
+            self._command = self.get_command()
+        return self._command
+
     def get_command(self):
         if not self.speed:
             # It's stopped!
@@ -242,11 +411,11 @@ class Elevator(object):
                     self.print_cmd(7)
                     return self.command(speed=1, direction=self.direction_to(furthest_req[0]))
             elif not self.has_buttons() and not self.has_requests():
-                #self.print_cmd(8)
                 if self.is_at_home():
                     do_stop = True
                 else:
-                    direction = self.direction_to(self.home_floor)
+                    self.print_cmd(8)
+                    return self.command(speed=1, direction=self.direction_to(self.home_floor))
             
             if do_stop:
                 return self.stop_and_point(direction)
@@ -0,0 +1,323 @@
+""" fleet.py - Supervise a fleet of buildings from a single process
+
+A FleetSupervisor owns many (building session, Controller) pairs.  The
+network I/O of every building runs on the AsyncBoxLift I/O threads,
+and their responses come back to a single event loop, which hands the
+decision steps (update, shuffle_requests, get_commands) to a bounded
+set of worker processes.  The decision steps are pure Python, so they
+are spread over processes rather than threads to run in parallel.
+Each controller is copied into the worker process owning its building
+as the run starts, and lives there for the rest of the run.
+
+-  Fairness: a building has at most one state waiting for a decision,
+   and the waiting states are decided in the order they arrived, so a
+   busy building cannot starve the others.
+-  Shedding: each building keeps a running estimate of its decision
+   time.  When a state has waited so long that a full step would miss
+   the tick deadline, only update and get_commands are run, skipping
+   the request shuffle and the strategy's planner.
+-  Metrics: the decision time of every building goes into a histogram,
+   and the global tick rate of the fleet is kept.
+
+    python fleet.py -l --seed 1 -j 4 Random1 Clustered1 Realistic1
+"""
+import collections
+import multiprocessing
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from async_api import N_RETRY, Run
+from instrument import Histogram
+
+clock = time.time
+
+TICK_DEADLINE = 1.   # Seconds from a response to its commands
+SMOOTHING = 0.2      # Weight of the last decision time in the running estimate
+
+
+class Session(Run):
+    """ A building driven by a FleetSupervisor """
+
+    def __init__(self, name, controller, api):
+        """ Takes a Controller and an AsyncBoxLift """
+        super(Session, self).__init__(name, controller, api)
+        self.received = None
+        self.step_time = 0.
+        self.decision_times = Histogram()
+        self.n_shed = 0
+        self.n_late = 0
+
+
+def decide(controller, resp, shed):
+    """ The decision step of a controller.  Returns the commands, the seconds
+        spent, whether it was shed and the error message if any """
+    start = clock()
+    try:
+        if shed:
+            controller.update(resp)
+            planner, controller.planner = controller.planner, None
+            try:
+                commands = controller.get_commands()
+            finally:
+                controller.planner = planner
+        else:
+            commands = controller.step(resp)
+    except Exception as e:
+        return None, clock() - start, shed, str(e)
+    return commands, clock() - start, shed, None
+
+
+def _serve(controllers, conn):
+    """ The loop of a worker process, deciding the steps of the controllers it owns """
+    while True:
+        job = conn.recv()
+        if job is None:
+            conn.send(None)
+            return
+        idx, resp, shed = job
+        conn.send((idx,) + decide(controllers[idx], resp, shed))
+
+
+class FleetSupervisor(object):
+    """ Drive many buildings, their decisions spread over a bounded set of worker processes """
+
+    def __init__(self, sessions, workers=4, tick_deadline=TICK_DEADLINE, verbose=False):
+        """
+        :param sessions:
+            The Sessions to drive
+        :param workers:
+            The number of worker processes deciding the steps, the buildings
+            being dealt among them.  0 decides in this process
+        :param tick_deadline:
+            The seconds a building may take from a response to its commands
+        """
+        self.sessions = list(sessions)
+        self.slots = dict((session, idx) for idx, session in enumerate(self.sessions))
+        self.workers = workers
+        self.tick_deadline = tick_deadline
+        self.verbose = verbose
+        self.events = queue.Queue()
+        self.ready = collections.deque()
+        self.conns = []
+        self.processes = []
+        self.busy = []
+        self.n_pending = 0
+        self.start = None
+        self.wall_time = None
+
+    @property
+    def n_ticks(self):
+        return sum(session.n_ticks for session in self.sessions)
+
+    @property
+    def in_flight(self):
+        """ The number of decision steps running """
+        return sum(self.busy)
+
+    @property
+    def tick_rate(self):
+        """ The ticks per second of the whole fleet """
+        elapsed = self.wall_time if self.wall_time is not None else clock() - (self.start or clock())
+        if not elapsed:
+            return None
+        return self.n_ticks / elapsed
+
+    def worker_of(self, idx):
+        """ The worker owning the idx-th session """
+        return idx % len(self.conns)
+
+    def start_workers(self):
+        """ Copy the controllers into the worker processes, and listen to their decisions """
+        n_workers = min(self.workers, len(self.sessions))
+        for worker in range(n_workers):
+            controllers = dict((idx, session.controller) for idx, session in enumerate(self.sessions)
+                               if idx % n_workers == worker)
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve, args=(controllers, child))
+            process.daemon = True
+            process.start()
+            listener = threading.Thread(target=self.listen, args=(parent,))
+            listener.daemon = True
+            listener.start()
+            self.conns.append(parent)
+            self.processes.append(process)
+        self.busy = [False] * n_workers
+
+    def listen(self, conn):
+        """ Forward the decisions of a worker to the event loop """
+        while True:
+            result = conn.recv()
+            if result is None:
+                return
+            self.events.put(('decided', self.sessions[result[0]]) + result[1:])
+
+    def stop_workers(self):
+        for conn in self.conns:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
+        self.conns = []
+        self.processes = []
+
+    def send(self, session, commands):
+        session.commands = commands
+        future = session.api.send_commands(commands)
+        future.add_done_callback(lambda f: self.events.put(('response', session, f)))
+
+    def finish(self, session, resp):
+        session.resp = resp
+        session.wall_time = clock() - session.start
+        session.api.close()
+        self.n_pending -= 1
+        if self.verbose:
+            print("[{}] {} - score: {}".format(session.name, resp.get('status', ''),
+                                               resp.get('score', None)))
+
+    def on_response(self, session, future):
+        try:
+            resp = future.result()
+        except Exception as e:
+            resp = {'status': 'error', 'message': str(e)}
+
+        status = resp.get('status', '')
+        if status == 'error':
+            if self.verbose:
+                print("[{}] API Error: {}".format(session.name, resp.get('message', None)))
+            if session.n_retry > 0:
+                session.n_retry -= 1
+                self.send(session, session.commands)
+                return
+        else:
+            session.n_retry = N_RETRY
+            session.n_ticks += 1
+
+        if status in ('finished', 'error'):
+            self.finish(session, resp)
+            return
+        session.resp = resp
+        session.received = clock()
+        self.ready.append(session)
+
+    def on_decided(self, session, commands, elapsed, shed, error):
+        if self.conns:
+            self.busy[self.worker_of(self.slots[session])] = False
+        session.decision_times.add(elapsed)
+        if shed:
+            session.n_shed += 1
+        else:
+            session.step_time += SMOOTHING * (elapsed - session.step_time)
+        if clock() - session.received > self.tick_deadline:
+            session.n_late += 1
+        if error is not None:
+            self.finish(session, {'status': 'error', 'message': error})
+            return
+        self.send(session, commands)
+
+    def dispatch(self):
+        """ Hand the waiting states to their idle workers, oldest first """
+        waiting = collections.deque()
+        while self.ready:
+            session = self.ready.popleft()
+            remaining = session.received + self.tick_deadline - clock()
+            shed = remaining < session.step_time
+            if not self.conns:
+                self.on_decided(session, *decide(session.controller, session.resp, shed))
+                continue
+            idx = self.slots[session]
+            worker = self.worker_of(idx)
+            if self.busy[worker]:
+                waiting.append(session)
+                continue
+            self.busy[worker] = True
+            self.conns[worker].send((idx, session.resp, shed))
+        self.ready = waiting
+
+    def run(self):
+        """ Drive every session until its building is finished, returns the sessions.
+            The sessions' controllers are left as they were, the steps being
+            decided on their copies in the worker processes """
+        self.start = clock()
+        self.n_pending = len(self.sessions)
+        if self.workers:
+            self.start_workers()
+        try:
+            for session in self.sessions:
+                session.start = clock()
+                self.send(session, [])
+            while self.n_pending:
+                event = self.events.get()
+                if event[0] == 'response':
+                    self.on_response(*event[1:])
+                else:
+                    self.on_decided(*event[1:])
+                self.dispatch()
+        finally:
+            self.stop_workers()
+        self.wall_time = clock() - self.start
+        return self.sessions
+
+
+def format_fleet(supervisor):
+    """ Format the results of every building, and of the fleet, as a table """
+    lines = ["{:<12} {:>8} {:>7} {:>9} {:>10} {:>10} {:>6} {:>6}".format(
+        'building', 'score', 'ticks', 'ticks/s', 'p50 (ms)', 'p99 (ms)', 'shed', 'late')]
+    for session in supervisor.sessions:
+        times = session.decision_times
+        p50, p99 = times.percentile(50), times.percentile(99)
+        lines.append("{:<12} {:>8} {:>7} {:>9.1f} {:>10} {:>10} {:>6} {:>6}".format(
+            session.name, str((session.resp or {}).get('score', None)), session.n_ticks,
+            session.ticks_per_second or 0,
+            '-' if p50 is None else '{:.3f}'.format(p50 * 1e3),
+            '-' if p99 is None else '{:.3f}'.format(p99 * 1e3),
+            session.n_shed, session.n_late))
+    lines.append("--- {} ticks in {:.1f}s, {:.1f} ticks/s ---".format(
+        supervisor.n_ticks, supervisor.wall_time or 0, supervisor.tick_rate or 0))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from async_api import AsyncBoxLift
+    from controller import Controller
+    from main import get_plan, get_strategy, make_api
+    from plan import with_strategy
+    from simulator import LocalBoxLift
+
+    parser = argparse.ArgumentParser(description='Supervise a fleet of buildings')
+    parser.add_argument('plans', nargs='+', help='The plans to run, a plan may be repeated')
+    parser.add_argument('-t', '--strategy', default=None,
+                        help='Provide a strategy to the elevators, this will override any\
+ strategy existing in the building plans')
+    parser.add_argument('-j', '--workers', type=int, default=4,
+                        help='The number of worker processes deciding the steps, 0 decides in process')
+    parser.add_argument('--deadline', type=float, default=TICK_DEADLINE,
+                        help='Seconds from a response to its commands, before shedding work')
+    parser.add_argument('-s', '--sandbox', action='store_true', default=False,
+                        help='Enable sandbox mode')
+    parser.add_argument('-l', '--local', action='store_true', default=False,
+                        help='Run the buildings in a local simulator instead of the server')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the controllers and the local simulator passenger arrivals')
+    options = parser.parse_args()
+
+    sessions = []
+    for idx, name in enumerate(options.plans):
+        plan = get_plan(name)
+        if options.strategy is not None:
+            plan = with_strategy(plan, get_strategy(options.strategy))
+        if options.local:
+            api = LocalBoxLift(plan, seed=options.seed)
+        else:
+            api = make_api(plan, options.sandbox, False)
+        sessions.append(Session('{}-{}'.format(name, idx), Controller(plan, seed=options.seed),
+                                AsyncBoxLift(api)))
+
+    supervisor = FleetSupervisor(sessions, workers=options.workers, tick_deadline=options.deadline,
+                                 verbose=True)
+    supervisor.run()
+    print(format_fleet(supervisor))
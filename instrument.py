@@ -0,0 +1,204 @@
+""" instrument.py - Per tick timing instrumentation
+
+The network, JSON encoding/decoding and every Controller phase are
+wrapped in named timers.  While instrumentation is disabled, the
+default, a timer is a shared no-op, so the hooks cost next to nothing.
+Once enabled, every sample goes into a streaming, log bucketed
+histogram giving p50/p95/p99 in bounded memory, and to the registered
+sinks: a stdout summary, a CSV file or any callback.
+
+    instrument.enable(StdoutSink())
+    with instrument.timer('network'):
+        ...
+    instrument.report()
+"""
+import csv
+import math
+import timeit
+
+clock = timeit.default_timer
+
+BUCKET_RATIO = 1.05  # Relative width of a histogram bucket, the percentile resolution
+_LOG_RATIO = math.log(BUCKET_RATIO)
+
+
+class Histogram(object):
+    """ A streaming histogram of positive values, in log spaced buckets """
+
+    def __init__(self):
+        self.buckets = {}
+        self.n = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.n += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        key = int(math.floor(math.log(value) / _LOG_RATIO)) if value > 0 else None
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    @property
+    def mean(self):
+        if not self.n:
+            return None
+        return self.total / self.n
+
+    def percentile(self, pct):
+        """ The value below which pct percent of the samples fall, within a bucket """
+        if not self.n:
+            return None
+        if pct >= 100:
+            return self.max
+        rank = pct / 100. * self.n
+        seen = 0
+        keys = sorted(self.buckets, key=lambda k: float('-inf') if k is None else k)
+        for key in keys:
+            seen += self.buckets[key]
+            if seen >= rank:
+                if key is None:
+                    return 0.
+                # The bucket's geometric middle, clamped to the observed range
+                value = BUCKET_RATIO ** (key + 0.5)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class _NullTimer(object):
+    """ The timer handed out while instrumentation is disabled """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Timer(object):
+
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.record(self.name, clock() - self.start)
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Registry(object):
+    """ The histograms of every named timer, and the sinks they report to """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.sinks = []
+
+    def timer(self, name):
+        """ A context manager timing its block under name """
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name, None)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(seconds)
+        for sink in self.sinks:
+            sink.record(name, seconds)
+
+    def enable(self, *sinks):
+        self.enabled = True
+        self.sinks.extend(sinks)
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.histograms = {}
+        self.sinks = []
+
+    def report(self):
+        """ Hand the histograms to every sink """
+        for sink in self.sinks:
+            sink.report(self.histograms)
+
+
+class Sink(object):
+    """ Base sink, receiving every sample and the final histograms """
+
+    def record(self, name, seconds):
+        pass
+
+    def report(self, histograms):
+        pass
+
+
+def _ms(seconds):
+    return '-' if seconds is None else '{:.3f}'.format(seconds * 1e3)
+
+
+class StdoutSink(Sink):
+    """ Print a summary table of every timer """
+
+    def report(self, histograms):
+        print("--- Timings (ms) ---")
+        print("{:<18} {:>8} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            'timer', 'n', 'total', 'mean', 'p50', 'p95', 'p99', 'max'))
+        for name in sorted(histograms):
+            hist = histograms[name]
+            print("{:<18} {:>8} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+                name, hist.n, _ms(hist.total), _ms(hist.mean), _ms(hist.percentile(50)),
+                _ms(hist.percentile(95)), _ms(hist.percentile(99)), _ms(hist.max)))
+
+
+class CSVSink(Sink):
+    """ Write the summary of every timer to a CSV file, in seconds """
+
+    def __init__(self, path):
+        self.path = path
+
+    def report(self, histograms):
+        with open(self.path, 'w') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['timer', 'n', 'total', 'mean', 'p50', 'p95', 'p99', 'max'])
+            for name in sorted(histograms):
+                hist = histograms[name]
+                writer.writerow([name, hist.n, hist.total, hist.mean, hist.percentile(50),
+                                 hist.percentile(95), hist.percentile(99), hist.max])
+
+
+class CallbackSink(Sink):
+    """ Call fn(name, seconds) for every sample """
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def record(self, name, seconds):
+        self.fn(name, seconds)
+
+
+# The process wide registry the hooks report to
+REGISTRY = Registry()
+timer = REGISTRY.timer
+enable = REGISTRY.enable
+disable = REGISTRY.disable
+reset = REGISTRY.reset
+report = REGISTRY.report
+
+
+def is_enabled():
+    return REGISTRY.enabled
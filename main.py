@@ -1,13 +1,18 @@
 """ main.py - The main loop and command caller """
 import sys
 import inspect
-import time
+import random
 
+import instrument
 import plan as plans
 import strategy as strategies
 from controller import Controller
 from boxlift_api import BoxLift, PYCON2015_EVENT_NAME
-from config import Config as cfg
+from pacing import Pacer, send_with_retry
+from pipeline import Pipeline
+from recorder import TraceWriter, replay
+from simulator import LocalBoxLift
+from zoning import ZonedController
 
 
 def print_commands(commands):
@@ -32,61 +37,141 @@ def print_simulation_header(plan, options):
     print "---"
 
 
-def print_simulation_results(resp):
+def print_simulation_results(resp, pacer):
     print "--- Sim Finished ---"
     print "Score: {}".format(resp.get('score', None))
+    if pacer is not None:
+        print "Pacing: {}".format(pacer)
+    if instrument.is_enabled():
+        instrument.report()
     event_code = resp.get('event_code', None)
     if event_code is not None:
         print "Holy Crap!  You won something!  Event code: {}".format(event_code)
 
 
-def send_commands(api, commands):
-    n_retry = 3
-    resp = api.send_commands(commands)
-    success = False
-    while not success and n_retry > 0:
-        if resp['status'] == 'error':
-            print "API Error: {}".format(resp['message'])
-            print "retrying: {}".format(n_retry)
-            time.sleep(1)
-            n_retry -= 1
-        else:
-            success = True
-    if not success:
+def send_commands(api, commands, pacer):
+    def on_error(resp, n_retry):
+        print "API Error: {}".format(resp['message'])
+        print "retrying: {}".format(n_retry)
+
+    resp = send_with_retry(api, commands, pacer, on_error=on_error)
+    if resp.get('status', '') == 'error':
+        print "API Error: {}".format(resp['message'])
         print "API Retry Exhausted.  I'm dying!"
         sys.exit(1)
     return resp
 
 
+def run_pipelined(api, controller, plan, pacer, recorder, verbose=False):
+    """ The main loop, with the API round trips on an I/O thread, the output
+        of a tick done while the next one is on its way and the slack of
+        every tick spent refining its commands """
+    counter = [0]
+
+    def on_state(resp):
+        if recorder is not None:
+            recorder.write_state(resp)
+        counter[0] += 1
+        if verbose:
+            print  # Separate each verbose output
+        print_loop_counter(counter[0], plan.n_iter)
+
+    def on_commands(commands):
+        if recorder is not None:
+            recorder.write_commands(commands)
+        if verbose:
+            controller.print_status()
+            print_commands(commands)
+
+    pipeline = Pipeline(api, pacer=pacer)
+    resp = pipeline.run(controller, on_state=on_state, on_commands=on_commands)
+    if resp is None or resp.get('status', '') != 'finished':
+        print "API Error: {}".format((resp or {}).get('message', None))
+        print "API Retry Exhausted.  I'm dying!"
+        sys.exit(1)
+    print_simulation_results(resp, pacer)
+
+
+def make_api(plan, sandbox, verbose, changed_only=False):
+    """ Open a BoxLift session on the server for the plan """
+    from config import Config as cfg
+    # api = BoxLift(cfg.username, plan.name, cfg.email, cfg.registration_id,
+    #               event_name=PYCON2015_EVENT_NAME, sandbox_mode=sandbox,
+    #               verbose=verbose)
+    return BoxLift(cfg.username, plan.name, cfg.email, sandbox_mode=sandbox,
+                   verbose=verbose, changed_only=changed_only)
+
+
+def get_plan(name):
+    """ Find a plan class by name """
+    for clsname, clsobj in inspect.getmembers(plans):
+        if clsname == name:
+            return clsobj
+    raise TypeError("No plan exists for name: {}".format(name))
+
+
+def get_strategy(name):
+    """ Find a strategy class by name """
+    for clsname, clsobj in inspect.getmembers(strategies):
+        if clsname == name:
+            return clsobj
+    raise TypeError("No strategy exists for name: {}".format(name))
+
+
 def main(options):
     # check the plan argument
-    plan = None
-    for clsname, clsobj in inspect.getmembers(plans):
-        if clsname == options.plan:
-            plan = clsobj
-            break
-    if plan is None:
-        raise TypeError("No plan exists for name: {}".format(options.plan))
+    plan = get_plan(options.plan)
 
     # Check the strategy argument
     if options.strategy is not None:
-        for clsname, clsobj in inspect.getmembers(strategies):
-            if clsname == options.strategy:
-                plan.strategy = clsobj
+        plan.strategy = get_strategy(options.strategy)
+
+    if options.replay is not None:
+        result = replay(options.replay, plan, verbose=options.verbose > 0)
+        print "Replayed {} ticks, {} mismatches".format(result.n_ticks, len(result.mismatches))
+        print_simulation_results(result.resp or {}, None)
+        return
+
+    if options.profile or options.profile_csv:
+        sinks = [instrument.StdoutSink()]
+        if options.profile_csv:
+            sinks.append(instrument.CSVSink(options.profile_csv))
+        instrument.enable(*sinks)
 
     api_verbose = options.verbose == 2
 
     print_simulation_header(plan, options)
 
-    controller = Controller(plan, debug=options.verbose > 0)
-    # api = BoxLift(cfg.username, plan.name, cfg.email, cfg.registration_id,
-    #               event_name=PYCON2015_EVENT_NAME, sandbox_mode=options.sandbox,
-    #               verbose=api_verbose)
-    api = BoxLift(cfg.username, plan.name, cfg.email, sandbox_mode=options.sandbox,
-                  verbose=api_verbose)
-    resp = send_commands(api, [])
+    seed = options.seed
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    recorder = None
+    if options.record is not None:
+        recorder = TraceWriter(options.record, plan, seed, n_zones=options.zones)
+
+    if options.zones > 1:
+        controller = ZonedController(plan, n_zones=options.zones, seed=seed, debug=options.verbose > 0)
+    else:
+        controller = Controller(plan, debug=options.verbose > 0, seed=seed)
+    if options.local:
+        api = LocalBoxLift(plan, seed=seed, verbose=api_verbose, changed_only=options.changed_only)
+    else:
+        api = make_api(plan, options.sandbox, api_verbose, changed_only=options.changed_only)
+    pacer = Pacer(min_interval=options.pace)
+    if options.pipeline:
+        run_pipelined(api, controller, plan, pacer, recorder, verbose=options.verbose > 0)
+        if recorder is not None:
+            recorder.close()
+        if options.zones > 1:
+            controller.close()
+        return
+
+    resp = send_commands(api, [], pacer)
     controller.update(resp)
     commands = controller.get_commands()
+    if recorder is not None:
+        recorder.write_state(resp)
+        recorder.write_commands(commands)
     # The loop
     loop_counter = 0
 
@@ -106,16 +191,22 @@ def main(options):
             if uinput == 'd':
                 import pdb; pdb.set_trace()
 
-        resp = send_commands(api, commands)
+        resp = send_commands(api, commands, pacer)
+        if recorder is not None:
+            recorder.write_state(resp)
 
         if resp.get('status', '') == 'finished':
-            print_simulation_results(resp)
+            print_simulation_results(resp, pacer)
             break
 
-        controller.update(resp)
-        controller.shuffle_requests()
-        commands = controller.get_commands()
-        time.sleep(0.25)
+        commands = controller.step(resp)
+        if recorder is not None:
+            recorder.write_commands(commands)
+
+    if recorder is not None:
+        recorder.close()
+    if options.zones > 1:
+        controller.close()
 
 if __name__ == '__main__':
     import argparse
@@ -130,7 +221,34 @@ if __name__ == '__main__':
     parser.add_argument('-t', '--strategy', default=None, 
                         help='Provide a strategy to the elevators, this will override any\
  strategy existing in the building plan')
+    parser.add_argument('-l', '--local', action='store_true', default=False,
+                        help='Run the building in a local simulator instead of the server')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the controller and the local simulator passenger arrivals')
+    parser.add_argument('-p', '--pace', type=float, default=0.,
+                        help='Minimum time between two ticks in seconds, the server is\
+ otherwise sent commands as soon as they are ready')
+    parser.add_argument('--pipeline', action='store_true', default=False,
+                        help='Run the API calls on an I/O thread, spending the pacing slack of\
+ every tick refining the commands')
+    parser.add_argument('--changed-only', action='store_true', default=False,
+                        help='Only send the server the commands changing an elevator\'s speed or\
+ direction')
+    parser.add_argument('--record', default=None, metavar='TRACE',
+                        help='Record every state and command of the run to a trace file')
+    parser.add_argument('--replay', default=None, metavar='TRACE',
+                        help='Replay a recorded trace through the controller, with no network')
+    parser.add_argument('-z', '--zones', type=int, default=1,
+                        help='Split the floors in zones, each driven by its own controller in a\
+ worker process')
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help='Time the network, JSON decoding and controller phases of every tick')
+    parser.add_argument('--profile-csv', default=None, metavar='CSV',
+                        help='Also write the timings to a CSV file, implies --profile')
     options = parser.parse_args()
+    if options.pipeline and options.debug:
+        parser.error('--pipeline sends every tick as soon as it is decided, it cannot stop\
+ after each step with --debug')
 
     if options.debug:
         options.sandbox = True
@@ -0,0 +1,149 @@
+""" matching.py - Optimal batch assignment of requests with a min-cost matching
+
+Rather than giving each request, in arrival order, the elevator that is
+best for it alone, the MatchingDispatcher solves all of a tick's
+requests jointly.  Every elevator is split into slots, the n-th slot
+costing the strategy metric as if the elevator already held n more
+requests, and the requests are matched to the slots with the Hungarian
+algorithm.  A capacity caps the number of requests an elevator may
+hold, requests left over once every slot is taken are assigned
+greedily.  The slot costs come from the strategy's vectorized metric,
+the only one taking the load; a strategy with only a scalar
+distance_metric cannot be matched.
+"""
+from dispatch import CostMatrixDispatcher, has_vectorized_metric
+
+INF = float('inf')
+
+
+def hungarian(costs):
+    """ Solve the rectangular assignment problem.
+
+    :param costs:
+        The n x m cost matrix, as a list of rows, with n <= m
+    :return:
+        For every row, the index of the column it is assigned to
+    """
+    n = len(costs)
+    if not n:
+        return []
+    m = len(costs[0])
+    if n > m:
+        raise ValueError("More rows than columns, {} > {}".format(n, m))
+
+    # Potentials and matching, 1 indexed with a virtual column 0
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    p = [0] * (m + 1)      # p[j] the row matched to column j
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [INF] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = costs[i0 - 1]
+            delta = INF
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    assignment = [None] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            assignment[p[j] - 1] = j - 1
+    return assignment
+
+
+class MatchingDispatcher(object):
+    """ Assign a batch of requests to the elevators with a min-cost matching """
+
+    reassigns = True  # Requests the elevators are moving away from are matched again
+
+    def __init__(self, strategy, capacity=None):
+        """
+        :param strategy:
+            The strategy providing the cost function
+        :param capacity:
+            The maximum number of requests an elevator may hold, None for no limit
+        :type capacity:
+            `int`
+        """
+        if not has_vectorized_metric(strategy):
+            # Every slot of an elevator would cost the same, nothing would spread the requests
+            raise ValueError("{} has no vectorized_distance_metric matching its distance_metric, "
+                             "the slot costs cannot take the load".format(strategy.__name__))
+        self.strategy = strategy
+        self.capacity = capacity
+        self.greedy = CostMatrixDispatcher(strategy)
+
+    def slot_cost(self, el, load, req):
+        """ The cost of the request for the elevator, once it holds load requests and buttons """
+        return self.strategy.vectorized_distance_metric(el.floor, el.direction, load,
+                                                        req[0], req[1])
+
+    def slots(self, elevators, n_reqs):
+        """ The (elevator, load) slots the requests are matched to """
+        slots = []
+        for el in elevators:
+            load = len(el.requests) + len(el.button_pressed)
+            n_slots = n_reqs
+            if self.capacity is not None:
+                n_slots = min(n_slots, self.capacity - len(el.requests))
+            for extra in range(max(n_slots, 0)):
+                slots.append((el, load + extra))
+        return slots
+
+    def assign(self, elevators, reqs):
+        """ Choose an elevator for every request, minimizing the total cost.
+
+        :param elevators:
+            The elevators to choose from
+        :param reqs:
+            The distinct, not yet assigned (floor, direction) requests
+        :return:
+            A list of (request, elevator id), in the order of reqs
+        """
+        if not reqs or not elevators:
+            return []
+        slots = self.slots(elevators, len(reqs))
+        costs = [[self.slot_cost(el, load, req) for el, load in slots] for req in reqs]
+        # Free overflow columns for the requests no slot is left for
+        n_overflow = max(len(reqs) - len(slots), 0)
+        for row in costs:
+            row.extend([0] * n_overflow)
+
+        matched = {}
+        overflow = []
+        for req, col in zip(reqs, hungarian(costs)):
+            if col < len(slots):
+                el = slots[col][0]
+                el.assign_request(*req)
+                matched[req] = el.id_
+            else:
+                overflow.append(req)
+        for req, el_id in self.greedy.assign(elevators, overflow):
+            matched[req] = el_id
+        return [(req, matched[req]) for req in reqs]
@@ -0,0 +1,109 @@
+""" matrix.py - Run every plan against every strategy in a process pool
+
+Each run goes through the same Controller and BoxLift path used by
+main.py, either against the server or a LocalBoxLift, and the final
+scores are collected into a single table along with the wall time and
+ticks per second of every run.
+"""
+import collections
+import inspect
+import multiprocessing
+import time
+
+import plan as plans
+import strategy as strategies
+from controller import Controller
+from main import get_plan, get_strategy, make_api, send_commands
+from pacing import Pacer
+from plan import BasePlan, with_strategy
+from simulator import LocalBoxLift
+from strategy import BaseStrategy
+
+RunResult = collections.namedtuple('RunResult', ['plan', 'strategy', 'score', 'status',
+                                                 'wall_time', 'ticks_per_second'])
+
+
+def all_plans():
+    """ The names of every plan in plan.py """
+    return [name for name, obj in inspect.getmembers(plans, inspect.isclass)
+            if issubclass(obj, BasePlan) and obj is not BasePlan]
+
+
+def all_strategies():
+    """ The names of every strategy in strategy.py """
+    return [name for name, obj in inspect.getmembers(strategies, inspect.isclass)
+            if issubclass(obj, BaseStrategy)]
+
+
+def run_plan(job):
+    """ Run a single (plan, strategy) pair to completion, in a worker process """
+    plan_name, strategy_name, local, seed, sandbox = job
+    plan = with_strategy(get_plan(plan_name), get_strategy(strategy_name))
+    controller = Controller(plan, seed=seed)
+    if local:
+        api = LocalBoxLift(plan, seed=seed)
+    else:
+        api = make_api(plan, sandbox, False)
+    pacer = Pacer()
+
+    start = time.time()
+    try:
+        resp = send_commands(api, [], pacer)
+        while resp.get('status', '') != 'finished':
+            resp = send_commands(api, controller.step(resp), pacer)
+    except SystemExit:
+        # send_commands gives up once its retries are exhausted
+        resp = {'status': 'error'}
+    wall_time = time.time() - start
+
+    return RunResult(plan_name, strategy_name, resp.get('score', None), resp.get('status', None),
+                     wall_time, pacer.n_ticks / wall_time if wall_time else None)
+
+
+def run_matrix(plan_names, strategy_names, local=False, seed=None, sandbox=False, processes=None):
+    """ Run the cross product of plans and strategies, returns the RunResults """
+    jobs = [(plan_name, strategy_name, local, seed, sandbox)
+            for plan_name in plan_names for strategy_name in strategy_names]
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(run_plan, jobs)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+def format_table(results):
+    """ Format the results as a table, one row per run """
+    lines = ["{:<12} {:<18} {:>8} {:>9} {:>10}".format('plan', 'strategy', 'score',
+                                                      'wall (s)', 'ticks/s')]
+    for res in sorted(results, key=lambda r: (r.plan, r.strategy)):
+        tps = '-' if res.ticks_per_second is None else '{:.1f}'.format(res.ticks_per_second)
+        lines.append("{:<12} {:<18} {:>8} {:>9.2f} {:>10}".format(res.plan, res.strategy,
+                                                                  str(res.score), res.wall_time, tps))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Run every plan against every strategy')
+    parser.add_argument('-p', '--plans', nargs='+', default=None,
+                        help='The plans to run, defaults to every plan')
+    parser.add_argument('-t', '--strategies', nargs='+', default=None,
+                        help='The strategies to run, defaults to every strategy')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='The number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('-s', '--sandbox', action='store_true', default=False,
+                        help='Enable sandbox mode')
+    parser.add_argument('-l', '--local', action='store_true', default=False,
+                        help='Run the buildings in a local simulator instead of the server')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the controllers and the local simulator passenger arrivals')
+    options = parser.parse_args()
+
+    start = time.time()
+    results = run_matrix(options.plans or all_plans(), options.strategies or all_strategies(),
+                         local=options.local, seed=options.seed, sandbox=options.sandbox,
+                         processes=options.processes)
+    print(format_table(results))
+    print("--- {} runs in {:.1f}s ---".format(len(results), time.time() - start))
@@ -0,0 +1,172 @@
+""" pacing.py - Adaptive tick pacing for the main loop
+
+Instead of sleeping a fixed amount after every tick, the Pacer sends
+the next command as soon as it is ready and only holds back when the
+server pushes back with an error, backing off exponentially and
+relaxing again once the responses are healthy.  It measures the round
+trip latency and the age of the current token, and reports the
+achieved ticks per second.
+
+send_with_retry is the paced round trip of the drivers: it waits for the
+pacer, sends, and retries the API errors a few times.
+"""
+import time
+try:
+    import urllib.request as urllib2
+except ImportError:
+    import urllib2
+
+from async_api import N_RETRY
+from transport import TransportError
+
+EWMA_WEIGHT = 0.2  # Weight of the newest latency sample in the moving average
+
+
+def send_with_retry(api, commands, pacer, n_retry=N_RETRY, on_error=None):
+    """ Send the commands once the pacer allows it, retrying the API errors.
+
+    :param n_retry:
+        The number of times an error is retried before it is returned
+    :param on_error:
+        Called with every error state about to be retried and the retries left
+    :return:
+        The new state, or the last error state once the retries are exhausted
+    """
+    while True:
+        pacer.wait()
+        try:
+            resp = api.send_commands(commands)
+        except (urllib2.HTTPError, TransportError) as e:
+            resp = {'status': 'error', 'message': str(e)}
+        pacer.record(resp)
+        if resp.get('status', '') != 'error' or n_retry <= 0:
+            return resp
+        n_retry -= 1
+        if on_error is not None:
+            on_error(resp, n_retry)
+
+
+class Pacer(object):
+    """ Decide when the next command may be sent """
+
+    def __init__(self, min_interval=0., backoff=0.25, max_backoff=4., backoff_factor=2.,
+                 token_ttl=None, clock=time.time, sleep=time.sleep):
+        """
+        :param min_interval:
+            The minimum time between two sends, in seconds. 0 sends as early as possible
+        :type min_interval:
+            `float`
+        :param backoff:
+            The initial delay, in seconds, once the server pushes back
+        :type backoff:
+            `float`
+        :param max_backoff:
+            The maximum delay, in seconds, between two sends
+        :type max_backoff:
+            `float`
+        :param backoff_factor:
+            The factor applied to the delay for every consecutive push back
+        :type backoff_factor:
+            `float`
+        :param token_ttl:
+            How long, in seconds, a token stays valid.  None if tokens never expire
+        :type token_ttl:
+            `float`
+        """
+        self.min_interval = min_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.backoff_factor = backoff_factor
+        self.token_ttl = token_ttl
+        self.clock = clock
+        self.sleep = sleep
+
+        self.delay = min_interval
+        self.latency = None
+        self.n_ticks = 0
+        self.n_errors = 0
+        self.n_token_errors = 0
+        self.start = None
+        self.last_send = None
+        self.token_received = None
+
+    def wait(self):
+        """ Block until the next command may be sent """
+        now = self.clock()
+        if self.start is None:
+            self.start = now
+        if self.last_send is not None:
+            remaining = self.last_send + self.delay - now
+            if remaining > 0:
+                self.sleep(remaining)
+                now = self.clock()
+        self.last_send = now
+
+    def record(self, resp):
+        """ Account for the response to the last send """
+        now = self.clock()
+        if self.last_send is not None:
+            latency = now - self.last_send
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += EWMA_WEIGHT * (latency - self.latency)
+
+        if resp.get('status', '') == 'error':
+            self.n_errors += 1
+            if 'token' in str(resp.get('message', '')).lower():
+                self.n_token_errors += 1
+            self.push_back()
+        else:
+            self.n_ticks += 1
+            self.token_received = now
+            self.relax()
+
+    def push_back(self):
+        """ The server signalled back pressure, slow down """
+        self.delay = min(max(self.delay * self.backoff_factor, self.backoff), self.max_backoff)
+
+    def relax(self):
+        """ A healthy response, head back towards the minimum interval """
+        self.delay = max(self.delay / self.backoff_factor, self.min_interval)
+        if self.delay < self.backoff:
+            self.delay = self.min_interval
+
+    @property
+    def token_age(self):
+        """ Time since the current token was received """
+        if self.token_received is None:
+            return None
+        return self.clock() - self.token_received
+
+    def slack(self):
+        """ The seconds before the next command would be sent anyway, held
+            back by the pacing, short of when the current token expires """
+        if self.last_send is None:
+            return 0.
+        now = self.clock()
+        slack = self.last_send + self.delay - now
+        if self.token_ttl is not None and self.token_received is not None:
+            slack = min(slack, self.token_received + self.token_ttl - (self.latency or 0.) - now)
+        return max(slack, 0.)
+
+    def is_token_valid(self):
+        if self.token_ttl is None or self.token_received is None:
+            return True
+        return self.token_age < self.token_ttl
+
+    @property
+    def ticks_per_second(self):
+        if self.start is None or self.last_send is None:
+            return None
+        elapsed = self.clock() - self.start
+        if elapsed <= 0:
+            return None
+        return self.n_ticks / elapsed
+
+    def __str__(self):
+        latency = 'n/a' if self.latency is None else '{:.1f}ms'.format(self.latency * 1e3)
+        tps = self.ticks_per_second
+        tps = 'n/a' if tps is None else '{:.1f}'.format(tps)
+        return "ticks: {} ticks/s: {} latency: {} errors: {}".format(self.n_ticks, tps, latency,
+                                                                     self.n_errors)
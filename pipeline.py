@@ -0,0 +1,139 @@
+""" pipeline.py - Overlap the network I/O of a building with its decisions
+
+A Pipeline runs the BoxLift round trips of a session on a dedicated I/O
+thread: the pacing waits, the encoding, the network wait, the retries
+of the errors and the decoding into BuildingState all happen there,
+and the decoded states are handed to the decision stage through a
+bounded queue.  The decision stage reads them with iter_states and
+answers every state with send.
+
+The protocol is lockstep, a state only comes back for the commands of
+the previous one, so the decision of a tick cannot start before its
+state.  run sends the commands as soon as they are decided, then does
+the work that does not wait for the next state while the round trip is
+in flight: the state and commands callbacks, such as a recorder, and
+the controller's prepare, which decays the demand model and plans ahead
+from where the commands sent take the building.  The slack left before
+the pacer would send the commands anyway is spent refining them, with
+deeper passes of the strategy's planner.
+
+    pipeline = Pipeline(api, pacer=Pacer(min_interval=0.1))
+    for state in pipeline.iter_states():
+        pipeline.send(controller.step(state))
+"""
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from async_api import JOIN_TIMEOUT, N_RETRY
+from pacing import Pacer, send_with_retry
+
+
+class Pipeline(object):
+    """ A BoxLift session, its round trips run on an I/O thread """
+
+    def __init__(self, api, pacer=None, maxsize=1, n_retry=N_RETRY):
+        """
+        :param api:
+            A connected BoxLift, or any object with the same interface
+        :param pacer:
+            The Pacer deciding when the commands are sent, defaults to sending as soon as possible
+        :param maxsize:
+            The number of decoded states the I/O thread may get ahead of the decision stage
+        :param n_retry:
+            The number of times an API error is retried before being handed over
+        """
+        self.api = api
+        self.pacer = pacer or Pacer()
+        self.n_retry = n_retry
+        self.commands = queue.Queue()
+        self.states = queue.Queue(maxsize)
+        self.n_errors = 0
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            commands = self.commands.get()
+            if commands is None:
+                return
+            try:
+                state = self.round_trip(commands)
+            except Exception as e:
+                # Handed over to be raised by the decision stage
+                self.states.put(e)
+                return
+            self.states.put(state)
+            if state.get('status', '') in ('finished', 'error'):
+                return
+
+    def round_trip(self, commands):
+        """ Send the commands and return the decoded state, retrying the errors """
+        def on_error(state, n_retry):
+            self.n_errors += 1
+
+        return send_with_retry(self.api, commands, self.pacer, self.n_retry, on_error)
+
+    def send(self, commands):
+        """ Hand the commands of the last state to the I/O thread """
+        self.commands.put(commands)
+
+    def iter_states(self, commands=()):
+        """ Send the first commands and yield every state, up to the finished one
+            or an error left after the retries.  Each state must be answered with
+            send before the next one can be yielded """
+        self.send(list(commands))
+        while True:
+            state = self.states.get()
+            if isinstance(state, Exception):
+                raise state
+            yield state
+            if state.get('status', '') in ('finished', 'error'):
+                return
+
+    def slack(self):
+        """ The seconds the commands of the current state may take before they are due """
+        return self.pacer.slack()
+
+    def close(self, timeout=JOIN_TIMEOUT):
+        """ Stop the I/O thread once the commands sent are done, waiting for it
+            at most timeout seconds """
+        self.commands.put(None)
+        self._thread.join(timeout)
+
+    def run(self, controller, refine=True, speculate=True, on_state=None, on_commands=None):
+        """ Drive the controller until the building is finished, returns the last state.
+
+        :param refine:
+            Spend the slack of every tick refining its commands
+        :param speculate:
+            Spend the expected round trip time of every tick planning the next one
+        :param on_state:
+            Called with every state received, once its commands are sent
+        :param on_commands:
+            Called with the commands of every state, once they are sent
+        """
+        state = None
+        try:
+            for state in self.iter_states():
+                if state.get('status', '') in ('finished', 'error'):
+                    if on_state is not None:
+                        on_state(state)
+                    break
+                commands = controller.step(state)
+                if refine:
+                    commands = controller.refine(commands, self.slack())
+                self.send(commands)
+
+                # The next state is on its way
+                if on_state is not None:
+                    on_state(state)
+                if on_commands is not None:
+                    on_commands(commands)
+                controller.prepare(commands, self.pacer.latency if speculate else None)
+        finally:
+            self.close()
+        return state
@@ -1,5 +1,6 @@
 """ A simple file to store the various building plans """
 from strategy import BaseStrategy
+from traffic import ClusteredTraffic, RealisticTraffic, UniformTraffic
 
 
 class BasePlan(object):
@@ -8,6 +9,7 @@ class BasePlan(object):
     n_iter = 30    # The number of iterations
     n_floors = 10  # The number of floors
     strategy = BaseStrategy
+    traffic = UniformTraffic()  # The passenger arrivals of the local simulator
 
 
 class Training1(BasePlan):
@@ -43,6 +45,7 @@ class Random3(Random1):
 
 class Clustered1(Random1):
     name = "ch_clu_500_1"
+    traffic = ClusteredTraffic()
 
 
 class Clustered2(Clustered1):
@@ -58,6 +61,7 @@ class Realistic1(BasePlan):
     n_iter = 1000
     n_els = 8
     n_floors = 50
+    traffic = RealisticTraffic(period=1000)
 
 
 class Realistic2(Realistic1):
@@ -66,3 +70,8 @@ class Realistic2(Realistic1):
 
 class Realistic3(Realistic1):
     name = "ch_rea_1000_3"
+
+
+def with_strategy(plan, strategy):
+    """ Derive a plan class using another strategy, leaving the original untouched """
+    return type(plan.__name__, (plan,), {'strategy': strategy})
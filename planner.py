@@ -0,0 +1,204 @@
+""" planner.py - Lookahead planning over a fast model of the building
+
+Elevator.get_command decides on the current tick alone.  The
+LookaheadPlanner starts from the commands it gave, then tries every
+other command for one car at a time, keeping a change whenever
+simulating the building a few ticks ahead shows less expected waiting.
+The rollouts run on a BuildingModel, a hashable snapshot of the cars
+and requests, and every (state, commands, depth) already evaluated is
+kept in a transposition table, so overlapping rollouts, within a tick
+and from one tick to the next, are only simulated once.  Under the
+per tick time budget the best commands found so far are returned.
+"""
+import timeit
+
+clock = timeit.default_timer
+
+# The commands tried for every car, as (speed, direction)
+CANDIDATES = ((0, 1), (0, -1), (1, 1), (1, -1))
+
+
+class BuildingModel(object):
+    """ A deterministic model of the building, as the simulator runs it.
+
+    A state is a (cars, requests) pair: cars is a tuple of (floor,
+    direction, speed, buttons) per car, buttons a frozenset of floors,
+    and requests a frozenset of waiting (floor, direction).  A moving car
+    goes one floor along its direction, a stopped one lets its riders out
+    and takes the request waiting along its direction, whose rider is
+    assumed to press the middle floor of the way left.
+    """
+
+    def __init__(self, n_floors):
+        self.top = n_floors - 1
+
+    def expected_destination(self, floor, direction):
+        if direction == 1:
+            return (floor + 1 + self.top) // 2
+        return max((floor - 1) // 2, 0)
+
+    def step(self, cars, requests, commands):
+        """ Apply the (speed, direction) commands, None keeping a car as it is,
+            and advance one tick.  Returns the new cars and requests """
+        new_cars = []
+        for car, command in zip(cars, commands):
+            floor, direction, speed, buttons = car
+            if command is not None:
+                speed, direction = command
+            if speed:
+                floor = min(max(floor + direction, 0), self.top)
+            else:
+                if floor in buttons:
+                    buttons = buttons - frozenset([floor])
+                req = (floor, direction)
+                if req in requests:
+                    requests = requests - frozenset([req])
+                    buttons = buttons | frozenset([self.expected_destination(floor, direction)])
+            new_cars.append((floor, direction, speed, buttons))
+        return tuple(new_cars), requests
+
+    @staticmethod
+    def waiting(cars, requests):
+        """ The number of waiting requests and pressed buttons """
+        return len(requests) + sum(len(car[3]) for car in cars)
+
+    @staticmethod
+    def default_command(car, requests):
+        """ The command of a car in the rollouts: stop where there is
+            something to do, otherwise head for the targets ahead, then behind """
+        floor, direction, speed, buttons = car
+        if floor in buttons or (floor, direction) in requests:
+            return 0, direction
+        ahead = behind = False
+        for target in buttons:
+            if (target - floor) * direction > 0:
+                ahead = True
+            else:
+                behind = True
+        for target, req_direction in requests:
+            if (target - floor) * direction > 0:
+                ahead = True
+            elif target == floor:
+                # Waiting the other way, turn around here
+                return 0, req_direction
+            else:
+                behind = True
+        if ahead:
+            return 1, direction
+        if behind:
+            return 1, -direction
+        return 0, direction
+
+    def default_commands(self, cars, requests):
+        return tuple(self.default_command(car, requests) for car in cars)
+
+
+class LookaheadPlanner(object):
+    """ Improve the commands of a Controller by simulating ahead """
+
+    def __init__(self, n_floors, horizon=8, time_budget=0.05, max_entries=200000, clock=clock):
+        """
+        :param n_floors:
+            The number of floors of the building
+        :param horizon:
+            The number of ticks simulated for every candidate
+        :param time_budget:
+            The seconds to spend per tick, the best commands found are
+            returned once it runs out
+        :param max_entries:
+            The size of the transposition table, cleared once full
+        """
+        self.model = BuildingModel(n_floors)
+        self.horizon = horizon
+        self.time_budget = time_budget
+        self.max_entries = max_entries
+        self.clock = clock
+        self.table = {}
+        self.n_evaluated = 0
+        self.n_hits = 0
+
+    def evaluate(self, cars, requests, commands, depth):
+        """ The expected waiting of the commands, then the default ones, over depth ticks """
+        key = (cars, requests, commands, depth)
+        cost = self.table.get(key, None)
+        if cost is not None:
+            self.n_hits += 1
+            return cost
+        self.n_evaluated += 1
+        cars, requests = self.model.step(cars, requests, commands)
+        cost = self.model.waiting(cars, requests)
+        if depth > 1:
+            cost += self.evaluate(cars, requests, self.model.default_commands(cars, requests), depth - 1)
+        if len(self.table) >= self.max_entries:
+            self.table = {}
+        self.table[key] = cost
+        return cost
+
+    def snapshot(self, controller):
+        """ The model state of the controller's elevators and waiting requests """
+        cars = tuple((el.floor, el.direction, el.speed, frozenset(el.button_pressed))
+                     for el in controller.elevators)
+        return cars, frozenset(controller.requests)
+
+    def plan(self, controller, commands, time_budget=None, max_passes=1):
+        """ Improve on commands, the Command or None of every elevator, in the time budget.
+
+        Every pass tries each candidate command of each car in turn, keeping
+        the improvements.  The passes stop once one improved nothing, or
+        after max_passes, None for as many as the time budget allows.
+
+        :param time_budget:
+            The seconds to spend, defaults to the planner's time_budget
+        """
+        if time_budget is None:
+            time_budget = self.time_budget
+        cars, requests = self.snapshot(controller)
+        best = [None if command is None else (command.speed, command.direction) for command in commands]
+        best = self.search(cars, requests, best, self.clock() + time_budget, max_passes)
+        return self.commands(controller, commands, best)
+
+    def speculate(self, controller, commands, time_budget):
+        """ Plan the next tick ahead of its state, from where the commands sent
+            take the controller's building and starting from the same commands,
+            with as many passes as the time budget allows.  Nothing is returned, the rollouts are kept in the
+            transposition table for the next plan to find """
+        cars, requests = self.snapshot(controller)
+        by_id = dict((command.id, (command.speed, command.direction)) for command in commands)
+        sent = tuple(by_id.get(el.id_, None) for el in controller.elevators)
+        cars, requests = self.model.step(cars, requests, sent)
+        # The cars mostly keep their commands from one tick to the next
+        self.search(cars, requests, list(sent), self.clock() + time_budget, None)
+
+    def search(self, cars, requests, best, deadline, max_passes):
+        """ The best (speed, direction) or None of every car found by the passes
+            from best, up to the deadline """
+        best_cost = self.evaluate(cars, requests, tuple(best), self.horizon)
+        n_passes = 0
+        improved = True
+        while improved and (max_passes is None or n_passes < max_passes):
+            improved = False
+            n_passes += 1
+            for idx in range(len(best)):
+                for candidate in CANDIDATES:
+                    if self.clock() > deadline:
+                        return best
+                    if candidate == best[idx]:
+                        continue
+                    trial = list(best)
+                    trial[idx] = candidate
+                    cost = self.evaluate(cars, requests, tuple(trial), self.horizon)
+                    if cost < best_cost:
+                        best, best_cost = trial, cost
+                        improved = True
+        return best
+
+    @staticmethod
+    def commands(controller, commands, best):
+        """ The Commands of the planned (speed, direction), issued through the elevators """
+        planned = []
+        for el, command, choice in zip(controller.elevators, commands, best):
+            if choice is not None and (command is None or choice != (command.speed, command.direction)):
+                speed, direction = choice
+                command = el.command(speed=speed, direction=direction)
+            planned.append(command)
+        return planned
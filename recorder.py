@@ -0,0 +1,147 @@
+""" recorder.py - Record runs to a compact binary trace, and replay them
+
+A trace is a magic header followed by length prefixed records, each
+one a JSON object compressed with a zlib stream shared by the whole
+trace, flushed after every record: a header with the plan, strategy,
+controller seed and number of zones, then alternating state responses
+and the command lists the controller answered with.  Replaying a trace
+feeds the recorded states back through a controller built and seeded
+the same way, with no network, and checks that the same commands come
+out.
+"""
+import collections
+import json
+import struct
+import zlib
+
+from boxlift_api import Command
+from controller import Controller
+from state import as_json
+from zoning import ZonedController
+
+MAGIC = b'LIFTTRC1'
+LENGTH = struct.Struct('>I')
+
+ReplayResult = collections.namedtuple('ReplayResult', ['n_ticks', 'mismatches', 'resp'])
+
+
+class TraceError(Exception):
+    """ The file is not a valid trace """
+
+
+def encode_commands(commands):
+    return [[command.id, command.direction, command.speed] for command in commands]
+
+
+def decode_commands(data):
+    return [Command(id_, direction, speed) for id_, direction, speed in data]
+
+
+class TraceWriter(object):
+    """ Write a run to a trace file """
+
+    def __init__(self, path, plan, seed, n_zones=1):
+        """ Opens the trace at path for a run of the plan, with a controller seeded with seed,
+            a ZonedController if n_zones is over 1 """
+        self.fp = open(path, 'wb')
+        self.fp.write(MAGIC)
+        self.compressor = zlib.compressobj()
+        self._write({'kind': 'header', 'plan': plan.__name__, 'name': plan.name,
+                     'strategy': plan.strategy.__name__, 'seed': seed, 'zones': n_zones})
+
+    def _write(self, record):
+        data = self.compressor.compress(json.dumps(record, separators=(',', ':'), default=as_json).encode('utf-8'))
+        data += self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.fp.write(LENGTH.pack(len(data)))
+        self.fp.write(data)
+
+    def write_state(self, resp):
+        self._write({'kind': 'state', 'state': resp})
+
+    def write_commands(self, commands):
+        self._write({'kind': 'commands', 'commands': encode_commands(commands)})
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_trace(path):
+    """ Iterate over the records of a trace file, the header first """
+    with open(path, 'rb') as fp:
+        if fp.read(len(MAGIC)) != MAGIC:
+            raise TraceError("Not a trace file: {}".format(path))
+        decompressor = zlib.decompressobj()
+        while True:
+            prefix = fp.read(LENGTH.size)
+            if not prefix:
+                return
+            if len(prefix) != LENGTH.size:
+                raise TraceError("Truncated trace file: {}".format(path))
+            size, = LENGTH.unpack(prefix)
+            data = fp.read(size)
+            if len(data) != size:
+                raise TraceError("Truncated trace file: {}".format(path))
+            yield json.loads(decompressor.decompress(data).decode('utf-8'))
+
+
+def read_header(path):
+    for record in read_trace(path):
+        return record
+
+
+def replay(path, plan, verbose=False):
+    """ Feed a recorded trace back through a Controller.
+
+    :param path:
+        The trace file
+    :param plan:
+        The plan to build the controller for, the one of the trace unless
+        checking a strategy change against recorded traffic
+    :return:
+        A ReplayResult with the number of ticks replayed, the ticks where the
+        commands differ from the recorded ones and the last state
+    """
+    records = read_trace(path)
+    header = next(records)
+    if header.get('kind', None) != 'header':
+        raise TraceError("Trace has no header: {}".format(path))
+    # Traces from before the zones were recorded are from a single controller
+    n_zones = header.get('zones', 1)
+    if n_zones > 1:
+        controller = ZonedController(plan, n_zones=n_zones, seed=header['seed'])
+    else:
+        controller = Controller(plan, seed=header['seed'])
+
+    n_ticks = 0
+    mismatches = []
+    resp = None
+    commands = None
+    try:
+        for record in records:
+            if record['kind'] == 'state':
+                resp = record['state']
+                if resp.get('status', '') == 'finished':
+                    break
+                # As in main, the first state is not shuffled
+                if n_ticks == 0:
+                    controller.update(resp)
+                    commands = controller.get_commands()
+                else:
+                    commands = controller.step(resp)
+                n_ticks += 1
+            elif record['kind'] == 'commands':
+                if encode_commands(commands) != record['commands']:
+                    mismatches.append(n_ticks - 1)
+                    if verbose:
+                        print("Tick {}: replayed {} recorded {}".format(
+                            n_ticks - 1, encode_commands(commands), record['commands']))
+    finally:
+        if n_zones > 1:
+            controller.close()
+    return ReplayResult(n_ticks, mismatches, resp)
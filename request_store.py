@@ -0,0 +1,210 @@
+""" request_store.py - An indexed container for the requests assigned to an elevator
+
+The store keeps (floor, direction) requests in insertion order like
+the plain list it replaces, but also indexes them by key, by floor and
+as sorted floor arrays, so that membership is O(1) and the lowest,
+highest and nearest request queries are O(log n).
+
+A RequestIndex maps every request to the elevator owning it across a
+controller, kept up to date by the stores of the elevators.
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+
+
+class RequestStore(object):
+    """ The (floor, direction) requests assigned to a single elevator """
+
+    def __init__(self, requests=(), index=None, owner=None, counts=None, slot=None, dirty=None):
+        """ Takes the initial requests, and optionally a RequestIndex to keep
+            informed that the owner elevator id holds them, an array whose
+            slot entry is kept equal to the number of requests, and an array
+            whose slot entry is set to 1 whenever the requests change """
+        self.index = index
+        self.owner = owner
+        self.counts = counts
+        self.slot = slot
+        self.dirty = dirty
+        self._order = OrderedDict()      # (floor, direction) -> insertion sequence
+        self._at_floor = {}              # floor -> requests on that floor, in insertion order
+        self._floors = []                # sorted distinct floors
+        self._along = {1: [], -1: []}    # direction -> sorted floors
+        self._seq = 0
+        if counts is not None:
+            counts[slot] = 0
+        if dirty is not None:
+            dirty[slot] = 1
+        for floor, direction in requests:
+            self.add(floor, direction)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __iter__(self):
+        return iter(list(self._order))
+
+    def __contains__(self, req):
+        return req in self._order
+
+    def __repr__(self):
+        return repr(list(self._order))
+
+    def contains(self, floor, direction=None):
+        """ Is there a request on the floor, in the given direction if any """
+        if direction is None:
+            return floor in self._at_floor
+        return (floor, direction) in self._order
+
+    def add(self, floor, direction):
+        """ Add a request, returns False if it was already present """
+        req = (floor, direction)
+        if req in self._order:
+            return False
+        self._order[req] = self._seq
+        self._seq += 1
+        at_floor = self._at_floor.get(floor, None)
+        if at_floor is None:
+            self._at_floor[floor] = [req]
+            insort(self._floors, floor)
+        else:
+            at_floor.append(req)
+        insort(self._along.setdefault(direction, []), floor)
+        if self.index is not None:
+            self.index.add(req, self.owner)
+        if self.counts is not None:
+            self.counts[self.slot] += 1
+        if self.dirty is not None:
+            self.dirty[self.slot] = 1
+        return True
+
+    def discard(self, floor, direction):
+        """ Remove a request, returns False if it was not present """
+        req = (floor, direction)
+        if req not in self._order:
+            return False
+        del self._order[req]
+        at_floor = self._at_floor[floor]
+        at_floor.remove(req)
+        if not at_floor:
+            del self._at_floor[floor]
+            _remove_sorted(self._floors, floor)
+        _remove_sorted(self._along[direction], floor)
+        if self.index is not None:
+            self.index.discard(req, self.owner)
+        if self.counts is not None:
+            self.counts[self.slot] -= 1
+        if self.dirty is not None:
+            self.dirty[self.slot] = 1
+        return True
+
+    def release(self):
+        """ Drop this store's requests from the index, once it is replaced """
+        if self.index is not None:
+            for req in self._order:
+                self.index.discard(req, self.owner)
+            self.index = None
+        self.counts = None
+        self.dirty = None
+
+    def first_at(self, floor):
+        """ The first assigned request on a floor, or None """
+        at_floor = self._at_floor.get(floor, None)
+        if at_floor:
+            return at_floor[0]
+
+    def lowest(self):
+        """ The request on the lowest floor, the earliest assigned one on ties """
+        if self._floors:
+            return self._at_floor[self._floors[0]][0]
+
+    def highest(self):
+        """ The request on the highest floor, the latest assigned one on ties """
+        if self._floors:
+            return self._at_floor[self._floors[-1]][-1]
+
+    def nearest(self, floor):
+        """ The request closest to a floor, the earliest assigned one on ties """
+        if not self._floors:
+            return None
+        idx = bisect_left(self._floors, floor)
+        if idx < len(self._floors) and self._floors[idx] == floor:
+            return self._at_floor[floor][0]
+
+        below = self._at_floor[self._floors[idx - 1]][0] if idx > 0 else None
+        above = self._at_floor[self._floors[idx]][0] if idx < len(self._floors) else None
+        if below is None:
+            return above
+        if above is None:
+            return below
+        d_below, d_above = floor - below[0], above[0] - floor
+        if d_below != d_above:
+            return below if d_below < d_above else above
+        return below if self._order[below] < self._order[above] else above
+
+    def behind(self, floor, direction):
+        """ The requests on the floors an elevator at floor heading in direction
+            has left behind, in insertion order """
+        if direction == 1:
+            floors = self._floors[:bisect_left(self._floors, floor)]
+        elif direction == -1:
+            floors = self._floors[bisect_right(self._floors, floor):]
+        else:
+            return []
+        reqs = [req for at_floor in floors for req in self._at_floor[at_floor]]
+        reqs.sort(key=self._order.__getitem__)
+        return reqs
+
+    def floors_along(self, direction):
+        """ The sorted floors of the requests in a direction, in the order of travel """
+        floors = list(self._along.get(direction, []))
+        if direction == -1:
+            floors.reverse()
+        return floors
+
+
+class RequestIndex(object):
+    """ Which elevator owns each (floor, direction) request, across a controller """
+
+    def __init__(self):
+        self.owners = {}        # (floor, direction) -> elevator id
+        self.by_elevator = {}   # elevator id -> set of (floor, direction)
+        self.released = set()   # requests discarded by their elevator since assigned
+
+    def __len__(self):
+        return len(self.owners)
+
+    def __contains__(self, req):
+        return req in self.owners
+
+    def owner(self, req):
+        """ The id of the elevator owning the request, or None """
+        return self.owners.get(req, None)
+
+    def add(self, req, el_id):
+        previous = self.owners.get(req, None)
+        if previous is not None and previous != el_id:
+            self.by_elevator[previous].discard(req)
+        self.owners[req] = el_id
+        self.by_elevator.setdefault(el_id, set()).add(req)
+        self.released.discard(req)
+
+    def discard(self, req, el_id):
+        """ Forget the request, if it is still owned by the elevator """
+        if self.owners.get(req, None) != el_id:
+            return
+        del self.owners[req]
+        self.by_elevator[el_id].discard(req)
+        self.released.add(req)
+
+    def requests_of(self, el_id):
+        """ A snapshot of the requests owned by an elevator """
+        return frozenset(self.by_elevator.get(el_id, ()))
+
+    def unassigned(self, reqs):
+        """ The requests of reqs no elevator owns """
+        return [req for req in reqs if req not in self.owners]
+
+
+def _remove_sorted(floors, floor):
+    """ Remove one occurrence of a floor from a sorted list """
+    del floors[bisect_left(floors, floor)]
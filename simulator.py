@@ -0,0 +1,202 @@
+""" simulator.py - An offline, in-process stand in for the BoxLift API
+
+The LocalBoxLift object exposes the same interface as BoxLift
+(send_commands, get_building_state) and returns the same state
+structure, but the building is simulated locally so no network
+access is required.
+"""
+import collections
+import random
+
+import instrument
+from boxlift_api import changed_commands
+
+PASSENGER_POINTS = 100  # Points for an instantly delivered passenger
+
+
+class Passenger(object):
+    """ A single passenger waiting for, or riding in, an elevator """
+
+    __slots__ = ('floor', 'destination', 'spawned')
+
+    def __init__(self, floor, destination, spawned):
+        self.floor = floor
+        self.destination = destination
+        self.spawned = spawned
+
+    @property
+    def direction(self):
+        return 1 if self.destination > self.floor else -1
+
+
+class SimulatedElevator(object):
+    """ The simulation side state of a single elevator car """
+
+    def __init__(self, id_):
+        self.id_ = id_
+        self.floor = 0
+        self.speed = 0
+        self.direction = 1
+        self.passengers = []
+
+    def buttons_pressed(self):
+        return sorted(set(p.destination for p in self.passengers))
+
+    def state(self):
+        return {'id': self.id_,
+                'floor': self.floor,
+                'buttons_pressed': self.buttons_pressed()}
+
+
+class LocalBoxLift(object):
+    """ A drop in replacement for BoxLift which runs the building in process """
+
+    def __init__(self, plan, seed=None, arrival_rate=None, traffic=None, verbose=False,
+                 changed_only=False):
+        """ Takes a plan object and simulates its building locally.
+
+        :param plan:
+            The plan to simulate, it provides n_els, n_floors and n_iter
+        :type plan:
+            `BasePlan`
+        :param seed:
+            Seed for the passenger arrival generator, for reproducible runs
+        :type seed:
+            `int`
+        :param arrival_rate:
+            The expected number of new passengers per floor every 10 ticks,
+            overriding the rate of the traffic
+        :type arrival_rate:
+            `float`
+        :param traffic:
+            The passenger arrivals, defaults to the plan's traffic
+        :type traffic:
+            `Traffic`
+        :param verbose:
+            print every state to the console
+        :type verbose:
+            `bool`
+        :param changed_only:
+            only apply the commands changing the speed or direction last sent to an elevator,
+            as BoxLift sends them
+        :type changed_only:
+            `bool`
+        """
+        self.plan = plan
+        self.n_floors = plan.n_floors
+        self.n_iter = plan.n_iter
+        self.traffic = traffic or plan.traffic
+        if arrival_rate is not None:
+            self.traffic = self.traffic.scaled(arrival_rate)
+        self.verbose = verbose
+        self.changed_only = changed_only
+        self.sent = {}  # elevator id -> the (speed, direction) last sent
+        self.n_commands = 0
+        self.rng = random.Random(seed)
+        self.arrivals = self.traffic.arrivals(self.n_floors, self.rng)
+
+        self.elevators = [SimulatedElevator(idx) for idx in range(plan.n_els)]
+        # Only the floors with passengers waiting are kept
+        self.waiting = collections.defaultdict(list)
+        self.tick = 0
+        self.score = 0
+        self.n_delivered = 0
+
+        self.game_id = 'local-{}'.format(plan.name)
+        self.token = self._new_token()
+        self.status = 'in_progress'
+        self.building_url = 'local://' + self.game_id
+        self.visualization_url = None
+
+    def _new_token(self):
+        return '{}-{}'.format(self.game_id, self.tick)
+
+    def get_building_state(self):
+        """ The current state, without advancing the clock """
+        requests = set()
+        for floor, passengers in self.waiting.items():
+            for passenger in passengers:
+                requests.add((floor, passenger.direction))
+
+        state = {'id': self.game_id,
+                 'token': self.token,
+                 'status': self.status,
+                 'floors': self.n_floors,
+                 'elevators': [el.state() for el in self.elevators],
+                 'requests': [{'floor': floor, 'direction': direction}
+                              for floor, direction in sorted(requests)],
+                 'message': 'Building In Progress'}
+        if self.status == 'finished':
+            state['score'] = self.score
+            state['message'] = 'Building Finished'
+        return state
+
+    def send_commands(self, commands=None):
+        """ Apply the commands and advance the clock.  Returns the new state of the world.
+
+        Elevators without a command keep their last speed and direction.
+        """
+        commands = commands or []
+        if self.status == 'finished':
+            return self.get_building_state()
+        if self.changed_only:
+            commands = changed_commands(commands, self.sent)
+
+        with instrument.timer('simulate'):
+            for command in commands:
+                el = self.elevators[int(command.id)]
+                el.speed = command.speed
+                el.direction = command.direction
+                self.sent[command.id] = (command.speed, command.direction)
+            self.n_commands += len(commands)
+            self.step()
+            state = self.get_building_state()
+        if self.verbose:
+            print(state)
+        return state
+
+    def step(self):
+        """ Advance the building by a single tick """
+        for el in self.elevators:
+            if el.speed:
+                el.floor = min(max(el.floor + el.direction, 0), self.n_floors - 1)
+            else:
+                self.exchange_passengers(el)
+
+        self.spawn_passengers()
+
+        self.tick += 1
+        self.token = self._new_token()
+        if self.tick >= self.n_iter:
+            self.status = 'finished'
+
+    def exchange_passengers(self, el):
+        """ Unload passengers at their destination and board those
+            waiting in the direction of the indicator """
+        riding = []
+        for passenger in el.passengers:
+            if passenger.destination == el.floor:
+                self.deliver(passenger)
+            else:
+                riding.append(passenger)
+
+        waiting = []
+        for passenger in self.waiting[el.floor]:
+            if passenger.direction == el.direction:
+                riding.append(passenger)
+            else:
+                waiting.append(passenger)
+        el.passengers = riding
+        if waiting:
+            self.waiting[el.floor] = waiting
+        else:
+            self.waiting.pop(el.floor, None)
+
+    def deliver(self, passenger):
+        self.n_delivered += 1
+        self.score += max(1, PASSENGER_POINTS - (self.tick - passenger.spawned))
+
+    def spawn_passengers(self):
+        """ Spawn the passengers the traffic brings this tick """
+        for floor, destination in next(self.arrivals):
+            self.waiting[floor].append(Passenger(floor, destination, self.tick))
@@ -0,0 +1,150 @@
+""" state.py - Typed, pre-parsed state responses of the BoxLift API
+
+A decoded response is parsed once into an immutable BuildingState,
+holding its ElevatorStates and RequestStates, normalizing what the
+server leaves out on the way: a missing request list or buttons_pressed
+list is an empty one, a missing floor is the ground floor.  The requests
+are (floor, direction) tuples, ready to be used as keys, and the
+buttons are tuples.  The Controller reads the attributes directly.
+
+The records still answer the dict lookups of the code around the
+controller (state['status'], state.get('score', None), 'token' in
+state) like the dicts they replace: a field the server did not send is
+None as an attribute, but missing as a key, while a field sent as null
+is present.  They convert back with as_dict.
+"""
+import collections
+
+
+class RequestState(collections.namedtuple('RequestState', ['floor', 'direction'])):
+    """ A waiting request, a plain (floor, direction) tuple """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        # tuple.__new__ skips the namedtuple argument handling
+        return tuple.__new__(cls, (data['floor'], data['direction']))
+
+
+class _Record(object):
+    """ An immutable __slots__ record with read only dict access to its fields """
+
+    __slots__ = ('extra', 'given')
+
+    FIELDS = ()
+
+    def __init__(self, **kwargs):
+        object.__setattr__(self, 'given', frozenset(field for field in self.FIELDS if field in kwargs))
+        for field in self.FIELDS:
+            object.__setattr__(self, field, kwargs.pop(field, None))
+        object.__setattr__(self, 'extra', kwargs)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __getitem__(self, key):
+        if key in self.given:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.given or key in self.extra
+
+    def keys(self):
+        return [field for field in self.FIELDS if field in self.given] + list(self.extra)
+
+    def as_dict(self):
+        """ The record as a plain dict, the nested records left as they are """
+        data = dict(self.extra)
+        for field in self.FIELDS:
+            if field in self.given:
+                data[field] = getattr(self, field)
+        return data
+
+    def __eq__(self, other):
+        if isinstance(other, _Record):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # The fields cannot be set after __init__, rebuild the record from them instead
+        fields = dict(self.extra)
+        for field in self.given:
+            fields[field] = getattr(self, field)
+        return _rebuild, (type(self), fields)
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, self.as_dict())
+
+
+class ElevatorState(_Record):
+    """ The state of a single elevator car """
+
+    __slots__ = ('id', 'floor', 'buttons_pressed')
+
+    FIELDS = __slots__
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        data = dict(data)
+        data['floor'] = data.get('floor', None) or 0
+        data['buttons_pressed'] = tuple(data.get('buttons_pressed', None) or ())
+        return cls(**data)
+
+    def as_dict(self):
+        data = super(ElevatorState, self).as_dict()
+        data['buttons_pressed'] = list(self.buttons_pressed)
+        return data
+
+
+class BuildingState(_Record):
+    """ A state response of the building """
+
+    __slots__ = ('id', 'status', 'token', 'message', 'floors', 'score', 'elevators', 'requests')
+
+    FIELDS = __slots__
+
+    @classmethod
+    def from_dict(cls, data):
+        """ The state of a decoded response, parsed and normalized """
+        if isinstance(data, cls) or not isinstance(data, dict):
+            # Already parsed, or not a JSON object, probably an empty response
+            return data
+        data = dict(data)
+        data['requests'] = tuple([RequestState.from_dict(req) for req in data.get('requests', None) or ()])
+        elevators = data.get('elevators', None)
+        if elevators is not None:
+            data['elevators'] = tuple([ElevatorState.from_dict(el) for el in elevators])
+        return cls(**data)
+
+    def as_dict(self):
+        data = super(BuildingState, self).as_dict()
+        data['requests'] = [{'floor': floor, 'direction': direction} for floor, direction in self.requests]
+        if self.elevators is not None:
+            data['elevators'] = list(self.elevators)
+        return data
+
+
+def _rebuild(cls, fields):
+    return cls(**fields)
+
+
+def as_json(obj):
+    """ A json.dumps default, encoding the records as objects """
+    if isinstance(obj, _Record):
+        return obj.as_dict()
+    raise TypeError("{!r} is not JSON serializable".format(obj))
@@ -1,12 +1,20 @@
 """ strategy.py - Include various strategies which could be included
 in plan objects themselves, or added via CLI arguments
 """
+from demand import DemandModel
+from planner import LookaheadPlanner
 
 
 class BaseStrategy(object):
     """ A base Strategy object """
 
     do_shuffle = True
+    assignment = 'greedy'  # 'greedy' in arrival order, or a min-cost 'matching' per tick (needs
+                           # a vectorized_distance_metric, greedy otherwise)
+    capacity = None        # The maximum number of requests per elevator when matching
+    load_weight = 1        # The weight of an elevator's load in the distance metric
+    load_exponent = 2      # The exponent of an elevator's load in the distance metric
+    rehome_every = 1       # Ticks between two homings of the idle elevators, with a demand model
 
     @classmethod
     def name(cls):
@@ -19,6 +27,16 @@ class BaseStrategy(object):
 
         pass
 
+    @classmethod
+    def make_planner(cls, plan):
+        """ The planner revising the elevator commands every tick, or None """
+        return None
+
+    @classmethod
+    def make_demand_model(cls, plan):
+        """ The demand model the idle elevators are homed from every tick, or None """
+        return None
+
     @classmethod
     def distance_metric(cls, el, req):
         """ Customize a distance metric for making decisions """
@@ -27,18 +45,64 @@ class BaseStrategy(object):
 
         distance = abs(el.distance_to(req[0]))
 
-        return distance * (1 + (n_reqs + n_btns) ** 2)
+        return distance * (1 + cls.load_weight * (n_reqs + n_btns) ** cls.load_exponent)
+
+    @classmethod
+    def vectorized_distance_metric(cls, floors, directions, loads, req_floors, req_directions):
+        """ The distance metric over NumPy arrays.  The elevator floors, directions
+        and loads (requests + buttons) are columns, the request floors and
+        directions are rows, and the result is the elevators x requests costs """
+        return abs(req_floors - floors) * (1 + cls.load_weight * loads ** cls.load_exponent)
 
 
 class SplitHome(BaseStrategy):
     """ Assign the elevators to different home positions, half
         at the ground floor, half at the top """
 
+    split = 0.5       # The fraction of the elevators homed at the ground floor
+    upper_home = 1.   # The home of the others, as a fraction of the building height
+
     @classmethod
     def init_elevators(cls, elevators):
         n_els = len(elevators)
         for el in elevators:
-            if el.id_ < n_els / 2:
+            if el.id_ < int(n_els * cls.split):
                 el.home_floor = 0
             else:
-                el.home_floor = el.n_floors
+                el.home_floor = int(el.n_floors * cls.upper_home)
+
+
+class Matching(BaseStrategy):
+    """ Assign each tick's new requests, and those elevators are moving
+        away from, jointly with a min-cost matching """
+
+    do_shuffle = False
+    assignment = 'matching'
+
+
+class CapacityMatching(Matching):
+    """ Matching, with a cap on the number of requests an elevator holds """
+
+    capacity = 4
+
+
+class Lookahead(BaseStrategy):
+    """ Revise the elevator commands by simulating the building a few ticks ahead """
+
+    horizon = 8          # Ticks simulated for every candidate command
+    time_budget = 0.05   # Seconds of planning per tick
+
+    @classmethod
+    def make_planner(cls, plan):
+        return LookaheadPlanner(plan.n_floors, horizon=cls.horizon, time_budget=cls.time_budget)
+
+
+class DemandHome(BaseStrategy):
+    """ Home the idle elevators where the next requests are forecast to
+        appear, following the hot floors as the traffic shifts """
+
+    half_life = 200    # Ticks for the weight of an observed request to halve
+
+    @classmethod
+    def make_demand_model(cls, plan):
+        return DemandModel(plan.n_floors, half_life=cls.half_life)
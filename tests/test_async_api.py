@@ -0,0 +1,72 @@
+""" Test the concurrent building driver """
+
+import unittest
+
+from async_api import AsyncBoxLift, Future, Run, run_concurrently
+from controller import Controller
+from plan import BasePlan
+from simulator import LocalBoxLift
+
+
+class TestPlan(BasePlan):
+    name = "Test Plan"
+
+
+class LongPlan(TestPlan):
+    n_iter = 60
+
+
+class FlakyApi(object):
+    """ Fails every other call """
+
+    def __init__(self, api):
+        self.api = api
+        self.n_calls = 0
+
+    def send_commands(self, commands=None):
+        self.n_calls += 1
+        if self.n_calls % 2:
+            return {'status': 'error', 'message': 'flaky'}
+        return self.api.send_commands(commands)
+
+
+class AsyncApiTest(unittest.TestCase):
+
+    def test_future(self):
+        future = Future()
+        done = []
+        future.add_done_callback(done.append)
+        self.assertFalse(future.done())
+        future.set_result(3)
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(), 3)
+        self.assertEqual(done, [future])
+
+        future = Future()
+        future.set_exception(ValueError())
+        self.assertRaises(ValueError, future.result)
+
+    def test_async_boxlift(self):
+        api = AsyncBoxLift(LocalBoxLift(TestPlan, seed=1))
+        state = api.get_building_state().result(timeout=5)
+        self.assertEqual(state['status'], 'in_progress')
+        api.close()
+        self.assertFalse(api._thread.is_alive())
+
+    def test_run_concurrently(self):
+        runs = []
+        for plan in [TestPlan, LongPlan]:
+            api = AsyncBoxLift(LocalBoxLift(plan, seed=1))
+            runs.append(Run(plan.__name__, Controller(plan), api))
+        flaky = FlakyApi(LocalBoxLift(TestPlan, seed=1))
+        runs.append(Run('flaky', Controller(TestPlan), AsyncBoxLift(flaky)))
+
+        run_concurrently(runs)
+        for run in runs:
+            self.assertEqual(run.resp['status'], 'finished')
+            self.assertTrue(run.ticks_per_second > 0)
+        self.assertEqual(runs[1].n_ticks, LongPlan.n_iter)
+
+
+if __name__ == '__main__':
+    unittest.main()
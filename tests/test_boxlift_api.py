@@ -0,0 +1,60 @@
+""" Test the BoxLift client against a scripted transport """
+
+import json
+import unittest
+
+from boxlift_api import BoxLift, Command
+from transport import TransportError
+
+
+class ScriptedTransport(object):
+    """ Answers every post with an in progress state, recording the bodies """
+
+    def __init__(self):
+        self.bodies = []
+        self.fail = False
+
+    def post(self, url, body):
+        self.bodies.append(json.loads(body))
+        if self.fail:
+            raise TransportError(url, 503, 'Service Unavailable')
+        return json.dumps({'id': 'b1', 'token': 't{}'.format(len(self.bodies)), 'status': 'in_progress',
+                           'building': '/b1', 'visualization': None, 'message': 'ok',
+                           'elevators': [], 'requests': []})
+
+
+class BoxLiftTest(unittest.TestCase):
+
+    def make_api(self, changed_only):
+        self.transport = ScriptedTransport()
+        return BoxLift('bot', 'training_1', 'bot@example.com', transport=self.transport,
+                       changed_only=changed_only)
+
+    def sent(self):
+        return self.transport.bodies[-1]['commands']
+
+    def test_all_commands(self):
+        api = self.make_api(False)
+        commands = [Command(0, 1, 1), Command(1, -1, 0)]
+        api.send_commands(commands)
+        api.send_commands(commands)
+        self.assertEqual(sorted(self.sent()), ['0', '1'])
+
+    def test_changed_only(self):
+        api = self.make_api(True)
+        api.send_commands([Command(0, 1, 1), Command(1, -1, 0)])
+        self.assertEqual(sorted(self.sent()), ['0', '1'])
+        api.send_commands([Command(0, 1, 1), Command(1, 1, 0)])
+        self.assertEqual(self.sent(), {'1': {'speed': 0, 'direction': 1}})
+        # Nothing changed, a command is still sent for the clock to advance
+        api.send_commands([Command(0, 1, 1), Command(1, 1, 0)])
+        self.assertEqual(sorted(self.sent()), ['0'])
+
+    def test_changed_only_failure(self):
+        api = self.make_api(True)
+        self.transport.fail = True
+        self.assertEqual(api.send_commands([Command(0, 1, 1)])['status'], 'error')
+        self.transport.fail = False
+        # The failed command was not delivered, so it is sent again
+        api.send_commands([Command(0, 1, 1), Command(1, -1, 0)])
+        self.assertEqual(sorted(self.sent()), ['0', '1'])
@@ -0,0 +1,94 @@
+""" Test the JSON codecs and the typed state responses """
+
+import json
+import pickle
+import unittest
+
+from codec import JSONCodec, available_codecs, get_codec
+from state import BuildingState, ElevatorState, RequestState, as_json
+
+
+RESPONSE = {u'status': u'in_progress',
+            u'token': u'Token',
+            u'floors': 10,
+            u'elevators': [{u'id': 0, u'floor': 3},
+                           {u'id': 1, u'floor': 2, u'buttons_pressed': [5]}],
+            u'message': u'Building In Progress'}
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_codecs(self):
+        self.assertIn('json', available_codecs())
+        self.assertRaises(ValueError, get_codec, 'yaml')
+        self.assertIsNotNone(get_codec())
+        for name in available_codecs():
+            codec = get_codec(name)
+            body = codec.dumps(RESPONSE)
+            self.assertTrue(isinstance(body, bytes))
+            self.assertEqual(codec.loads(body), RESPONSE)
+
+    def test_building_state(self):
+        state = BuildingState.from_dict(JSONCodec.loads(JSONCodec.dumps(RESPONSE)))
+        self.assertEqual(state['status'], 'in_progress')
+        self.assertEqual(state.token, 'Token')
+        self.assertEqual(state['requests'], ())
+        self.assertIsNone(state.get('score', None))
+        self.assertNotIn('score', state)
+        self.assertRaises(KeyError, state.__getitem__, 'score')
+
+        el0, el1 = state['elevators']
+        self.assertTrue(isinstance(el0, ElevatorState))
+        self.assertEqual(el0.get('buttons_pressed', None), ())
+        self.assertEqual(el1['buttons_pressed'], (5,))
+        self.assertEqual(el1.floor, 2)
+
+        data = json.loads(json.dumps(state, default=as_json))
+        self.assertEqual(data['elevators'][0], {'id': 0, 'floor': 3, 'buttons_pressed': []})
+        self.assertEqual(state, data)
+
+    def test_requests(self):
+        data = dict(RESPONSE, requests=[{u'floor': 4, u'direction': -1}, {u'floor': 1, u'direction': 1}])
+        state = BuildingState.from_dict(data)
+        self.assertEqual(state.requests, ((4, -1), (1, 1)))
+        self.assertTrue(isinstance(state.requests[0], RequestState))
+        self.assertEqual(state.requests[0].floor, 4)
+        self.assertEqual(state.requests[0].direction, -1)
+        self.assertIn((1, 1), set(state.requests))
+        self.assertEqual(state.as_dict()['requests'], data['requests'])
+        self.assertIs(BuildingState.from_dict(state), state)
+
+    def test_immutable(self):
+        state = BuildingState.from_dict(RESPONSE)
+        self.assertRaises(AttributeError, setattr, state, 'status', 'finished')
+        self.assertRaises(AttributeError, setattr, state.elevators[0], 'floor', 4)
+        self.assertRaises(AttributeError, setattr, state, 'not_a_field', 1)
+
+    def test_null_fields(self):
+        state = BuildingState.from_dict({'status': 'finished', 'score': None, 'token': None})
+        self.assertIn('score', state)
+        self.assertIsNone(state['score'])
+        self.assertIsNone(state.get('token', 'missing'))
+        self.assertEqual(state.get('message', 'missing'), 'missing')
+        self.assertNotIn('message', state)
+        self.assertRaises(KeyError, state.__getitem__, 'message')
+        self.assertIsNone(state.message)
+        self.assertEqual(state.as_dict(), {'status': 'finished', 'score': None, 'token': None,
+                                           'requests': []})
+
+    def test_pickle(self):
+        state = BuildingState.from_dict(dict(RESPONSE, score=None, event_code='abc'))
+        copy = pickle.loads(pickle.dumps(state, 2))
+        self.assertEqual(copy, state)
+        self.assertIn('score', copy)
+        self.assertEqual(copy.elevators[1].buttons_pressed, (5,))
+
+    def test_extra_fields(self):
+        state = BuildingState.from_dict({'status': 'finished', 'score': 12, 'event_code': 'abc'})
+        self.assertEqual(state['event_code'], 'abc')
+        self.assertEqual(sorted(state.keys()), ['event_code', 'requests', 'score', 'status'])
+        self.assertEqual(BuildingState.from_dict(b''), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
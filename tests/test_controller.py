@@ -128,5 +128,78 @@ class ControllerTest(unittest.TestCase):
         self.controller.shuffle_requests()
 
         self.assertTrue(self.controller.elevators[1].is_request_assigned(*req))
+        self.assertEqual(self.controller.get_request_owner(req), 1)
+        self.assertEqual(self.controller.requests_per_elevator(), {0: set(), 1: set([req])})
+
+        # A snapshot, left untouched by later assignments
+        owned = self.controller.request_index.requests_of(1)
+        self.controller.elevators[1].assign_request(7, 1)
+        self.assertEqual(owned, frozenset([req]))
+        self.assertRaises(AttributeError, getattr, owned, 'add')
+
+    def test_add_remove_elevator(self):
+        self.configure_elevator(0, floor=3, reqs=[(1, 1)])
+        self.configure_elevator(1, floor=7, speed=1, direction=-1, btns=[2], reqs=[(5, -1), (6, -1)])
+        el = self.controller.add_elevator(floor=4, speed=1, direction=-1)
+        self.assertEqual((el.id_, el.floor, el.speed, el.direction), (2, 4, 1, -1))
+        self.assertEqual(len(self.controller.bank), 3)
+
+        removed = self.controller.remove_elevator(0)
+        self.assertIs(removed.requests.index, None)
+        self.assertIn((1, 1), self.controller.request_index.released)
+        # The following elevators move down, keeping their state and requests
+        el1, el2 = self.controller.elevators
+        self.assertEqual((el1.id_, el1.floor, el1.speed, el1.direction), (0, 7, 1, -1))
+        self.assertEqual(el1.button_pressed, [2])
+        self.assertEqual(list(el1.requests), [(5, -1), (6, -1)])
+        self.assertEqual(self.controller.get_request_owner((6, -1)), 0)
+        self.assertEqual(list(self.controller.bank.n_requests), [2, 0])
+        self.assertEqual((el2.id_, el2.floor), (1, 4))
+
+    def test_request_index(self):
+        resp = {u'status': u'in_progress',
+                u'elevators': [{u'id': 0, u'floor': 0},
+                               {u'id': 1, u'floor': 9}],
+                u'requests': [{u'floor': 1, u'direction': 1},
+                              {u'floor': 8, u'direction': -1}]}
+        self.controller.update(resp)
+        self.assertEqual(self.controller.get_request_owner((1, 1)), 0)
+        self.assertEqual(self.controller.get_request_owner((8, -1)), 1)
+        self.assertEqual(self.controller.unassigned_requests(), [])
+
+        # Serving a request releases it from the index
+        el = self.controller.elevators[0]
+        el.floor, el.speed, el.direction = 1, 1, 1
+        el.get_command()
+        self.assertFalse(self.controller.is_request_assigned((1, 1)))
+        self.assertEqual(self.controller.unassigned_requests(), [(1, 1)])
+
+        # Replacing the requests of an elevator keeps the index in sync
+        self.configure_elevator(1, reqs=[(5, 1)])
+        self.assertFalse(self.controller.is_request_assigned((8, -1)))
+        self.assertEqual(self.controller.get_request_owner((5, 1)), 1)
+
+    def test_update_delta(self):
+        resp = {u'elevators': [{u'id': 0, u'floor': 0}, {u'id': 1, u'floor': 4}],
+                u'requests': [{u'floor': 1, u'direction': 1}, {u'floor': 8, u'direction': -1}]}
+        self.controller.update(resp)
+        self.assertEqual(self.controller.delta.new_requests, [(1, 1), (8, -1)])
+        self.assertEqual(self.controller.delta.changed_elevators, [1])
+
+        resp = {u'elevators': [{u'id': 0, u'floor': 1}, {u'id': 1, u'floor': 4}],
+                u'requests': [{u'floor': 8, u'direction': -1}, {u'floor': 3, u'direction': 1}]}
+        self.controller.update(resp)
+        self.assertEqual(self.controller.delta.new_requests, [(3, 1)])
+        self.assertEqual(self.controller.delta.vanished_requests, set([(1, 1)]))
+        self.assertEqual(self.controller.delta.changed_elevators, [0])
+        self.assertTrue(self.controller.is_request_assigned((3, 1)))
+
+        # A request released by its elevator while still waiting is assigned again
+        owner = self.controller.elevators[self.controller.get_request_owner((8, -1))]
+        owner.remove_request(8, -1)
+        self.controller.update(resp)
+        self.assertEqual(self.controller.delta.new_requests, [])
+        self.assertTrue(self.controller.is_request_assigned((8, -1)))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+""" Test the demand model and the idle elevator homing """
+
+import unittest
+
+from controller import Controller
+from demand import DemandModel
+from plan import BasePlan
+from strategy import BaseStrategy, DemandHome
+
+
+class DemandPlan(BasePlan):
+    name = "Demand Plan"
+    n_els = 3
+    strategy = DemandHome
+
+
+class DemandModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.demand = DemandModel(10, half_life=10, min_requests=2)
+
+    def test_decay(self):
+        self.demand.observe([(3, 1), (3, -1)])
+        self.assertAlmostEqual(self.demand.weight(3), 2)
+        self.assertAlmostEqual(self.demand.weight(3, 1), 1)
+        for _ in range(10):
+            self.demand.observe([])
+        self.assertAlmostEqual(self.demand.weight(3), 1)
+        self.assertAlmostEqual(self.demand.n_requests, 1)
+        self.assertEqual(self.demand.weight(4), 0)
+
+    def test_advance(self):
+        # Advancing ahead of the observe is the same as observing
+        other = DemandModel(10, half_life=10, min_requests=2)
+        for demand in (self.demand, other):
+            demand.observe([(3, 1)])
+        self.demand.advance()
+        self.demand.observe([(5, -1)])
+        other.observe([(5, -1)])
+        self.assertEqual(self.demand.n_ticks, other.n_ticks)
+        self.assertEqual(self.demand.weight(3), other.weight(3))
+        self.assertEqual(self.demand.weight(5), other.weight(5))
+
+    def test_rescale(self):
+        self.demand.observe([(3, 1)])
+        self.demand.unit *= 1e100
+        self.demand.counts[1][3] *= 1e100
+        self.demand.total *= 1e100
+        self.demand.observe([(5, -1)])
+        self.assertEqual(self.demand.unit, 1.)
+        self.assertAlmostEqual(self.demand.weight(5, -1), 1)
+        self.assertAlmostEqual(self.demand.weight(3, 1), 2 ** -0.1)
+
+    def test_rate(self):
+        for _ in range(1000):
+            self.demand.observe([(2, 1)])
+        self.assertAlmostEqual(self.demand.rate(2, 1), 1)
+        self.assertAlmostEqual(self.demand.rate(2, -1), 0)
+
+    def test_homes(self):
+        self.assertIsNone(self.demand.homes(2))
+        self.demand.observe([(1, 1), (1, -1), (8, -1)])
+        self.assertEqual(self.demand.hot_floors(2), [1, 8])
+        self.assertEqual(self.demand.homes(1), [1])
+        self.assertEqual(self.demand.homes(2), [1, 8])
+        self.assertEqual(self.demand.homes(3), [1, 1, 8])
+        self.assertIsNone(self.demand.homes(0))
+
+    def test_homes_follow_demand(self):
+        for _ in range(50):
+            self.demand.observe([(1, 1)])
+        for _ in range(50):
+            self.demand.observe([(7, -1)])
+        self.assertEqual(self.demand.homes(1), [7])
+
+
+class DemandHomeTest(unittest.TestCase):
+
+    def test_rehome(self):
+        controller = Controller(DemandPlan, seed=1)
+        self.assertIsNotNone(controller.demand)
+        state = {'elevators': [{'id': 0, 'floor': 2, 'buttons_pressed': [5]},
+                               {'id': 1, 'floor': 9, 'buttons_pressed': []},
+                               {'id': 2, 'floor': 0, 'buttons_pressed': []}],
+                 'requests': [{'floor': 6, 'direction': 1}]}
+        controller.update(state)
+        self.assertEqual([el.home_floor for el in controller.elevators], [-1, -1, -1])
+
+        state['requests'] = [{'floor': 6, 'direction': -1}, {'floor': 7, 'direction': 1},
+                             {'floor': 8, 'direction': -1}, {'floor': 8, 'direction': 1}]
+        controller.update(state)
+        # The busy elevator keeps its home, the idle ones wait where the requests appear
+        idle = [el for el in controller.elevators if not el.has_any_requests()]
+        self.assertNotIn(controller.elevators[0], idle)
+        self.assertEqual(controller.elevators[0].home_floor, -1)
+        self.assertTrue(all(6 <= el.home_floor <= 8 for el in idle))
+
+    def test_model_only(self):
+        # A strategy providing a demand model, without any other setting
+        class Forecast(BasePlan):
+            class strategy(BaseStrategy):
+                @classmethod
+                def make_demand_model(cls, plan):
+                    return DemandModel(plan.n_floors)
+
+        controller = Controller(Forecast)
+        controller.update({'elevators': [{'id': 0, 'floor': 0}, {'id': 1, 'floor': 0}],
+                           'requests': [{'floor': 4, 'direction': 1}]})
+        self.assertEqual(controller.demand.n_ticks, 1)
+
+    def test_no_model(self):
+        self.assertIsNone(Controller(BasePlan).demand)
@@ -0,0 +1,76 @@
+""" Test the batch request dispatcher """
+
+import random
+import unittest
+
+import dispatch
+from dispatch import CostMatrixDispatcher, has_vectorized_metric
+from elevator import Elevator
+from strategy import BaseStrategy, SplitHome
+
+
+class ScalarOnly(BaseStrategy):
+
+    @classmethod
+    def distance_metric(cls, el, req):
+        return abs(el.distance_to(req[0]))
+
+
+def make_elevators(rng, n_els, n_floors):
+    elevators = []
+    for idx in range(n_els):
+        el = Elevator(idx, n_floors)
+        el.floor = rng.randrange(n_floors)
+        el.button_pressed = rng.sample(range(n_floors), rng.randrange(3))
+        for _ in range(rng.randrange(3)):
+            el.assign_request(rng.randrange(n_floors), rng.choice([1, -1]))
+        elevators.append(el)
+    return elevators
+
+
+def make_requests(rng, n_reqs, n_floors, elevators):
+    reqs = []
+    while len(reqs) < n_reqs:
+        req = (rng.randrange(n_floors), rng.choice([1, -1]))
+        if req not in reqs and not any(el.is_request_assigned(*req) for el in elevators):
+            reqs.append(req)
+    return reqs
+
+
+class DispatchTest(unittest.TestCase):
+
+    def test_has_vectorized_metric(self):
+        self.assertTrue(has_vectorized_metric(BaseStrategy))
+        self.assertTrue(has_vectorized_metric(SplitHome))
+        self.assertFalse(has_vectorized_metric(ScalarOnly))
+        self.assertFalse(CostMatrixDispatcher(ScalarOnly).vectorized)
+
+    def test_scalar_fallback(self):
+        np = dispatch.np
+        dispatch.np = None
+        try:
+            dispatcher = CostMatrixDispatcher(BaseStrategy)
+        finally:
+            dispatch.np = np
+        self.assertFalse(dispatcher.vectorized)
+
+        elevators = [Elevator(0, 10), Elevator(1, 10)]
+        elevators[0].floor = 3
+        elevators[1].floor = 1
+        self.assertEqual(dispatcher.assign(elevators, [(5, 1), (0, 1)]), [((5, 1), 0), ((0, 1), 1)])
+
+    @unittest.skipIf(dispatch.np is None, "NumPy is not installed")
+    def test_vectorized_matches_scalar(self):
+        for seed in range(50):
+            results = []
+            for vectorized in [True, False]:
+                dispatcher = CostMatrixDispatcher(BaseStrategy)
+                dispatcher.vectorized = vectorized
+                rng = random.Random(seed)
+                elevators = make_elevators(rng, 8, 50)
+                reqs = make_requests(rng, 20, 50, elevators)
+                results.append(dispatcher.assign(elevators, reqs))
+            self.assertEqual(results[0], results[1])
+
+if __name__ == '__main__':
+    unittest.main()
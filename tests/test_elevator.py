@@ -2,7 +2,7 @@
 
 import unittest
 
-from elevator import Elevator
+from elevator import Elevator, ElevatorBank, ElevatorIndex
 
 
 class ElevatorTest(unittest.TestCase):
@@ -70,6 +70,45 @@ class ElevatorTest(unittest.TestCase):
         self.assertEqual(self.el.floor, 1)
         self.assertEqual(self.el.button_pressed, [3, 5])
 
+    def test_bank(self):
+        bank = ElevatorBank(3)
+        els = [Elevator(idx, 10, bank=bank) for idx in range(3)]
+        els[1].floor = 4
+        els[2].direction = -1
+        els[2].button_pressed = [1, 3]
+        els[2].assign_request(5, 1)
+        els[0].requests = [(2, 1), (3, 1)]
+        self.assertEqual(list(bank.floor), [0, 4, 0])
+        self.assertEqual(list(bank.direction), [1, 1, -1])
+        self.assertEqual(list(bank.n_requests), [2, 0, 1])
+        self.assertEqual(list(bank.loads()), [2, 0, 3])
+
+        els[0].remove_request(2)
+        els[2].requests = []
+        self.assertEqual(list(bank.loads()), [1, 0, 2])
+        self.assertRaises(AttributeError, setattr, els[0], 'not_a_field', 1)
+
+    def test_index(self):
+        bank = ElevatorBank(5)
+        els = [Elevator(idx, 10, bank=bank) for idx in range(5)]
+        for el, floor, direction in zip(els, [2, 6, 8, 4, 6], [1, -1, 1, 0, -1]):
+            el.floor, el.direction = floor, direction
+        index = ElevatorIndex(bank)
+        # Going up from below, coming down from above, or idle
+        self.assertEqual(index.highest_not_moving_away(3), [1, 4])
+        self.assertEqual(index.highest_not_moving_away(7), [3])
+        self.assertEqual(index.highest_not_moving_away(9), [2])
+        self.assertEqual(index.highest_not_moving_away(1), [1, 4])
+        el = els[3]
+        el.direction = 1
+        self.assertEqual(ElevatorIndex(bank).highest_not_moving_away(9), [2])
+        self.assertEqual(ElevatorIndex(bank).highest_not_moving_away(0), [1, 4])
+        el.floor, el.direction = 9, -1
+        self.assertEqual(ElevatorIndex(bank).highest_not_moving_away(0), [3])
+        for el in els:
+            el.direction = -1
+        self.assertEqual(ElevatorIndex(bank).highest_not_moving_away(9), [])
+
     def check_command(self, speed=None, direction=None):
         command = self.el.get_command()
         self.assertIsNotNone(command)
@@ -102,5 +141,44 @@ class ElevatorTest(unittest.TestCase):
         self.el.floor = 5
         self.check_command(speed=0, direction=1)
 
+    def test_heading_home(self):
+        # Moving away from home with nothing to do, the elevator turns around
+        self.el.floor, self.el.speed, self.el.direction = 6, 1, 1
+        self.el.home_floor = 2
+        self.check_command(speed=1, direction=-1)
+        self.el.floor = 2
+        self.check_command(speed=0)
+
+    def test_next_command(self):
+        calls = []
+        get_command = self.el.get_command
+
+        class Counted(Elevator):
+            __slots__ = ()
+
+            def get_command(self):
+                calls.append(self.id_)
+                return get_command()
+
+        self.el.__class__ = Counted
+        # Stopped at home with nothing to do: the state is left untouched, the command reused
+        self.assertIsNone(self.el.next_command())
+        self.assertIsNone(self.el.next_command())
+        self.assertEqual(len(calls), 1)
+
+        self.el.assign_request(5, 1)
+        command = self.el.next_command()
+        self.assertEqual((command.speed, command.direction), (1, 1))
+        # The command started the elevator, it is decided again
+        self.el.next_command()
+        self.assertEqual(len(calls), 3)
+        self.el.next_command()
+        self.assertEqual(len(calls), 3)
+
+        self.el.floor = 5
+        command = self.el.next_command()
+        self.assertEqual((command.speed, command.direction), (0, 1))
+        self.assertEqual(len(calls), 4)
+
 if __name__ == '__main__':
     unittest.main()
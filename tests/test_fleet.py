@@ -0,0 +1,69 @@
+""" Test the fleet supervisor """
+
+import unittest
+
+from async_api import AsyncBoxLift
+from controller import Controller
+from fleet import FleetSupervisor, Session, format_fleet
+from plan import BasePlan
+from simulator import LocalBoxLift
+from tests.test_async_api import FlakyApi
+
+
+class TestPlan(BasePlan):
+    name = "Test Plan"
+
+
+def make_sessions(n, api_factory=LocalBoxLift):
+    return [Session('building-{}'.format(idx), Controller(TestPlan, seed=idx),
+                    AsyncBoxLift(api_factory(TestPlan, seed=idx)))
+            for idx in range(n)]
+
+
+class FleetTest(unittest.TestCase):
+
+    def test_run(self):
+        sessions = make_sessions(5)
+        sessions.append(Session('flaky', Controller(TestPlan),
+                                AsyncBoxLift(FlakyApi(LocalBoxLift(TestPlan, seed=1)))))
+        supervisor = FleetSupervisor(sessions, workers=2)
+        supervisor.run()
+        for session in sessions:
+            self.assertEqual(session.resp['status'], 'finished')
+            self.assertEqual(session.n_ticks, TestPlan.n_iter)
+            self.assertEqual(session.decision_times.n, TestPlan.n_iter - 1)
+            self.assertEqual(session.n_shed, 0)
+        self.assertEqual(supervisor.n_ticks, 6 * TestPlan.n_iter)
+        self.assertTrue(supervisor.tick_rate > 0)
+        self.assertIn('building-4', format_fleet(supervisor))
+
+    def test_in_process(self):
+        sessions = make_sessions(2)
+        supervisor = FleetSupervisor(sessions, workers=0)
+        supervisor.run()
+        for session in sessions:
+            self.assertEqual(session.resp['status'], 'finished')
+            self.assertEqual(session.decision_times.n, TestPlan.n_iter - 1)
+        self.assertEqual(supervisor.processes, [])
+
+    def test_same_scores(self):
+        # Deciding in worker processes or in process makes no difference
+        scores = []
+        for workers in (0, 2):
+            sessions = make_sessions(3)
+            FleetSupervisor(sessions, workers=workers).run()
+            scores.append([session.resp['score'] for session in sessions])
+        self.assertEqual(scores[0], scores[1])
+
+    def test_shedding(self):
+        # No time at all to decide, every step is shed
+        sessions = make_sessions(2)
+        supervisor = FleetSupervisor(sessions, workers=1, tick_deadline=0.)
+        supervisor.run()
+        for session in sessions:
+            self.assertEqual(session.resp['status'], 'finished')
+            self.assertEqual(session.n_shed, TestPlan.n_iter - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
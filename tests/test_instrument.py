@@ -0,0 +1,70 @@
+""" Test the timing instrumentation """
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from instrument import NULL_TIMER, BUCKET_RATIO, CallbackSink, CSVSink, Histogram, Registry
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        hist = Histogram()
+        for idx in range(1, 1001):
+            hist.add(idx * 1e-4)
+        self.assertEqual(hist.n, 1000)
+        self.assertAlmostEqual(hist.mean, 0.05005)
+        for pct in [50, 95, 99]:
+            expected = pct * 1e-3
+            self.assertTrue(abs(hist.percentile(pct) / expected - 1) < BUCKET_RATIO - 1)
+        self.assertEqual(hist.percentile(100), 0.1)
+
+    def test_zero_and_empty(self):
+        hist = Histogram()
+        self.assertIsNone(hist.percentile(50))
+        hist.add(0.)
+        hist.add(0.)
+        hist.add(1.)
+        self.assertEqual(hist.percentile(50), 0.)
+        self.assertEqual(hist.percentile(99), 1.)
+
+
+class RegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_disabled(self):
+        self.assertIs(self.registry.timer('update'), NULL_TIMER)
+        with self.registry.timer('update'):
+            pass
+        self.assertEqual(self.registry.histograms, {})
+
+    def test_sinks(self):
+        samples = []
+        path = os.path.join(self.tmpdir, 'timings.csv')
+        self.registry.enable(CallbackSink(lambda name, seconds: samples.append(name)),
+                             CSVSink(path))
+        for _ in range(3):
+            with self.registry.timer('update'):
+                pass
+        with self.registry.timer('network'):
+            pass
+        self.assertEqual(samples, ['update'] * 3 + ['network'])
+        self.assertEqual(self.registry.histograms['update'].n, 3)
+
+        self.registry.report()
+        with open(path) as fp:
+            rows = fp.read().splitlines()
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(rows[2].startswith('update,3,'))
+
+
+if __name__ == '__main__':
+    unittest.main()
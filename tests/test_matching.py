@@ -0,0 +1,81 @@
+""" Test the min-cost matching dispatcher """
+
+import itertools
+import random
+import unittest
+
+from controller import Controller
+from dispatch import CostMatrixDispatcher
+from elevator import Elevator
+from matching import MatchingDispatcher, hungarian
+from plan import BasePlan
+from strategy import Matching
+
+
+class TestPlan(BasePlan):
+    name = "Test Plan"
+    strategy = Matching
+
+
+class MatchingTest(unittest.TestCase):
+
+    def test_hungarian(self):
+        rng = random.Random(0)
+        for n, m in [(1, 1), (3, 3), (3, 5), (4, 6)]:
+            for _ in range(20):
+                costs = [[rng.randrange(20) for _ in range(m)] for _ in range(n)]
+                assignment = hungarian(costs)
+                self.assertEqual(len(set(assignment)), n)
+                best = min(sum(costs[i][j] for i, j in enumerate(cols))
+                           for cols in itertools.permutations(range(m), n))
+                self.assertEqual(sum(costs[i][j] for i, j in enumerate(assignment)), best)
+
+        self.assertEqual(hungarian([]), [])
+        self.assertRaises(ValueError, hungarian, [[1], [2]])
+
+    def test_joint_assignment(self):
+        # Greedily, the first request takes the elevator the second one needs
+        elevators = [Elevator(0, 10), Elevator(1, 10)]
+        elevators[0].floor = 4
+        elevators[1].floor = 0
+        dispatcher = MatchingDispatcher(Matching)
+        assignments = dispatcher.assign(elevators, [(2, 1), (5, -1)])
+        self.assertEqual(assignments, [((2, 1), 1), ((5, -1), 0)])
+
+    def test_capacity(self):
+        elevators = [Elevator(0, 10), Elevator(1, 10)]
+        elevators[1].floor = 9
+        dispatcher = MatchingDispatcher(Matching, capacity=1)
+        assignments = dispatcher.assign(elevators, [(0, 1), (1, 1), (2, 1)])
+        self.assertEqual(len(assignments), 3)
+        # The overflow request is assigned greedily
+        self.assertEqual(sorted(el_id for _, el_id in assignments), [0, 0, 1])
+
+    def test_scalar_metric(self):
+        # Without a load aware metric, the matching falls back to the greedy dispatcher
+        class ScalarMatching(Matching):
+            @classmethod
+            def distance_metric(cls, el, req):
+                return abs(el.distance_to(req[0]))
+
+        self.assertRaises(ValueError, MatchingDispatcher, ScalarMatching)
+        dispatcher = Controller.make_dispatcher(ScalarMatching)
+        self.assertTrue(isinstance(dispatcher, CostMatrixDispatcher))
+        self.assertTrue(isinstance(Controller.make_dispatcher(Matching), MatchingDispatcher))
+
+    def test_controller_reassigns(self):
+        controller = Controller(TestPlan)
+        el = controller.elevators[0]
+        el.floor, el.speed, el.direction = 5, 1, 1
+        el.requests = [(3, -1)]
+        controller.elevators[1].floor = 2
+
+        resp = {u'elevators': [{u'id': 0, u'floor': 5}, {u'id': 1, u'floor': 2}],
+                u'requests': [{u'floor': 3, u'direction': -1}, {u'floor': 8, u'direction': 1}]}
+        controller.update(resp)
+        self.assertEqual(controller.get_request_owner((3, -1)), 1)
+        self.assertEqual(controller.get_request_owner((8, 1)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
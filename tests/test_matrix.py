@@ -0,0 +1,24 @@
+""" Test the plan/strategy matrix runner """
+
+import unittest
+
+from matrix import all_plans, all_strategies, format_table, run_plan
+
+
+class MatrixTest(unittest.TestCase):
+
+    def test_catalogue(self):
+        self.assertIn('Realistic1', all_plans())
+        self.assertNotIn('BasePlan', all_plans())
+        self.assertEqual(all_strategies(), ['BaseStrategy', 'CapacityMatching', 'DemandHome', 'Lookahead', 'Matching', 'SplitHome'])
+
+    def test_run_plan(self):
+        result = run_plan(('Training1', 'SplitHome', True, 1, False))
+        self.assertEqual(result.status, 'finished')
+        self.assertEqual(result.strategy, 'SplitHome')
+        self.assertTrue(result.ticks_per_second > 0)
+        self.assertIn('Training1', format_table([result]))
+
+
+if __name__ == '__main__':
+    unittest.main()
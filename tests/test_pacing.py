@@ -0,0 +1,128 @@
+""" Test the adaptive tick pacer """
+
+import unittest
+
+from pacing import Pacer, send_with_retry
+from transport import TransportError
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class PacerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pacer = Pacer(backoff=0.5, max_backoff=2., clock=self.clock, sleep=self.clock.sleep)
+
+    def tick(self, resp, latency=0.1):
+        self.pacer.wait()
+        self.clock.now += latency
+        self.pacer.record(resp)
+
+    def test_no_wait_when_healthy(self):
+        for _ in range(10):
+            self.tick({'status': 'in_progress'})
+        self.assertEqual(self.clock.slept, [])
+        self.assertEqual(self.pacer.n_ticks, 10)
+        self.assertAlmostEqual(self.pacer.latency, 0.1)
+        self.assertAlmostEqual(self.pacer.ticks_per_second, 10.)
+
+    def test_back_pressure(self):
+        self.tick({'status': 'error', 'message': 'HTTP Error 429: Too Many Requests'})
+        self.assertEqual(self.pacer.delay, 0.5)
+        self.tick({'status': 'error', 'message': 'Invalid token'})
+        self.assertEqual(self.pacer.delay, 1.)
+        self.assertEqual(self.pacer.n_token_errors, 1)
+        for _ in range(3):
+            self.tick({'status': 'error', 'message': ''})
+        self.assertEqual(self.pacer.delay, 2.)
+        self.assertTrue(self.clock.slept)
+
+        # Relax back to sending as early as possible
+        for _ in range(3):
+            self.tick({'status': 'in_progress'})
+        self.assertEqual(self.pacer.delay, 0.)
+
+    def test_min_interval(self):
+        pacer = Pacer(min_interval=0.25, clock=self.clock, sleep=self.clock.sleep)
+        pacer.wait()
+        pacer.record({'status': 'in_progress'})
+        pacer.wait()
+        self.assertEqual(self.clock.slept, [0.25])
+
+    def test_token_validity(self):
+        pacer = Pacer(token_ttl=1., clock=self.clock, sleep=self.clock.sleep)
+        self.assertTrue(pacer.is_token_valid())
+        pacer.wait()
+        pacer.record({'status': 'in_progress'})
+        self.clock.now += 2.
+        self.assertFalse(pacer.is_token_valid())
+
+    def test_slack(self):
+        pacer = Pacer(min_interval=0.5, token_ttl=0.6, clock=self.clock, sleep=self.clock.sleep)
+        self.assertEqual(pacer.slack(), 0.)
+        pacer.wait()
+        self.clock.now += 0.1
+        pacer.record({'status': 'in_progress'})
+        self.assertAlmostEqual(pacer.slack(), 0.4)
+        # The token expires before the pacing would send, short of the latency
+        self.clock.now += 0.3
+        pacer.token_received -= 0.25
+        self.assertAlmostEqual(pacer.slack(), 0.)
+        self.assertEqual(self.pacer.slack(), 0.)
+
+
+class ScriptedApi(object):
+    """ Answers with the given states, raising the exceptions among them """
+
+    def __init__(self, *states):
+        self.states = list(states)
+
+    def send_commands(self, commands=None):
+        state = self.states.pop(0)
+        if isinstance(state, Exception):
+            raise state
+        return state
+
+
+class SendWithRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pacer = Pacer(backoff=0., clock=self.clock, sleep=self.clock.sleep)
+
+    def test_retry(self):
+        api = ScriptedApi({'status': 'error', 'message': 'busy'},
+                          TransportError('/building', 503, 'Service Unavailable'),
+                          {'status': 'in_progress'})
+        errors = []
+        resp = send_with_retry(api, [], self.pacer, on_error=lambda resp, n_retry: errors.append(n_retry))
+        self.assertEqual(resp['status'], 'in_progress')
+        self.assertEqual(errors, [2, 1])
+        self.assertEqual(self.pacer.n_errors, 2)
+
+    def test_exhausted(self):
+        api = ScriptedApi(*[{'status': 'error', 'message': 'busy'}] * 3)
+        resp = send_with_retry(api, [], self.pacer, n_retry=2)
+        self.assertEqual(resp['message'], 'busy')
+        self.assertEqual(api.states, [])
+
+    def test_programming_error(self):
+        api = ScriptedApi(KeyError('token'))
+        self.assertRaises(KeyError, send_with_retry, api, [], self.pacer)
+
+
+if __name__ == '__main__':
+    unittest.main()
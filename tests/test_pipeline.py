@@ -0,0 +1,120 @@
+""" Test the pipelined driver """
+
+import unittest
+
+from controller import Controller
+from pacing import Pacer
+from pipeline import Pipeline
+from plan import Training2
+from simulator import LocalBoxLift
+from tests.test_async_api import FlakyApi
+from transport import TransportError
+
+
+class BrokenApi(object):
+
+    def __init__(self, error):
+        self.error = error
+
+    def send_commands(self, commands=None):
+        raise self.error
+
+
+class SlackPacer(object):
+    """ A pacer always leaving the same slack """
+    latency = None
+
+    def wait(self):
+        pass
+
+    def record(self, resp):
+        pass
+
+    def slack(self):
+        return 0.25
+
+
+class RefineCounter(Controller):
+
+    def __init__(self, plan, seed=None):
+        super(RefineCounter, self).__init__(plan, seed=seed)
+        self.budgets = []
+        self.events = []
+
+    def refine(self, commands, time_budget):
+        self.budgets.append(time_budget)
+        return commands
+
+    def prepare(self, commands, time_budget=None):
+        self.events.append('prepare')
+        super(RefineCounter, self).prepare(commands, time_budget)
+
+
+def run_serial(plan, seed):
+    api = LocalBoxLift(plan, seed=seed)
+    controller = Controller(plan, seed=seed)
+    resp = api.send_commands([])
+    while resp['status'] != 'finished':
+        resp = api.send_commands(controller.step(resp))
+    return resp['score']
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_run(self):
+        pipeline = Pipeline(LocalBoxLift(Training2, seed=4))
+        states, commands = [], []
+        resp = pipeline.run(Controller(Training2, seed=4), on_state=states.append,
+                            on_commands=commands.append)
+        self.assertEqual(resp['status'], 'finished')
+        self.assertEqual(resp['score'], run_serial(Training2, 4))
+        self.assertEqual(len(states), Training2.n_iter)
+        self.assertEqual(len(commands), Training2.n_iter - 1)
+        self.assertEqual(pipeline.states.maxsize, 1)
+        self.assertFalse(pipeline._thread.is_alive())
+
+    def test_iter_states(self):
+        pipeline = Pipeline(FlakyApi(LocalBoxLift(Training2, seed=1)), pacer=Pacer(max_backoff=0.))
+        controller = Controller(Training2, seed=1)
+        n_states = 0
+        for state in pipeline.iter_states():
+            n_states += 1
+            if state['status'] == 'finished':
+                break
+            pipeline.send(controller.step(state))
+        pipeline.close()
+        self.assertFalse(pipeline._thread.is_alive())
+        self.assertEqual(n_states, Training2.n_iter)
+        self.assertEqual(pipeline.n_errors, Training2.n_iter)
+
+    def test_retries_exhausted(self):
+        error = TransportError('/building', 503, 'Service Unavailable')
+        pipeline = Pipeline(BrokenApi(error), pacer=Pacer(max_backoff=0.), n_retry=2)
+        resp = pipeline.run(Controller(Training2))
+        self.assertEqual(resp['status'], 'error')
+        self.assertEqual(resp['message'], str(error))
+        self.assertEqual(pipeline.n_errors, 2)
+
+    def test_programming_error(self):
+        # Raised in the decision stage, not turned into an error state
+        pipeline = Pipeline(BrokenApi(AttributeError('token')), pacer=Pacer(max_backoff=0.))
+        self.assertRaises(AttributeError, pipeline.run, Controller(Training2))
+        self.assertEqual(pipeline.n_errors, 0)
+
+    def test_prepare(self):
+        # The output and the next tick's preparation follow the send of every tick
+        controller = RefineCounter(Training2, seed=3)
+        pipeline = Pipeline(LocalBoxLift(Training2, seed=3))
+        pipeline.run(controller, on_state=lambda state: controller.events.append('state'),
+                     on_commands=lambda commands: controller.events.append('commands'))
+        self.assertEqual(controller.events, ['state', 'commands', 'prepare'] * (Training2.n_iter - 1) +
+                         ['state'])
+
+    def test_slack(self):
+        controller = RefineCounter(Training2, seed=2)
+        Pipeline(LocalBoxLift(Training2, seed=2), pacer=SlackPacer()).run(controller)
+        self.assertEqual(controller.budgets, [0.25] * (Training2.n_iter - 1))
+
+        controller = RefineCounter(Training2, seed=2)
+        Pipeline(LocalBoxLift(Training2, seed=2)).run(controller, refine=False)
+        self.assertEqual(controller.budgets, [])
@@ -0,0 +1,109 @@
+""" Test the lookahead planner """
+
+import unittest
+
+from boxlift_api import Command
+from controller import Controller
+from plan import BasePlan
+from planner import BuildingModel, LookaheadPlanner
+from strategy import Lookahead
+
+
+class LookaheadPlan(BasePlan):
+    name = "Lookahead Plan"
+    strategy = Lookahead
+
+
+class BuildingModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = BuildingModel(10)
+
+    def test_step(self):
+        cars = ((2, 1, 1, frozenset([5])), (4, -1, 0, frozenset([4])))
+        requests = frozenset([(4, -1), (7, 1)])
+        cars, requests = self.model.step(cars, requests, ((1, 1), None))
+        # The moving car goes up, the stopped one lets its rider out and takes the request
+        self.assertEqual(cars[0], (3, 1, 1, frozenset([5])))
+        self.assertEqual(cars[1], (4, -1, 0, frozenset([1])))
+        self.assertEqual(requests, frozenset([(7, 1)]))
+        self.assertEqual(self.model.waiting(cars, requests), 3)
+
+    def test_default_command(self):
+        self.assertEqual(self.model.default_command((3, 1, 1, frozenset([3])), frozenset()), (0, 1))
+        self.assertEqual(self.model.default_command((3, 1, 1, frozenset()), frozenset([(1, 1)])), (1, -1))
+        self.assertEqual(self.model.default_command((3, 1, 0, frozenset()), frozenset([(3, -1)])), (0, -1))
+        self.assertEqual(self.model.default_command((3, 1, 0, frozenset()), frozenset()), (0, 1))
+
+
+class LookaheadPlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = Controller(LookaheadPlan, seed=1)
+
+    def test_plan_stops_for_request(self):
+        # Passing by a request, while the reactive command keeps going
+        el = self.controller.elevators[0]
+        el.floor, el.speed, el.direction = 4, 1, -1
+        self.controller.requests = ((4, -1),)
+        planner = LookaheadPlanner(10, horizon=6, time_budget=10.)
+        commands = planner.plan(self.controller, [Command(0, -1, 1), None])
+        self.assertEqual((commands[0].speed, commands[0].direction), (0, -1))
+        self.assertEqual(el.speed, 0)
+        self.assertTrue(planner.n_evaluated > 0)
+
+        # The same tick again is answered from the transposition table
+        el.speed = 1
+        n_evaluated = planner.n_evaluated
+        planner.plan(self.controller, [Command(0, -1, 1), None])
+        self.assertEqual(planner.n_evaluated, n_evaluated)
+        self.assertTrue(planner.n_hits > 0)
+
+    def test_speculate(self):
+        el = self.controller.elevators[0]
+        el.floor, el.speed, el.direction = 6, 1, -1
+        self.controller.requests = ((4, -1),)
+        planner = LookaheadPlanner(10, horizon=6)
+        planner.speculate(self.controller, [Command(0, -1, 1)], 10.)
+        self.assertTrue(planner.n_evaluated > 0)
+        self.assertEqual((el.floor, el.speed), (6, 1))
+
+        # The state the command sent leads to is planned from the transposition table
+        el.floor = 5
+        n_evaluated = planner.n_evaluated
+        planner.plan(self.controller, [Command(0, -1, 1), None], time_budget=10.)
+        self.assertEqual(planner.n_evaluated, n_evaluated)
+
+    def test_time_budget(self):
+        ticks = iter(range(100))
+        planner = LookaheadPlanner(10, time_budget=0.5, clock=lambda: next(ticks))
+        el = self.controller.elevators[0]
+        el.floor, el.speed, el.direction = 4, 1, -1
+        self.controller.requests = ((4, -1),)
+        command = Command(0, -1, 1)
+        # The budget runs out before any alternative is tried
+        self.assertEqual(planner.plan(self.controller, [command, None]), [command, None])
+
+    def test_refine(self):
+        el = self.controller.elevators[0]
+        el.floor, el.speed, el.direction = 4, 1, -1
+        self.controller.requests = ((4, -1),)
+        commands = [Command(0, -1, 1)]
+        self.assertEqual(self.controller.refine(commands, 0.), commands)
+        commands = self.controller.refine(commands, 10.)
+        self.assertEqual([(command.id, command.speed, command.direction) for command in commands],
+                         [(0, 0, -1)])
+        commands = [Command(1, 1, 0)]
+        self.assertEqual(Controller(BasePlan).refine(commands, 10.), commands)
+
+    def test_controller_hook(self):
+        self.assertTrue(isinstance(self.controller.planner, LookaheadPlanner))
+        resp = {u'elevators': [{u'id': 0, u'floor': 0}, {u'id': 1, u'floor': 0}],
+                u'requests': [{u'floor': 5, u'direction': -1}]}
+        commands = self.controller.step(resp)
+        self.assertTrue(len(commands) > 0)
+        self.assertIsNone(Controller(BasePlan).planner)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+""" Test the run recorder and replay """
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from controller import Controller
+from plan import BasePlan
+from recorder import TraceError, TraceWriter, read_header, read_trace, replay
+from simulator import LocalBoxLift
+from strategy import Matching
+from zoning import ZonedController
+
+
+class TestPlan(BasePlan):
+    name = "Test Plan"
+    n_iter = 60
+
+
+class OtherPlan(TestPlan):
+    strategy = Matching
+
+
+class TallPlan(TestPlan):
+    n_els = 4
+    n_floors = 20
+
+
+def record_run(path, plan, seed, n_zones=1):
+    """ Run a local simulation the way main does, recording it """
+    api = LocalBoxLift(plan, seed=seed, arrival_rate=5)
+    if n_zones > 1:
+        controller = ZonedController(plan, n_zones=n_zones, seed=seed)
+    else:
+        controller = Controller(plan, seed=seed)
+    with TraceWriter(path, plan, seed, n_zones=n_zones) as recorder:
+        resp = api.send_commands([])
+        controller.update(resp)
+        commands = controller.get_commands()
+        recorder.write_state(resp)
+        recorder.write_commands(commands)
+        while True:
+            resp = api.send_commands(commands)
+            recorder.write_state(resp)
+            if resp['status'] == 'finished':
+                if n_zones > 1:
+                    controller.close()
+                return resp
+            commands = controller.step(resp)
+            recorder.write_commands(commands)
+
+
+class RecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'run.trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        resp = record_run(self.path, TestPlan, 7)
+        header = read_header(self.path)
+        self.assertEqual(header['plan'], 'TestPlan')
+        self.assertEqual(header['seed'], 7)
+        kinds = [record['kind'] for record in read_trace(self.path)]
+        self.assertEqual(kinds.count('state'), TestPlan.n_iter)
+
+        result = replay(self.path, TestPlan)
+        self.assertEqual(result.mismatches, [])
+        self.assertEqual(result.n_ticks, TestPlan.n_iter - 1)
+        self.assertEqual(result.resp['score'], resp['score'])
+
+    def test_zones(self):
+        resp = record_run(self.path, TallPlan, 3, n_zones=2)
+        self.assertEqual(read_header(self.path)['zones'], 2)
+        result = replay(self.path, TallPlan)
+        self.assertEqual(result.mismatches, [])
+        self.assertEqual(result.resp['score'], resp['score'])
+
+    def test_strategy_change(self):
+        record_run(self.path, TestPlan, 7)
+        result = replay(self.path, OtherPlan)
+        self.assertTrue(result.mismatches)
+
+    def test_bad_file(self):
+        with open(self.path, 'wb') as fp:
+            fp.write(b'not a trace')
+        self.assertRaises(TraceError, list, read_trace(self.path))
+
+        record_run(self.path, TestPlan, 7)
+        with open(self.path, 'rb') as fp:
+            data = fp.read()
+        with open(self.path, 'wb') as fp:
+            fp.write(data[:-3])
+        self.assertRaises(TraceError, list, read_trace(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
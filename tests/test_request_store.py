@@ -0,0 +1,57 @@
+""" Test the indexed request store """
+
+import unittest
+
+from request_store import RequestStore
+
+
+class RequestStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = RequestStore([(3, -1), (1, 1), (7, 1), (8, -1), (1, -1)])
+
+    def test_crud(self):
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(list(self.store), [(3, -1), (1, 1), (7, 1), (8, -1), (1, -1)])
+        self.assertTrue(self.store.contains(1))
+        self.assertTrue(self.store.contains(1, -1))
+        self.assertFalse(self.store.contains(2))
+        self.assertFalse(self.store.contains(3, 1))
+
+        self.assertFalse(self.store.add(1, 1))
+        self.assertTrue(self.store.discard(1, 1))
+        self.assertFalse(self.store.discard(1, 1))
+        self.assertTrue(self.store.contains(1))
+        self.assertEqual(self.store.first_at(1), (1, -1))
+        self.assertIsNone(self.store.first_at(2))
+
+    def test_ordered_queries(self):
+        self.assertEqual(self.store.lowest(), (1, 1))
+        self.assertEqual(self.store.highest(), (8, -1))
+        self.assertEqual(self.store.floors_along(1), [1, 7])
+        self.assertEqual(self.store.floors_along(-1), [8, 3, 1])
+
+        self.assertEqual(self.store.nearest(6), (7, 1))
+        self.assertEqual(self.store.nearest(3), (3, -1))
+        # Ties go to the earliest assigned request
+        self.assertEqual(self.store.nearest(5), (3, -1))
+        self.store.discard(3, -1)
+        self.store.add(3, 1)
+        self.assertEqual(self.store.nearest(5), (7, 1))
+
+    def test_behind(self):
+        self.assertEqual(self.store.behind(4, 1), [(3, -1), (1, 1), (1, -1)])
+        self.assertEqual(self.store.behind(3, 1), [(1, 1), (1, -1)])
+        self.assertEqual(self.store.behind(3, -1), [(7, 1), (8, -1)])
+        self.assertEqual(self.store.behind(3, 0), [])
+
+    def test_empty(self):
+        store = RequestStore()
+        self.assertIsNone(store.lowest())
+        self.assertIsNone(store.highest())
+        self.assertIsNone(store.nearest(3))
+        self.assertEqual(store.floors_along(1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+""" Test the local building simulator """
+
+import unittest
+
+from boxlift_api import Command
+from controller import Controller
+from plan import BasePlan
+from simulator import LocalBoxLift, Passenger
+
+
+class TestPlan(BasePlan):
+    name = "Test Plan"
+
+
+class SimulatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.api = LocalBoxLift(TestPlan, seed=1, arrival_rate=0)
+
+    def test_state_structure(self):
+        state = self.api.get_building_state()
+        self.assertEqual(state['status'], 'in_progress')
+        self.assertEqual(len(state['elevators']), TestPlan.n_els)
+        self.assertEqual(state['requests'], [])
+        for el in state['elevators']:
+            self.assertEqual(el['buttons_pressed'], [])
+
+    def test_move(self):
+        state = self.api.send_commands([Command(0, 1, 1)])
+        self.assertEqual(state['elevators'][0]['floor'], 1)
+        self.assertEqual(state['elevators'][1]['floor'], 0)
+
+        # Elevators keep their last command
+        state = self.api.send_commands([])
+        self.assertEqual(state['elevators'][0]['floor'], 2)
+
+        # Elevators stay within the building
+        state = self.api.send_commands([Command(0, -1, 1)])
+        state = self.api.send_commands([])
+        state = self.api.send_commands([])
+        self.assertEqual(state['elevators'][0]['floor'], 0)
+
+    def test_boarding(self):
+        # Keep the second car from boarding anybody
+        self.api.send_commands([Command(1, 1, 1)])
+        self.api.waiting[0].append(Passenger(0, 3, 0))
+        self.api.waiting[0].append(Passenger(0, 2, 0))
+        state = self.api.get_building_state()
+        self.assertEqual(state['requests'], [{'floor': 0, 'direction': 1}])
+
+        # A down indicator does not board passengers going up
+        state = self.api.send_commands([Command(0, -1, 0)])
+        self.assertEqual(state['elevators'][0]['buttons_pressed'], [])
+
+        state = self.api.send_commands([Command(0, 1, 0)])
+        self.assertEqual(state['elevators'][0]['buttons_pressed'], [2, 3])
+        self.assertEqual(state['requests'], [])
+
+        for cmd in [Command(0, 1, 1), Command(0, 1, 1), Command(0, 1, 0)]:
+            state = self.api.send_commands([cmd])
+        self.assertEqual(state['elevators'][0]['buttons_pressed'], [3])
+        self.assertEqual(self.api.n_delivered, 1)
+
+    def test_finished(self):
+        for _ in range(TestPlan.n_iter):
+            state = self.api.send_commands([])
+        self.assertEqual(state['status'], 'finished')
+        self.assertIn('score', state)
+
+    def test_controller_run(self):
+        api = LocalBoxLift(TestPlan, seed=3, arrival_rate=2)
+        controller = Controller(TestPlan)
+        state = api.send_commands([])
+        while state['status'] != 'finished':
+            controller.update(state)
+            controller.shuffle_requests()
+            state = api.send_commands(controller.get_commands())
+        self.assertTrue(api.n_delivered > 0)
+
+    def test_changed_only(self):
+        # The commands left out repeat what the cars already do, the run is the same
+        scores, n_commands = [], []
+        for changed_only in (False, True):
+            api = LocalBoxLift(TestPlan, seed=3, arrival_rate=2, changed_only=changed_only)
+            controller = Controller(TestPlan, seed=3)
+            state = api.send_commands([])
+            while state['status'] != 'finished':
+                state = api.send_commands(controller.step(state))
+            scores.append(state['score'])
+            n_commands.append(api.n_commands)
+        self.assertEqual(scores[0], scores[1])
+        self.assertTrue(n_commands[1] < n_commands[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+""" Test the passenger arrival workloads """
+
+import itertools
+import random
+import unittest
+
+from plan import Clustered1, Random1, Realistic1
+from simulator import LocalBoxLift
+from traffic import (ClusteredTraffic, RealisticTraffic, Traffic, UniformTraffic, bernoulli_floors)
+
+
+def take(traffic, n_floors, n_ticks, seed=1):
+    return list(itertools.islice(traffic.arrivals(n_floors, random.Random(seed)), n_ticks))
+
+
+class TrafficTest(unittest.TestCase):
+
+    def test_bernoulli_floors(self):
+        rng = random.Random(1)
+        self.assertEqual(list(bernoulli_floors(rng, 10, 0)), [])
+        self.assertEqual(list(bernoulli_floors(rng, 4, 1)), [0, 1, 2, 3])
+        floors = list(bernoulli_floors(rng, 100000, 0.01))
+        self.assertEqual(floors, sorted(set(floors)))
+        self.assertTrue(800 < len(floors) < 1200, len(floors))
+
+    def test_seeded(self):
+        for traffic in [Traffic(), UniformTraffic(), ClusteredTraffic(), RealisticTraffic()]:
+            self.assertEqual(take(traffic, 25, 50, seed=3), take(traffic, 25, 50, seed=3))
+            self.assertNotEqual(take(traffic, 25, 50, seed=3), take(traffic, 25, 50, seed=4))
+            for tick in take(traffic, 25, 50):
+                for floor, destination in tick:
+                    self.assertTrue(0 <= floor < 25 and 0 <= destination < 25)
+                    self.assertNotEqual(floor, destination)
+
+    def test_default_placement(self):
+        self.assertEqual(take(Traffic(), 25, 50), take(UniformTraffic(), 25, 50))
+
+    def test_lazy(self):
+        # A tick of a million floor building only costs its arrivals
+        arrivals = UniformTraffic(rate=0.001).arrivals(10 ** 6, random.Random(1))
+        n_arrivals = sum(len(next(arrivals)) for _ in range(10))
+        self.assertTrue(700 < n_arrivals < 1300, n_arrivals)
+
+    def test_clustered(self):
+        arrivals = sum(take(ClusteredTraffic(rate=1., spread=0, concentration=1.), 25, 20), [])
+        self.assertTrue(len(set(floor for floor, _ in arrivals)) <= 3)
+
+    def test_realistic(self):
+        traffic = RealisticTraffic(rate=1., period=30, peak_share=1.)
+        self.assertEqual([traffic.phase(tick) for tick in [0, 9, 10, 25, 30]],
+                         ['up', 'up', 'inter', 'down', 'up'])
+        ticks = take(traffic, 25, 30)
+        self.assertTrue(all(floor == 0 for tick in ticks[:10] for floor, _ in tick))
+        self.assertTrue(all(destination == 0 for tick in ticks[20:] for floor, destination in tick if floor != 0))
+
+    def test_scaled(self):
+        traffic = ClusteredTraffic(spread=1)
+        scaled = traffic.scaled(2.)
+        self.assertEqual((scaled.rate, scaled.spread), (2., 1))
+        self.assertEqual(traffic.rate, 0.1)
+
+    def test_plans(self):
+        self.assertTrue(isinstance(Random1.traffic, UniformTraffic))
+        self.assertTrue(isinstance(Clustered1.traffic, ClusteredTraffic))
+        self.assertTrue(isinstance(Realistic1.traffic, RealisticTraffic))
+        # The morning up-peak of the realistic plans, most passengers arrive at the lobby
+        arrivals = sum(take(Realistic1.traffic.scaled(1.), Realistic1.n_floors, 20), [])
+        self.assertTrue(sum(1 for floor, _ in arrivals if floor == 0) > len(arrivals) / 2)
+
+        api = LocalBoxLift(Clustered1, seed=1, arrival_rate=5.)
+        state = api.send_commands([])
+        self.assertTrue(len(state['requests']) > 0)
+
+if __name__ == '__main__':
+    unittest.main()
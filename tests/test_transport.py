@@ -0,0 +1,116 @@
+""" Test the keep-alive transport """
+
+import json
+import socket
+import threading
+import time
+import unittest
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from transport import HTTPBackend, Transport, TransportError
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.bodies.append(body)
+        if self.path == '/slow':
+            time.sleep(1.)
+        code = 404 if self.path == '/missing' else 200
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        # Drop the connection once idle, without telling the client
+        self.close_connection = self.server.drop_idle
+
+    def log_message(self, *args):
+        pass
+
+
+class EchoServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args):
+        HTTPServer.__init__(self, *args)
+        self.bodies = []
+        self.drop_idle = False
+
+
+class CountingBackend(HTTPBackend):
+
+    def __init__(self):
+        self.n_connections = 0
+
+    def connect(self, scheme, netloc, timeout):
+        self.n_connections += 1
+        return super(CountingBackend, self).connect(scheme, netloc, timeout)
+
+
+class TransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = EchoServer(('127.0.0.1', 0), EchoHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.backend = CountingBackend()
+        self.transport = Transport(timeout=5, backend=self.backend)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        for idx in range(5):
+            body = json.dumps({'tick': idx}).encode('utf-8')
+            self.assertEqual(self.transport.post(self.url + '/building', body), body)
+        self.assertEqual(self.backend.n_connections, 1)
+        self.assertEqual(self.transport.latency.n, 5)
+        self.assertTrue(self.transport.latency.mean > 0)
+
+    def test_reconnect(self):
+        self.server.drop_idle = True
+        self.transport.post(self.url, b'{}')
+        self.assertEqual(self.transport.post(self.url, b'{}'), b'{}')
+        self.assertEqual(self.backend.n_connections, 2)
+        self.assertEqual(len(self.server.bodies), 2)
+
+    def test_reconnect_fresh(self):
+        self.server.drop_idle = True
+        transport = Transport(timeout=5, backend=self.backend, pool_size=2)
+        transport.post(self.url, b'{}')
+        pool = list(transport.pools.values())[0]
+        extra = pool.connect()
+        extra.request('POST', '/', b'{}')
+        extra.getresponse().read()
+        pool.put(extra)
+        # Both idle connections are dropped, the retry must not take the other stale one
+        self.assertEqual(transport.post(self.url, b'{}'), b'{}')
+        self.assertEqual(self.backend.n_connections, 3)
+        transport.close()
+
+    def test_timeout_not_resent(self):
+        # The server may have acted on a request it is slow to answer, it is sent once
+        transport = Transport(timeout=0.2, backend=self.backend)
+        transport.post(self.url, b'{"tick": 1}')
+        self.assertRaises(socket.timeout, transport.post, self.url + '/slow', b'{"tick": 2}')
+        self.assertEqual(self.server.bodies, [b'{"tick": 1}', b'{"tick": 2}'])
+        self.assertEqual(self.backend.n_connections, 1)
+        transport.close()
+
+    def test_http_error(self):
+        self.assertRaises(TransportError, self.transport.post, self.url + '/missing', b'{}')
+
+
+if __name__ == '__main__':
+    unittest.main()
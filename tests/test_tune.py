@@ -0,0 +1,51 @@
+""" Test the strategy parameter search """
+
+import random
+import unittest
+
+from strategy import SplitHome
+from tune import (SPACES, Candidate, Search, format_best, grid_candidates, random_candidates, tune,
+                  with_params)
+
+
+class TuneTest(unittest.TestCase):
+
+    def test_with_params(self):
+        strategy = with_params(SplitHome, {'split': 0.25, 'load_weight': 2})
+        self.assertEqual(strategy.split, 0.25)
+        self.assertEqual(strategy.load_weight, 2)
+        self.assertEqual(SplitHome.split, 0.5)
+        self.assertTrue(issubclass(strategy, SplitHome))
+
+    def test_candidates(self):
+        space = {'a': [1, 2, 3], 'b': [0, 1]}
+        grid = grid_candidates(space)
+        self.assertEqual(len(grid), 6)
+        self.assertIn({'a': 3, 'b': 0}, grid)
+
+        sample = random_candidates(space, 4, random.Random(1))
+        self.assertEqual(len(sample), 4)
+        self.assertEqual(len(set(tuple(sorted(c.items())) for c in sample)), 4)
+        self.assertEqual(len(random_candidates(space, 10, random.Random(1))), 6)
+
+    def test_successive_halving(self):
+        search = Search('Training1', 'SplitHome', seeds=range(3), n_ticks=20)
+        candidates = [Candidate(params) for params in
+                      random_candidates(SPACES['SplitHome'], 4, random.Random(2))]
+        best = search.successive_halving(candidates, eta=2)
+        # 4 candidates on 1 seed, the best 2 on 2 seeds, the best one on 3
+        self.assertEqual(len(best), 1)
+        self.assertEqual(sorted(best[0].scores), [0, 1, 2])
+        self.assertEqual(search.n_runs, 4 + 2 * 1 + 1 * 1)
+        self.assertIn('Training', format_best({'Training': best[0]}))
+
+    def test_tune(self):
+        ranked = tune('Training1', 'BaseStrategy', method='random', n_candidates=2, seeds=[1],
+                      n_ticks=10, rng=random.Random(0))
+        self.assertEqual(len(ranked), 2)
+        self.assertTrue(ranked[0].mean >= ranked[1].mean)
+        self.assertRaises(ValueError, tune, 'Training1', 'BaseStrategy', method='annealing')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+""" Test the zone partitioned controller """
+
+import unittest
+
+from plan import BasePlan
+from simulator import LocalBoxLift
+from zoning import ZonedController, zone_bounds
+
+
+class TallPlan(BasePlan):
+    name = "Tall Plan"
+    n_els = 6
+    n_floors = 60
+    n_iter = 40
+
+
+def run(controller, seed=1):
+    api = LocalBoxLift(TallPlan, seed=seed, arrival_rate=1.)
+    commands = []
+    resp = api.send_commands([])
+    while resp['status'] != 'finished':
+        step = controller.step(resp)
+        commands.append([(c.id, c.direction, c.speed) for c in step])
+        resp = api.send_commands(step)
+    return resp, commands
+
+
+class ZonedControllerTest(unittest.TestCase):
+
+    def test_zone_bounds(self):
+        self.assertEqual(zone_bounds(60, 3), [0, 20, 40])
+        self.assertEqual(zone_bounds(10, 4), [0, 2, 5, 7])
+
+    def test_zones(self):
+        controller = ZonedController(TallPlan, n_zones=3, processes=0)
+        self.assertEqual(controller.cars_per_zone(), [2, 2, 2])
+        self.assertEqual([controller.zone_of(floor) for floor in [0, 19, 20, 59]], [0, 0, 1, 2])
+        # More zones than elevators
+        self.assertEqual(ZonedController(TallPlan, n_zones=10, processes=0).n_zones, 6)
+
+    def test_in_process(self):
+        controller = ZonedController(TallPlan, n_zones=3, processes=0, seed=1)
+        resp, commands = run(controller)
+        self.assertEqual(resp['status'], 'finished')
+        self.assertTrue(resp['score'] > 0)
+
+    def test_processes(self):
+        # The worker processes decide exactly as the zones stepped in process
+        expected = run(ZonedController(TallPlan, n_zones=3, processes=0, seed=1))[1]
+        controller = ZonedController(TallPlan, n_zones=3, processes=2, seed=1)
+        try:
+            self.assertEqual(run(controller)[1], expected)
+        finally:
+            controller.close()
+        self.assertEqual(controller.processes, [])
+
+    def test_rebalance(self):
+        controller = ZonedController(TallPlan, n_zones=3, processes=0, rebalance_every=1)
+        requests = [{'floor': floor, 'direction': -1} for floor in range(41, 51)]
+        elevators = [{'id': idx, 'floor': 0} for idx in range(6)]
+        controller.update({'elevators': elevators, 'requests': requests})
+        self.assertEqual(controller.n_moves, 1)
+        self.assertEqual(controller.cars_per_zone(), [1, 2, 3])
+
+        # A zone without cars has its requests served by the nearest zone with some
+        self.assertEqual(controller.route(5, [0, 2, 4]), 1)
+
+        commands = controller.get_commands()
+        self.assertTrue(all(0 <= command.id < 6 for command in commands))
+
+    def test_members_kept(self):
+        controller = ZonedController(TallPlan, n_zones=3, processes=0, rebalance_every=0)
+        elevators = [{'id': idx, 'floor': 20 * (idx // 2)} for idx in range(6)]
+        controller.step({'elevators': elevators, 'requests': [{'floor': 30, 'direction': 1}]})
+        worker = controller.workers[1]
+        sub_controller = worker.controller
+        self.assertEqual(worker.members, [2, 3])
+        owner = sub_controller.get_request_owner((30, 1))
+        self.assertIsNotNone(owner)
+        speeds = [el.speed for el in sub_controller.elevators]
+
+        # Move the car without the request to zone 2, by hand
+        moved = worker.members[1 - owner]
+        controller.shared.zone[moved] = 2
+        controller.step({'elevators': elevators, 'requests': [{'floor': 30, 'direction': 1}]})
+        self.assertIs(worker.controller, sub_controller)
+        self.assertEqual(len(sub_controller.elevators), 1)
+        self.assertEqual(worker.members, [worker.members[0]])
+        self.assertEqual(sub_controller.get_request_owner((30, 1)), 0)
+        self.assertEqual(sub_controller.elevators[0].speed, speeds[owner])
+        self.assertEqual(controller.workers[2].members, [4, 5, moved])
+        self.assertEqual(len(controller.workers[2].controller.elevators), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+""" traffic.py - Seeded passenger arrival workloads for the local simulator
+
+A Traffic describes how passengers arrive in a building, and its
+arrivals method is an endless generator yielding, for every tick, the
+list of (floor, destination) of the passengers arriving, drawn from the
+random generator handed to it.  Nothing is materialised ahead of time:
+the floors passengers arrive at are found by skipping geometrically
+distributed gaps, so a tick costs as much as the arrivals it yields,
+whatever the height of the building or the length of the run.
+
+Each plan family carries its own traffic:
+
+-  UniformTraffic, the ch_rnd plans: any floor to any other floor
+-  ClusteredTraffic, the ch_clu plans: most passengers come from and go
+   to a few hot floors, moving every period ticks
+-  RealisticTraffic, the ch_rea plans: a day of lobby up-peak in the
+   morning, interfloor traffic and a down-peak to the lobby at night
+"""
+import copy
+import math
+
+ARRIVAL_RATE = 0.1  # Expected new passengers per floor per 10 ticks
+
+
+def bernoulli_floors(rng, n_floors, probability):
+    """ The floors, in order, where a trial of the given probability succeeds """
+    if probability <= 0:
+        return
+    if probability >= 1:
+        for floor in range(n_floors):
+            yield floor
+        return
+    log_q = math.log(1 - probability)
+    floor = -1
+    while True:
+        floor += 1 + int(math.log(1 - rng.random()) / log_q)
+        if floor >= n_floors:
+            return
+        yield floor
+
+
+def other_floor(rng, n_floors, floor):
+    """ A uniformly random floor, other than floor """
+    destination = rng.randrange(n_floors - 1)
+    if destination >= floor:
+        destination += 1
+    return destination
+
+
+class Traffic(object):
+    """ Base traffic, passengers arrive at every floor at the same rate,
+        and go to any other floor """
+
+    def __init__(self, rate=ARRIVAL_RATE):
+        """
+        :param rate:
+            The expected number of new passengers per floor every 10 ticks
+        """
+        self.rate = rate
+
+    def scaled(self, rate):
+        """ The same traffic at another arrival rate """
+        traffic = copy.copy(self)
+        traffic.rate = rate
+        return traffic
+
+    def arrivals(self, n_floors, rng):
+        """ Yield, for every tick, the list of the (floor, destination) arriving """
+        probability = self.rate / 10.
+        tick = 0
+        while True:
+            yield [self.place(floor, tick, n_floors, rng)
+                   for floor in bernoulli_floors(rng, n_floors, probability)]
+            tick += 1
+
+    def place(self, floor, tick, n_floors, rng):
+        """ The (floor, destination) of a passenger drawn at floor, by default
+            a uniformly random other floor """
+        return floor, other_floor(rng, n_floors, floor)
+
+
+class UniformTraffic(Traffic):
+    """ Passengers from any floor to any other floor """
+
+
+class ClusteredTraffic(Traffic):
+    """ Most passengers come from, and go to, a few hot floors """
+
+    def __init__(self, rate=ARRIVAL_RATE, n_clusters=3, spread=2, concentration=0.8, period=None):
+        """
+        :param n_clusters:
+            The number of hot floors
+        :param spread:
+            The number of floors around a hot floor passengers come from
+        :param concentration:
+            The share of the passengers from and to the hot floors
+        :param period:
+            The hot floors move every period ticks, or never
+        """
+        super(ClusteredTraffic, self).__init__(rate)
+        self.n_clusters = n_clusters
+        self.spread = spread
+        self.concentration = concentration
+        self.period = period
+
+    def arrivals(self, n_floors, rng):
+        probability = self.rate / 10.
+        tick = 0
+        clusters = None
+        while True:
+            if clusters is None or (self.period and tick % self.period == 0):
+                clusters = [rng.randrange(n_floors) for _ in range(self.n_clusters)]
+            yield [self.place_clustered(floor, clusters, n_floors, rng)
+                   for floor in bernoulli_floors(rng, n_floors, probability)]
+            tick += 1
+
+    def near_cluster(self, clusters, n_floors, rng):
+        floor = rng.choice(clusters) + rng.randint(-self.spread, self.spread)
+        return min(max(floor, 0), n_floors - 1)
+
+    def place_clustered(self, floor, clusters, n_floors, rng):
+        if rng.random() < self.concentration:
+            floor = self.near_cluster(clusters, n_floors, rng)
+        destination = None
+        if rng.random() < self.concentration:
+            destination = self.near_cluster(clusters, n_floors, rng)
+        if destination is None or destination == floor:
+            destination = other_floor(rng, n_floors, floor)
+        return floor, destination
+
+
+class RealisticTraffic(Traffic):
+    """ A day in an office building: up-peak from the lobby, interfloor
+        traffic, then down-peak to the lobby """
+
+    def __init__(self, rate=ARRIVAL_RATE, period=1000, lobby=0, peak_share=0.7):
+        """
+        :param period:
+            The length of a day, in ticks.  The first third is the up-peak,
+            the last third the down-peak
+        :param lobby:
+            The lobby floor
+        :param peak_share:
+            The share of the passengers from or to the lobby during the peaks
+        """
+        super(RealisticTraffic, self).__init__(rate)
+        self.period = period
+        self.lobby = lobby
+        self.peak_share = peak_share
+
+    def phase(self, tick):
+        """ 'up', 'inter' or 'down', the part of the day of a tick """
+        third = 3 * (tick % self.period) // self.period
+        return ('up', 'inter', 'down')[third]
+
+    def place(self, floor, tick, n_floors, rng):
+        phase = self.phase(tick)
+        lobby = min(self.lobby, n_floors - 1)
+        if phase == 'up' and rng.random() < self.peak_share:
+            return lobby, other_floor(rng, n_floors, lobby)
+        if phase == 'down' and rng.random() < self.peak_share and floor != lobby:
+            return floor, lobby
+        return floor, other_floor(rng, n_floors, floor)
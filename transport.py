@@ -0,0 +1,195 @@
+""" transport.py - Keep-alive HTTP transport for the BoxLift API
+
+A Transport posts request bodies over persistent connections, pooled
+per host, so that every tick does not pay for a fresh TCP (and TLS)
+handshake.  The connection factory is pluggable and the round trip
+latency of every call is accounted for.
+"""
+import errno
+import socket
+import time
+# This is to keep this to a minimum and work on Python 2.x and 3.x
+try:
+    import http.client as httplib
+    from urllib.parse import urlsplit
+except ImportError:
+    import httplib
+    from urlparse import urlsplit
+
+DEFAULT_TIMEOUT = 10.  # Seconds
+# The errors sending on a connection the server already closed
+STALE_ERRNOS = (errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED)
+# The BadStatusLine lines of a connection closed without a byte of response, per httplib version
+NO_STATUS_LINES = ('', "''", "No status line received - the server has closed the connection")
+DEFAULT_HEADERS = {'Content-Type': 'application/json',
+                   'Connection': 'keep-alive'}
+
+
+class TransportError(Exception):
+    """ The server answered with an HTTP error status """
+
+    def __init__(self, url, code, reason):
+        super(TransportError, self).__init__("HTTP Error {}: {} ({})".format(code, reason, url))
+        self.url = url
+        self.code = code
+        self.reason = reason
+
+
+class HTTPBackend(object):
+    """ The default connection factory, based on httplib """
+
+    def connect(self, scheme, netloc, timeout):
+        if scheme == 'https':
+            return httplib.HTTPSConnection(netloc, timeout=timeout)
+        return httplib.HTTPConnection(netloc, timeout=timeout)
+
+
+class LatencyStats(object):
+    """ Running round trip latency accounting, in seconds """
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.
+        self.last = None
+        self.min = None
+        self.max = None
+
+    def add(self, latency):
+        self.n += 1
+        self.total += latency
+        self.last = latency
+        if self.min is None or latency < self.min:
+            self.min = latency
+        if self.max is None or latency > self.max:
+            self.max = latency
+
+    @property
+    def mean(self):
+        if not self.n:
+            return None
+        return self.total / self.n
+
+    def __str__(self):
+        if not self.n:
+            return "no requests"
+        return "n: {} mean: {:.1f}ms min: {:.1f}ms max: {:.1f}ms".format(
+            self.n, self.mean * 1e3, self.min * 1e3, self.max * 1e3)
+
+
+class ConnectionPool(object):
+    """ A pool of idle keep-alive connections to a single host """
+
+    def __init__(self, scheme, netloc, backend, timeout=DEFAULT_TIMEOUT, maxsize=1):
+        self.scheme = scheme
+        self.netloc = netloc
+        self.backend = backend
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.idle = []
+
+    def get(self):
+        """ Return an idle connection and whether it was reused """
+        if self.idle:
+            return self.idle.pop(), True
+        return self.connect(), False
+
+    def connect(self):
+        """ A new connection, bypassing the idle ones """
+        return self.backend.connect(self.scheme, self.netloc, self.timeout)
+
+    def put(self, conn):
+        """ Return a connection to the pool once its response is fully read """
+        if len(self.idle) < self.maxsize:
+            self.idle.append(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        for conn in self.idle:
+            conn.close()
+        self.idle = []
+
+
+class Transport(object):
+    """ Post request bodies over pooled keep-alive connections """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, backend=None, pool_size=1):
+        """
+        :param timeout:
+            Socket timeout, in seconds, for connecting and reading
+        :type timeout:
+            `float`
+        :param backend:
+            The connection factory, an object with a
+            connect(scheme, netloc, timeout) method.  Defaults to httplib.
+        :param pool_size:
+            The maximum number of idle connections kept per host
+        :type pool_size:
+            `int`
+        """
+        self.timeout = timeout
+        self.backend = backend or HTTPBackend()
+        self.pool_size = pool_size
+        self.pools = {}
+        self.latency = LatencyStats()
+
+    def get_pool(self, scheme, netloc):
+        key = (scheme, netloc)
+        pool = self.pools.get(key, None)
+        if pool is None:
+            pool = ConnectionPool(scheme, netloc, self.backend, timeout=self.timeout,
+                                  maxsize=self.pool_size)
+            self.pools[key] = pool
+        return pool
+
+    def post(self, url, body):
+        """ Post the body to the url, returns the response body """
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        pool = self.get_pool(parts.scheme, parts.netloc)
+
+        start = time.time()
+        conn, reused = pool.get()
+        try:
+            status, reason, res = self._request(conn, path, body)
+        except (httplib.HTTPException, socket.error) as e:
+            conn.close()
+            if not reused or not getattr(e, 'stale', False):
+                raise
+            # The server dropped an idle keep-alive connection before it got the
+            # request, retry on a fresh one, the other idle connections may be just as stale
+            conn = pool.connect()
+            try:
+                status, reason, res = self._request(conn, path, body)
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                raise
+        self.latency.add(time.time() - start)
+        pool.put(conn)
+
+        if status >= 400:
+            raise TransportError(url, status, reason)
+        return res
+
+    def _request(self, conn, path, body):
+        """ Post on the connection, the errors showing the server closed it before
+            processing the request flagged stale.  A timeout or a response cut
+            short may come after the server acted on the request, they are not """
+        try:
+            conn.request('POST', path, body, DEFAULT_HEADERS)
+        except socket.error as e:
+            e.stale = e.errno in STALE_ERRNOS
+            raise
+        try:
+            response = conn.getresponse()
+        except httplib.BadStatusLine as e:
+            e.stale = e.line in NO_STATUS_LINES or isinstance(e, getattr(httplib, 'RemoteDisconnected', ()))
+            raise
+        return response.status, response.reason, response.read()
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+        self.pools = {}
@@ -0,0 +1,220 @@
+""" tune.py - Parallel search over the strategy parameters
+
+The hand picked constants of the strategies (the load penalty of the
+distance metric, the SplitHome home floors, the DemandHome forecast
+half life) are exposed as a search space.  Candidate parameter sets are
+scored by their mean score over seeded runs of a LocalBoxLift,
+evaluated in a process pool, with a grid, a random or a successive
+halving search.  Successive halving scores every candidate on a few
+seeds first, and only the best third goes on to be scored on three
+times as many seeds, so bad candidates are dropped early.  The best
+parameter set is reported per plan family.
+
+    python tune.py -t SplitHome -m halving -n 27 --seeds 9
+"""
+import collections
+import itertools
+import json
+import multiprocessing
+import random
+import time
+
+from controller import Controller
+from main import get_plan, get_strategy
+from plan import with_strategy
+from simulator import LocalBoxLift
+
+# family -> the plan representing it
+FAMILIES = collections.OrderedDict([('Random', 'Random1'),
+                                    ('Clustered', 'Clustered1'),
+                                    ('Realistic', 'Realistic1')])
+
+# strategy -> {parameter: candidate values}
+SPACES = {'BaseStrategy': {'load_weight': [0.25, 0.5, 1, 2, 4],
+                           'load_exponent': [1, 2, 3]},
+          'SplitHome': {'load_weight': [0.25, 0.5, 1, 2, 4],
+                        'load_exponent': [1, 2, 3],
+                        'split': [0.25, 0.5, 0.75, 1.],
+                        'upper_home': [0.5, 0.75, 1.]},
+          'DemandHome': {'load_weight': [0.25, 0.5, 1, 2, 4],
+                         'half_life': [50, 100, 200, 400],
+                         'rehome_every': [1, 5, 10]}}
+
+METHODS = ['grid', 'random', 'halving']
+
+
+class Candidate(object):
+    """ A parameter set and its scores so far, one per seed """
+
+    def __init__(self, params):
+        self.params = params
+        self.scores = {}
+
+    @property
+    def mean(self):
+        if not self.scores:
+            return None
+        return float(sum(self.scores.values())) / len(self.scores)
+
+    def __repr__(self):
+        return "Candidate({}, mean={})".format(self.params, self.mean)
+
+
+def with_params(strategy, params):
+    """ Derive a strategy class with other parameters, leaving the original untouched """
+    return type(strategy.__name__, (strategy,), dict(params))
+
+
+def grid_candidates(space):
+    """ Every combination of the parameter values """
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*[space[name] for name in names])]
+
+
+def random_candidates(space, n, rng):
+    """ n distinct combinations of the parameter values, or the whole grid if smaller """
+    grid = grid_candidates(space)
+    if n >= len(grid):
+        return grid
+    return rng.sample(grid, n)
+
+
+def evaluate(job):
+    """ The score of a strategy with some parameters on a seeded local run, in a worker process """
+    plan_name, strategy_name, params, seed, n_ticks = job
+    plan = with_strategy(get_plan(plan_name), with_params(get_strategy(strategy_name), params))
+    api = LocalBoxLift(plan, seed=seed)
+    if n_ticks:
+        api.n_iter = n_ticks
+    controller = Controller(plan, seed=seed)
+    resp = api.send_commands([])
+    while resp['status'] != 'finished':
+        resp = api.send_commands(controller.step(resp))
+    return resp['score']
+
+
+class Search(object):
+    """ Score candidates of a strategy on a plan, in a process pool """
+
+    def __init__(self, plan_name, strategy_name, seeds, n_ticks=None, pool=None):
+        """
+        :param seeds:
+            The seeds of the runs every candidate may be scored on
+        :param n_ticks:
+            Shorten the runs to n_ticks, defaults to the plan's n_iter
+        :param pool:
+            A multiprocessing Pool, the runs are done in process without one
+        """
+        self.plan_name = plan_name
+        self.strategy_name = strategy_name
+        self.seeds = list(seeds)
+        self.n_ticks = n_ticks
+        self.pool = pool
+        self.n_runs = 0
+
+    def score(self, candidates, seeds):
+        """ Score the candidates on the seeds they were not run with yet """
+        jobs = []
+        owners = []
+        for candidate in candidates:
+            for seed in seeds:
+                if seed not in candidate.scores:
+                    jobs.append((self.plan_name, self.strategy_name, candidate.params, seed, self.n_ticks))
+                    owners.append((candidate, seed))
+        results = self.pool.map(evaluate, jobs) if self.pool is not None else [evaluate(job) for job in jobs]
+        for (candidate, seed), score in zip(owners, results):
+            candidate.scores[seed] = score
+        self.n_runs += len(jobs)
+        return ranked(candidates)
+
+    def exhaustive(self, candidates):
+        """ Score every candidate on every seed """
+        return self.score(candidates, self.seeds)
+
+    def successive_halving(self, candidates, eta=3, min_seeds=1):
+        """ Score the candidates on min_seeds seeds, keep the best 1 / eta of
+            them and score those on eta times as many seeds, until a single
+            candidate is left or every seed is used """
+        n_seeds = min(min_seeds, len(self.seeds))
+        while True:
+            candidates = self.score(candidates, self.seeds[:n_seeds])
+            if len(candidates) == 1 or n_seeds == len(self.seeds):
+                return candidates
+            candidates = candidates[:max(len(candidates) // eta, 1)]
+            n_seeds = min(n_seeds * eta, len(self.seeds))
+
+
+def ranked(candidates):
+    """ The candidates, best mean score first """
+    return sorted(candidates, key=lambda candidate: -candidate.mean)
+
+
+def tune(plan_name, strategy_name, method='halving', n_candidates=27, seeds=range(9), n_ticks=None,
+         pool=None, rng=None):
+    """ Search the parameters of a strategy on a plan, returns the candidates best first """
+    if method not in METHODS:
+        raise ValueError("Unknown search method: {}".format(method))
+    space = SPACES[strategy_name]
+    if method == 'grid':
+        candidates = grid_candidates(space)
+    else:
+        candidates = random_candidates(space, n_candidates, rng or random.Random())
+    search = Search(plan_name, strategy_name, seeds, n_ticks=n_ticks, pool=pool)
+    candidates = [Candidate(params) for params in candidates]
+    if method == 'halving':
+        return search.successive_halving(candidates)
+    return search.exhaustive(candidates)
+
+
+def format_best(best):
+    """ Format the best candidate of every family, as a table """
+    lines = ["{:<10} {:>10} {:>6}  {}".format('family', 'mean', 'seeds', 'parameters')]
+    for family, candidate in best.items():
+        params = ', '.join('{}={}'.format(name, candidate.params[name]) for name in sorted(candidate.params))
+        lines.append("{:<10} {:>10.1f} {:>6}  {}".format(family, candidate.mean, len(candidate.scores), params))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Search the strategy parameters on local simulations')
+    parser.add_argument('-t', '--strategy', default='SplitHome', choices=sorted(SPACES),
+                        help='The strategy to tune')
+    parser.add_argument('-m', '--method', default='halving', choices=METHODS,
+                        help='The search method')
+    parser.add_argument('-f', '--families', nargs='+', default=None,
+                        help='The plan families to tune for, from: {}'.format(', '.join(FAMILIES)))
+    parser.add_argument('-n', '--candidates', type=int, default=27,
+                        help='The number of candidates of the random and halving searches')
+    parser.add_argument('--seeds', type=int, default=9,
+                        help='The number of seeded runs a candidate is scored on, at most')
+    parser.add_argument('--ticks', type=int, default=None,
+                        help='Shorten the runs to a number of ticks')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='The number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the sampling of the candidates')
+    parser.add_argument('--save', default=None, metavar='JSON',
+                        help='Save the best parameters of every family to a JSON file')
+    options = parser.parse_args()
+
+    start = time.time()
+    pool = multiprocessing.Pool(options.processes)
+    best = collections.OrderedDict()
+    try:
+        for family in options.families or FAMILIES:
+            candidates = tune(FAMILIES[family], options.strategy, method=options.method,
+                              n_candidates=options.candidates, seeds=range(options.seeds),
+                              n_ticks=options.ticks, pool=pool, rng=random.Random(options.seed))
+            best[family] = candidates[0]
+    finally:
+        pool.close()
+        pool.join()
+    print(format_best(best))
+    print("--- {:.1f}s ---".format(time.time() - start))
+
+    if options.save is not None:
+        with open(options.save, 'w') as fp:
+            json.dump(dict((family, {'strategy': options.strategy, 'params': candidate.params,
+                                     'mean': candidate.mean})
+                           for family, candidate in best.items()), fp, indent=2, sort_keys=True)
@@ -0,0 +1,308 @@
+""" zoning.py - A zone partitioned controller, spread over worker processes
+
+SplitHome parks half the fleet at each end of the building; zoning takes
+the idea further for very tall buildings.  The floors are split into
+contiguous zones, each with its own group of elevators driven by a
+sub-Controller that only ever sees the requests of its zone, so a
+request is weighed against a few cars rather than the whole fleet.
+
+The sub-controllers live in worker processes.  Every tick the
+coordinator writes the elevators and the requests, sorted by zone, to
+shared memory arrays, wakes the workers with a one byte message, and
+reads back the commands they wrote to shared memory.  The coordinator
+also handles what crosses zones:
+
+-  a request in a zone left without cars goes to the nearest zone with some
+-  every rebalance_every ticks, an idle car moves from the zone with the
+   fewest waiting requests per car to the one with the most, when the
+   gap is wide enough
+
+A car carries its passengers wherever they go, whatever its zone.
+
+    controller = ZonedController(plan, n_zones=4, processes=4)
+    commands = controller.step(resp)
+    controller.close()
+"""
+import multiprocessing
+from bisect import bisect_right
+from multiprocessing.sharedctypes import RawArray
+
+from boxlift_api import Command
+from controller import Controller
+from plan import BasePlan
+from state import BuildingState, ElevatorState
+
+REBALANCE_EVERY = 10   # Ticks between two rebalancing of the cars
+REBALANCE_RATIO = 2.   # Minimum ratio of the waiting requests per car to move a car
+
+
+def zone_bounds(n_floors, n_zones):
+    """ The lowest floor of every zone, floors split as evenly as possible """
+    return [n_floors * zone // n_zones for zone in range(n_zones)]
+
+
+class SharedState(object):
+    """ The state of a tick, and the commands answered, in shared memory """
+
+    def __init__(self, n_els, n_floors, n_zones):
+        self.n_els = n_els
+        self.n_floors = n_floors
+        # Elevators, written by the coordinator
+        self.floor = RawArray('l', n_els)
+        self.zone = RawArray('l', n_els)
+        self.n_buttons = RawArray('l', n_els)
+        self.buttons = RawArray('l', n_els * n_floors)   # n_floors slots per car
+        # Requests, sorted by zone, those of zone z in [req_offsets[z], req_offsets[z + 1])
+        self.req_offsets = RawArray('l', n_zones + 1)
+        self.req_floor = RawArray('l', 2 * n_floors)
+        self.req_direction = RawArray('l', 2 * n_floors)
+        # Commands, written by the workers.  The speed and direction are those of
+        # the last command of every car, handed over with the car when it changes zones
+        self.has_command = RawArray('b', n_els)
+        self.speed = RawArray('l', n_els)
+        self.direction = RawArray('l', [1] * n_els)
+
+    def buttons_of(self, slot):
+        start = slot * self.n_floors
+        return tuple(self.buttons[start:start + self.n_buttons[slot]])
+
+
+class ZoneStrategy(object):
+    """ Mixed in front of a plan's strategy, homes the elevators at the zone's lowest floor """
+
+    home_floor = 0
+
+    @classmethod
+    def init_elevators(cls, elevators):
+        for el in elevators:
+            el.home_floor = cls.home_floor
+
+
+class ZoneWorker(object):
+    """ The sub-controller of a zone, fed from the shared state """
+
+    def __init__(self, zone, home_floor, plan, shared, seed=None):
+        self.zone = zone
+        self.home_floor = home_floor
+        self.plan = plan
+        self.shared = shared
+        self.seed = seed
+        self.members = []   # The slots of the zone's cars, by sub-controller id
+        strategy = type('Zone' + plan.strategy.__name__, (ZoneStrategy, plan.strategy),
+                        {'home_floor': home_floor})
+        sub_plan = type(plan.__name__, (plan,), {'n_els': 0, 'strategy': strategy})
+        self.controller = Controller(sub_plan, seed=seed)
+
+    def update_members(self, members):
+        """ Remove the cars which left the zone from the sub-controller, and add
+            those which joined it, the other cars keeping their state and requests """
+        shared = self.shared
+        members = set(members)
+        for local in reversed(range(len(self.members))):
+            if self.members[local] not in members:
+                self.controller.remove_elevator(local)
+                del self.members[local]
+        for slot in sorted(members.difference(self.members)):
+            self.controller.add_elevator(floor=shared.floor[slot], speed=shared.speed[slot],
+                                         direction=shared.direction[slot])
+            self.members.append(slot)
+
+    def step(self):
+        """ Decide the commands of the zone's cars for the current tick """
+        shared = self.shared
+        members = [slot for slot in range(shared.n_els) if shared.zone[slot] == self.zone]
+        if sorted(self.members) != members:
+            self.update_members(members)
+        if not self.members:
+            return
+        start, stop = shared.req_offsets[self.zone], shared.req_offsets[self.zone + 1]
+        state = BuildingState(
+            elevators=tuple(ElevatorState(id=local, floor=shared.floor[slot],
+                                          buttons_pressed=shared.buttons_of(slot))
+                            for local, slot in enumerate(self.members)),
+            requests=tuple(zip(shared.req_floor[start:stop], shared.req_direction[start:stop])))
+        for command in self.controller.step(state):
+            slot = self.members[command.id]
+            shared.speed[slot] = command.speed
+            shared.direction[slot] = command.direction
+            shared.has_command[slot] = 1
+
+
+def _serve(workers, conn):
+    """ The loop of a worker process, stepping its zones on every message """
+    while True:
+        if conn.recv() is None:
+            return
+        for worker in workers:
+            worker.step()
+        conn.send(True)
+
+
+class ZonedController(object):
+    """ A drop in replacement for Controller, driving the zones of a building in parallel """
+
+    def __init__(self, plan, n_zones=4, processes=None, seed=None, rebalance_every=REBALANCE_EVERY,
+                 debug=False):
+        """
+        :param n_zones:
+            The number of zones, at most the number of elevators
+        :param processes:
+            The number of worker processes, the zones being dealt among them.
+            Defaults to one per zone, 0 steps the zones in this process
+        :param rebalance_every:
+            The ticks between two moves of a car between zones, 0 never moves any
+        """
+        if not issubclass(plan, BasePlan):
+            raise TypeError("plan argument must be a subclass of BasePlan")
+        self.plan = plan
+        self.debug = debug
+        self.n_zones = n_zones = max(1, min(n_zones, plan.n_els, plan.n_floors))
+        self.bounds = zone_bounds(plan.n_floors, n_zones)
+        self.zones = [bisect_right(self.bounds, floor) - 1 for floor in range(plan.n_floors)]
+        self.rebalance_every = rebalance_every
+        self.n_ticks = 0
+        self.n_moves = 0
+        self.shared = shared = SharedState(plan.n_els, plan.n_floors, n_zones)
+        for slot in range(plan.n_els):
+            shared.zone[slot] = slot * n_zones // plan.n_els
+        self.requests = ()
+
+        workers = [ZoneWorker(zone, self.bounds[zone], plan, shared,
+                              seed=None if seed is None else seed + zone)
+                   for zone in range(n_zones)]
+        if processes is None:
+            processes = n_zones
+        processes = min(processes, n_zones)
+        self.workers = workers
+        self.processes = []
+        self.conns = []
+        for idx in range(processes):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve, args=(workers[idx::processes], child))
+            process.daemon = True
+            process.start()
+            self.processes.append(process)
+            self.conns.append(parent)
+
+    def zone_of(self, floor):
+        return self.zones[floor]
+
+    def cars_per_zone(self):
+        cars = [0] * self.n_zones
+        for slot in range(self.plan.n_els):
+            cars[self.shared.zone[slot]] += 1
+        return cars
+
+    def route(self, floor, cars):
+        """ The zone serving a request, the nearest one with cars """
+        zone = self.zone_of(floor)
+        if cars[zone]:
+            return zone
+        return min((zone_ for zone_ in range(self.n_zones) if cars[zone_]),
+                   key=lambda zone_: abs(zone_ - zone))
+
+    def update(self, resp):
+        """ Write the state of the building to the shared memory """
+        resp = BuildingState.from_dict(resp)
+        shared = self.shared
+        n_floors = self.plan.n_floors
+        for el in resp.elevators or ():
+            slot = el.id
+            shared.floor[slot] = el.floor
+            buttons = el.buttons_pressed
+            shared.n_buttons[slot] = len(buttons)
+            shared.buttons[slot * n_floors:slot * n_floors + len(buttons)] = list(buttons)
+
+        self.n_ticks += 1
+        if self.rebalance_every and self.n_ticks % self.rebalance_every == 0:
+            self.rebalance(resp.requests)
+
+        cars = self.cars_per_zone()
+        by_zone = [[] for _ in range(self.n_zones)]
+        if all(cars):
+            zones = self.zones
+            for req in resp.requests:
+                by_zone[zones[req[0]]].append(req)
+        else:
+            for req in resp.requests:
+                by_zone[self.route(req[0], cars)].append(req)
+        idx = 0
+        for zone, reqs in enumerate(by_zone):
+            shared.req_offsets[zone] = idx
+            for floor, direction in reqs:
+                shared.req_floor[idx] = floor
+                shared.req_direction[idx] = direction
+                idx += 1
+        shared.req_offsets[self.n_zones] = idx
+        self.requests = resp.requests
+
+    def rebalance(self, requests):
+        """ Move an idle car toward the zone with the most waiting requests per car """
+        shared = self.shared
+        cars = self.cars_per_zone()
+        waiting = [0] * self.n_zones
+        for floor, _ in requests:
+            waiting[self.zone_of(floor)] += 1
+        pressure = [float(waiting[zone] + 1) / cars[zone] if cars[zone] else float('inf')
+                    for zone in range(self.n_zones)]
+        needy = max(range(self.n_zones), key=lambda zone: (pressure[zone], waiting[zone]))
+        donors = [zone for zone in range(self.n_zones) if cars[zone] > 1 and zone != needy]
+        if not donors or not waiting[needy]:
+            return
+        donor = min(donors, key=lambda zone: pressure[zone])
+        if pressure[needy] < REBALANCE_RATIO * pressure[donor]:
+            return
+        idle = [slot for slot in range(self.plan.n_els)
+                if shared.zone[slot] == donor and not shared.n_buttons[slot]]
+        if not idle:
+            return
+        target = self.bounds[needy]
+        slot = min(idle, key=lambda slot: abs(shared.floor[slot] - target))
+        shared.zone[slot] = needy
+        self.n_moves += 1
+
+    def shuffle_requests(self):
+        """ The requests are shuffled within the zones, by the sub-controllers """
+
+    def get_commands(self):
+        """ Step every zone, in the workers, and collect their commands """
+        shared = self.shared
+        for slot in range(self.plan.n_els):
+            shared.has_command[slot] = 0
+        if self.conns:
+            for conn in self.conns:
+                conn.send(self.n_ticks)
+            for conn in self.conns:
+                conn.recv()
+        else:
+            for worker in self.workers:
+                worker.step()
+        return [Command(slot, shared.direction[slot], shared.speed[slot])
+                for slot in range(self.plan.n_els) if shared.has_command[slot]]
+
+    def step(self, resp):
+        """ Update from a state response and return the next commands """
+        self.update(resp)
+        return self.get_commands()
+
+    def refine(self, commands, time_budget):
+        """ The zones are planned in the workers, the commands are returned unchanged """
+        return commands
+
+    def prepare(self, commands, time_budget=None):
+        """ The zones are planned in the workers, there is nothing to prepare """
+
+    def print_status(self):
+        print("--- Zones ---")
+        for zone in range(self.n_zones):
+            members = [slot for slot in range(self.plan.n_els) if self.shared.zone[slot] == zone]
+            print("Zone {} from floor {}: elevators {}".format(zone, self.bounds[zone], members))
+
+    def close(self):
+        """ Stop the worker processes """
+        for conn in self.conns:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
+        self.conns = []
+        self.processes = []